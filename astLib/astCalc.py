@@ -9,7 +9,9 @@ U{http://astlib.sourceforge.net}
 The focus in this module is at present on calculations of distances in a given
 cosmology. The parameters for the cosmological model are set using the
 variables OMEGA_M0, OMEGA_L0, OMEGA_R0, H0 in the module namespace (see below
-for details).
+for details). Alternatively, the L{Cosmology} class provides the same functions
+as methods of an object that holds its own set of parameters, which allows
+several cosmologies to be used at once.
 
 @var OMEGA_M0: The matter density parameter at z=0.
 @type OMEGA_M0: float
@@ -28,14 +30,58 @@ for details).
 @var C_LIGHT: The speed of light in km/s.
 @type C_LIGHT: float
 
+@var USE_TABLES: If True, L{dl}, L{da}, L{dm}, L{dc}, L{dVcdz}, L{tl} and L{tz}
+    are evaluated by spline lookup in a table of the comoving distance and
+    lookback time integrals, rather than by numerical integration for every
+    call. In this mode these functions also accept numpy arrays of redshifts.
+    The table is built on first use and is rebuilt automatically whenever
+    OMEGA_M0 or OMEGA_L0 change (H0 is applied at lookup time). With the
+    default table settings the relative error with respect to direct
+    integration is below 1e-9 for 0 <= z <= TABLE_ZMAX.
+@type USE_TABLES: bool
+
+@var TABLE_ZMAX: The maximum redshift covered by the distance table (see
+    L{USE_TABLES}). The table is extended automatically, to TABLE_ZMAX times
+    a power of two, if a higher redshift is requested.
+@type TABLE_ZMAX: float
+
+@var TABLE_STEPS: The number of steps in ln(1+z) used for the distance table
+    (see L{USE_TABLES}). The interpolation error scales as TABLE_STEPS^-4.
+@type TABLE_STEPS: int
+
+@var TABLE_CACHE_DIR: If not None, a directory in which the tables used when
+    L{USE_TABLES} is set are saved, named after a hash of the cosmological
+    parameters and grid. Tables found there are loaded (read-only, by
+    memory-mapping) instead of being recomputed, so that many short-lived
+    processes can share them. Defaults to the value of the environment
+    variable ASTLIB_TABLE_CACHE, if set.
+@type TABLE_CACHE_DIR: string
+
+@var USE_JIT: If True (the default, unless the environment variable
+    ASTLIB_JIT is set to 0) and numba is installed, the integrands that are
+    numerically integrated for non-flat cosmologies are compiled, and passed
+    to scipy's quad as low-level callbacks. Otherwise, the equivalent
+    pure-Python integrands are used.
+@type USE_JIT: bool
+
 """
 
+import os
 import math
+import hashlib
+import tempfile
+import numpy
 try:
     from scipy import integrate
+    from scipy import special
+    from scipy import LowLevelCallable
 except ImportError:
     print("WARNING: astCalc failed to import scipy modules - ", )
     print("some functions will not work")
+try:
+    import numba
+except ImportError:
+    numba = None
 
 OMEGA_M0 = 0.3
 OMEGA_L0 = 0.7
@@ -44,37 +90,888 @@ H0 = 70.0
 
 C_LIGHT = 3.0e5
 
+USE_TABLES = False
+TABLE_ZMAX = 20.0
+TABLE_STEPS = 2000
+TABLE_CACHE_DIR = os.environ.get('ASTLIB_TABLE_CACHE')
+
+USE_JIT = os.environ.get('ASTLIB_JIT', '1') != '0'
+
+_COMPILED_INTEGRANDS = {}
+
+# Cosmologies with |1 - OMEGA_M0 - OMEGA_L0| below this are treated as flat
+_FLAT_TOLERANCE = 1e-10
+
+# Below this redshift the closed-form flat cosmology integrals lose precision
+# to cancellation, and are evaluated by Gauss-Legendre quadrature instead
+_FLAT_SMALL_Z = 0.1
+_GAUSS_NODES, _GAUSS_WEIGHTS = numpy.polynomial.legendre.leggauss(8)
+
+
+#------------------------------------------------------------------------------
+def _comovingIntegrand(x, omegaM0, omegaL0, omegaK):
+    """Integrand of the comoving distance integral, in terms of the scale
+    factor x = 1/(1+z).
+
+    """
+    return 1.0 / math.sqrt(omegaM0 * x + omegaL0 * x**4 + omegaK * x**2)
+
+
+#------------------------------------------------------------------------------
+def _lookbackIntegrand(x, omegaM0, omegaL0, omegaK):
+    """Integrand of the lookback time integral, in terms of the scale factor
+    x = 1/(1+z).
+
+    """
+    return x / math.sqrt(omegaM0 * x + omegaL0 * x**4 + omegaK * x**2)
+
+
+#------------------------------------------------------------------------------
+def _compileIntegrand(integrand):
+    """Compiles one of the integrands above with numba, and wraps it as a
+    scipy LowLevelCallable with the signature double f(int n, double *xx)
+    expected by quad, where xx holds x followed by the cosmological
+    parameters.
+
+    """
+
+    kernel = numba.njit(integrand)
+    signature = numba.types.double(numba.types.intc,
+                                   numba.types.CPointer(numba.types.double))
+
+    @numba.cfunc(signature)
+    def callback(n, xx):
+        return kernel(xx[0], xx[1], xx[2], xx[3])
+
+    return LowLevelCallable(callback.ctypes)
+
+
+#------------------------------------------------------------------------------
+def _quad(integrand, xMin, xMax, omegaM0, omegaL0):
+    """Integrates one of the integrands above from xMin to xMax with quad,
+    using the compiled version of the integrand if L{USE_JIT} is set and numba
+    is available. If xMin is a numpy array, each element is integrated in
+    turn, and an array of the same shape is returned.
+
+    """
+
+    if USE_JIT and numba is not None:
+        if integrand not in _COMPILED_INTEGRANDS:
+            _COMPILED_INTEGRANDS[integrand] = _compileIntegrand(integrand)
+        integrand = _COMPILED_INTEGRANDS[integrand]
+
+    args = (float(omegaM0), float(omegaL0), 1.0 - omegaM0 - omegaL0)
+    if numpy.ndim(xMin) > 0:
+        xMin = numpy.asarray(xMin, dtype=float)
+        integralValue = numpy.array([integrate.quad(integrand, x, xMax,
+                                                    args=args)[0]
+                                     for x in xMin.ravel()])
+        return integralValue.reshape(xMin.shape)
+
+    integralValue, integralError = integrate.quad(integrand, xMin, xMax,
+                                                  args=args)
+
+    return integralValue
+
+
+#------------------------------------------------------------------------------
+class _DistanceTable:
+    """Table of the dimensionless line of sight comoving distance integral
+    I(z) = int_0^z dz'/E(z') and lookback time integral
+    int_0^z dz'/((1+z')E(z')) (ignoring radiation, as in L{dc} and L{tl}),
+    stored on a uniform grid in u = ln(1+z) and interpolated with cubic
+    Hermite splines that use the exact derivatives with respect to u.
+
+    The table is held in a single (5, steps+1) array of u and the two
+    integrals and their derivatives. If cacheDir is given, the array is saved
+    there as a .npy file, named after a hash of the cosmological parameters
+    and grid, and is loaded by memory-mapping it read-only. Processes that use
+    the same table then share a single copy of it.
+
+    """
+
+    def __init__(self, omegaM0, omegaL0, zMax, steps, cacheDir=None):
+
+        self.omegaM0 = omegaM0
+        self.omegaL0 = omegaL0
+        self.zMax = zMax
+        self.steps = steps
+
+        path = None
+        if cacheDir is not None:
+            key = repr(('_DistanceTable', 2, float(omegaM0), float(omegaL0),
+                        float(zMax), int(steps)))
+            path = os.path.join(cacheDir, "astCalcTable_%s.npy" %
+                                hashlib.sha1(key.encode()).hexdigest())
+            if os.path.exists(path):
+                self.data = numpy.load(path, mmap_mode='r')
+                return
+
+        self.data = self._build()
+
+        if path is not None:
+            try:
+                if not os.path.isdir(cacheDir):
+                    os.makedirs(cacheDir)
+                # Write to a temporary file first, so that other processes
+                # never see a partly written table
+                fd, tmpPath = tempfile.mkstemp(suffix='.npy', dir=cacheDir)
+                with os.fdopen(fd, 'wb') as outFile:
+                    numpy.save(outFile, self.data)
+                os.rename(tmpPath, path)
+                self.data = numpy.load(path, mmap_mode='r')
+            except (IOError, OSError):
+                print("WARNING: astCalc failed to write distance table to "
+                      "cache directory %s" % (cacheDir))
+
+    def _build(self):
+        """Integrates the table.
+
+        """
+
+        omegaM0 = self.omegaM0
+        omegaL0 = self.omegaL0
+        omegaK = 1.0 - omegaM0 - omegaL0
+
+        def _yn(u):
+            # Lookback time integrand in terms of u = ln(1+z); the comoving
+            # distance integrand is (1+z) times this
+            s = numpy.exp(u)
+            return 1.0 / numpy.sqrt(omegaM0 * s**3 + omegaK * s**2 + omegaL0)
+
+        # Each step is integrated with 8 point Gauss-Legendre quadrature, which
+        # is exact to machine precision for steps this small
+        u = numpy.linspace(0.0, numpy.log1p(self.zMax), self.steps + 1)
+        halfStep = 0.5 * (u[1] - u[0])
+        nodes, weights = numpy.polynomial.legendre.leggauss(8)
+        uNodes = (u[:-1] + halfStep)[:, numpy.newaxis] + halfStep * nodes
+        lookbackSteps = _yn(uNodes)
+        comovingSteps = numpy.exp(uNodes) * lookbackSteps
+
+        data = numpy.empty((5, u.shape[0]))
+        data[0] = u
+        data[1, 0] = 0.0
+        data[1, 1:] = numpy.cumsum(halfStep * numpy.dot(comovingSteps,
+                                                        weights))
+        data[2] = numpy.exp(u) * _yn(u)
+        data[3, 0] = 0.0
+        data[3, 1:] = numpy.cumsum(halfStep * numpy.dot(lookbackSteps,
+                                                        weights))
+        data[4] = _yn(u)
+
+        return data
+
+    def matches(self, omegaM0, omegaL0, zMax, steps):
+        """Returns True if the table is valid for the given parameters and
+        covers redshifts up to zMax.
+
+        """
+        return (self.omegaM0 == omegaM0 and self.omegaL0 == omegaL0 and
+                self.steps == steps and self.zMax >= zMax)
+
+    def integral(self, z, kind='comoving'):
+        """Returns the tabulated comoving distance or (if kind is 'lookback')
+        lookback time integral at redshift z (float or numpy array).
+
+        """
+
+        row = 1 if kind == 'comoving' else 3
+        u = numpy.log1p(z)
+        step = self.data[0, 1] - self.data[0, 0]
+        i = numpy.minimum((u / step).astype(int), self.steps - 1)
+        h = self.data[0, i + 1] - self.data[0, i]
+        t = (u - self.data[0, i]) / h
+
+        # Cubic Hermite basis functions
+        return ((1.0 + 2.0 * t) * (1.0 - t)**2 * self.data[row, i] +
+                t * (1.0 - t)**2 * h * self.data[row + 1, i] +
+                t**2 * (3.0 - 2.0 * t) * self.data[row, i + 1] +
+                t**2 * (t - 1.0) * h * self.data[row + 1, i + 1])
+
+
+#------------------------------------------------------------------------------
+class Cosmology:
+    """This class describes a cosmological model, and provides the functions
+    of this module as methods. Each instance holds its own copy of the
+    cosmological parameters, so several cosmologies may be used at once (e.g.
+    in different threads), and caches derived quantities: the age of the
+    universe returned by L{t0}, and the distance table used when USE_TABLES
+    is set. Caches are refreshed automatically if the parameters are changed.
+    For example, to calculate the luminosity distance to z = 1 in an Einstein
+    - de Sitter universe:
+
+    eds=astCalc.Cosmology(OMEGA_M0=1.0, OMEGA_L0=0.0)
+    eds.dl(1.0)
+
+    The attributes OMEGA_M0, OMEGA_L0, OMEGA_R0, H0, USE_TABLES, TABLE_ZMAX,
+    TABLE_STEPS and TABLE_CACHE_DIR have the same meaning as the module-level
+    variables of the same names. The module-level functions use a default
+    instance that follows the module-level variables.
+
+    """
+
+    def __init__(self, OMEGA_M0=0.3, OMEGA_L0=0.7, OMEGA_R0=8.24E-5, H0=70.0,
+                 USE_TABLES=False, TABLE_ZMAX=20.0, TABLE_STEPS=2000,
+                 TABLE_CACHE_DIR=None):
+
+        self.OMEGA_M0 = OMEGA_M0
+        self.OMEGA_L0 = OMEGA_L0
+        self.OMEGA_R0 = OMEGA_R0
+        self.H0 = H0
+
+        self.USE_TABLES = USE_TABLES
+        self.TABLE_ZMAX = TABLE_ZMAX
+        self.TABLE_STEPS = TABLE_STEPS
+        self.TABLE_CACHE_DIR = TABLE_CACHE_DIR
+
+        self._t0Cache = None
+        self._distanceTable = None
+
+    def _tabulatedIntegral(self, z, kind='comoving'):
+        """Returns the dimensionless comoving distance (or, if kind is
+        'lookback', lookback time) integral at redshift z by lookup in the
+        cached L{_DistanceTable}, rebuilding the table first if the
+        cosmological parameters have changed or z lies beyond its range.
+
+        """
+
+        zArray = numpy.asarray(z, dtype=float)
+        if numpy.any(zArray < 0):
+            raise ValueError("redshift must be >= 0 when USE_TABLES is set")
+        zMax = self.TABLE_ZMAX
+        if zArray.size and numpy.max(zArray) > zMax:
+            # Extend by doubling, so that only a few different tables (and
+            # cache files) are made as ever higher redshifts are requested
+            zMax = zMax * 2.0**math.ceil(math.log(numpy.max(zArray) / zMax,
+                                                  2.0))
+
+        table = self._distanceTable
+        if (table is None or
+                not table.matches(self.OMEGA_M0, self.OMEGA_L0, zMax,
+                                  self.TABLE_STEPS)):
+            table = _DistanceTable(self.OMEGA_M0, self.OMEGA_L0, zMax,
+                                   self.TABLE_STEPS, self.TABLE_CACHE_DIR)
+            self._distanceTable = table
+
+        integralValue = table.integral(zArray, kind)
+        if integralValue.ndim == 0:
+            integralValue = float(integralValue)
+
+        return integralValue
+
+    def _omegaK(self):
+        """Returns the curvature density parameter 1 - OMEGA_M0 - OMEGA_L0,
+        set to exactly zero if its magnitude is below _FLAT_TOLERANCE, so that
+        all of the methods agree on whether the cosmology is flat.
+
+        """
+
+        OMEGA_K = 1.0 - self.OMEGA_M0 - self.OMEGA_L0
+        if abs(OMEGA_K) < _FLAT_TOLERANCE:
+            OMEGA_K = 0.0
+
+        return OMEGA_K
+
+    def isFlat(self):
+        """Returns True if the cosmology is flat (to within 1e-10) with
+        positive OMEGA_M0 and non-negative OMEGA_L0, in which case the
+        distances and times are calculated using closed-form expressions
+        rather than by numerical integration.
+
+        @rtype: bool
+        @return: True if closed-form expressions are used
+
+        """
+
+        return (self._omegaK() == 0.0 and self.OMEGA_M0 > 0.0 and
+                self.OMEGA_L0 >= 0.0)
+
+    def _flatAge(self, x):
+        """Returns the dimensionless age H0*t of a flat universe at scale
+        factor x = 1/(1+z).
+
+        """
+
+        if self.OMEGA_L0 == 0.0:
+            return 2.0 / (3.0 * math.sqrt(self.OMEGA_M0)) * x**1.5
+        else:
+            return (2.0 / (3.0 * math.sqrt(self.OMEGA_L0)) *
+                    numpy.arcsinh(math.sqrt(self.OMEGA_L0 / self.OMEGA_M0) *
+                                  x**1.5))
+
+    def _flatSmallZ(self, z, integralValue, kind='comoving'):
+        """Replaces the closed-form flat cosmology integrals integralValue
+        at redshifts |z| < _FLAT_SMALL_Z, where they suffer from
+        cancellation, with 8 point Gauss-Legendre quadrature over [0, z].
+        This is exact to machine precision over such a short interval.
+
+        """
+
+        zArray = numpy.asarray(z, dtype=float)
+        small = numpy.abs(zArray) < _FLAT_SMALL_Z
+        if numpy.any(small):
+            halfZ = 0.5 * zArray[small]
+            s = 1.0 + halfZ[:, numpy.newaxis] * (1.0 + _GAUSS_NODES)
+            integrand = 1.0 / numpy.sqrt(self.OMEGA_M0 * s**3 + self.OMEGA_L0)
+            if kind == 'lookback':
+                integrand = integrand / s
+            integralValue = numpy.array(integralValue, dtype=float)
+            integralValue[small] = halfZ * numpy.dot(integrand,
+                                                     _GAUSS_WEIGHTS)
+            if integralValue.ndim == 0:
+                integralValue = float(integralValue)
+
+        return integralValue
+
+    def _comovingIntegral(self, z):
+        """Returns the dimensionless line of sight comoving distance integral
+        int_0^z dz'/E(z') (ignoring radiation). For a flat cosmology this is
+        evaluated in closed form using the hypergeometric function
+        2F1(1/3, 1/2; 4/3; x) (or by quadrature at low redshift). Otherwise it
+        is looked up in the distance table if USE_TABLES is set, or integrated
+        numerically, one redshift at a time.
+
+        """
+
+        OMEGA_M0 = self.OMEGA_M0
+        OMEGA_L0 = self.OMEGA_L0
+
+        if self.isFlat():
+            x = 1.0 / (1.0 + z)
+            if OMEGA_L0 == 0.0:
+                integralValue = (2.0 / math.sqrt(OMEGA_M0) *
+                                 (1.0 - numpy.sqrt(x)))
+            else:
+                ratio = OMEGA_M0 / OMEGA_L0
+                integralValue = ((special.hyp2f1(1. / 3., 0.5, 4. / 3.,
+                                                 -ratio / x**3) / x -
+                                  special.hyp2f1(1. / 3., 0.5, 4. / 3.,
+                                                 -ratio)) /
+                                 math.sqrt(OMEGA_L0))
+            integralValue = self._flatSmallZ(z, integralValue)
+        elif self.USE_TABLES:
+            integralValue = self._tabulatedIntegral(z)
+        else:
+            # Integration limits
+            xMax = 1.0
+            xMin = 1.0 / (1.0 + z)
+
+            integralValue = _quad(_comovingIntegrand, xMin, xMax, OMEGA_M0,
+                                  OMEGA_L0)
+
+        return integralValue
+
+    def _lookbackIntegral(self, z):
+        """Returns the dimensionless lookback time integral
+        int_0^z dz'/((1+z')E(z')) (ignoring radiation), in closed form for a
+        flat cosmology (or by quadrature at low redshift), by lookup in the
+        distance table if USE_TABLES is set, and by numerical integration
+        otherwise. If z is None, the integral to infinite redshift is
+        returned.
+
+        """
+
+        # Integration limits
+        xMax = 1.0
+        if z is None:
+            xMin = 0.0
+        else:
+            xMin = 1.0 / (1.0 + z)
+
+        if self.isFlat():
+            integralValue = self._flatAge(xMax) - self._flatAge(xMin)
+            if z is not None:
+                integralValue = self._flatSmallZ(z, integralValue, 'lookback')
+        elif self.USE_TABLES and z is not None:
+            integralValue = self._tabulatedIntegral(z, 'lookback')
+        else:
+            integralValue = _quad(_lookbackIntegrand, xMin, xMax,
+                                  self.OMEGA_M0, self.OMEGA_L0)
+
+        return integralValue
+
+    def dl(self, z):
+        """Calculates the luminosity distance in Mpc at redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: luminosity distance in Mpc
+
+        @note: numpy arrays are fastest if the cosmology is flat (see
+            L{isFlat}) or USE_TABLES is set; otherwise each redshift is
+            integrated separately.
+
+        """
+
+        DM = self.dm(z)
+        DL = (1.0 + z) * DM
+
+        return DL
+
+    def da(self, z):
+        """Calculates the angular diameter distance in Mpc at redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: angular diameter distance in Mpc
+
+        @note: numpy arrays are fastest if the cosmology is flat (see
+            L{isFlat}) or USE_TABLES is set; otherwise each redshift is
+            integrated separately.
+
+        """
+        DM = self.dm(z)
+        DA = DM / (1.0 + z)
+
+        return DA
+
+    def dm(self, z):
+        """Calculates the transverse comoving distance (proper motion distance)
+        in Mpc at redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: transverse comoving distance (proper motion distance) in Mpc
+
+        @note: numpy arrays are fastest if the cosmology is flat (see
+            L{isFlat}) or USE_TABLES is set; otherwise each redshift is
+            integrated separately.
+
+        """
+
+        OMEGA_K = self._omegaK()
+
+        integralValue = self._comovingIntegral(z)
+
+        if OMEGA_K > 0.0:
+            DM = (C_LIGHT / self.H0 * math.pow(
+                abs(OMEGA_K), -0.5) *
+                  numpy.sinh(math.sqrt(abs(OMEGA_K)) * integralValue))
+        elif OMEGA_K == 0.0:
+            DM = C_LIGHT / self.H0 * integralValue
+        elif OMEGA_K < 0.0:
+            DM = (C_LIGHT / self.H0 * math.pow(
+                abs(OMEGA_K), -0.5) *
+                  numpy.sin(math.sqrt(abs(OMEGA_K)) * integralValue))
+
+        return DM
+
+    def dc(self, z):
+        """Calculates the line of sight comoving distance in Mpc at redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: transverse comoving distance (proper motion distance) in Mpc
+
+        @note: numpy arrays are fastest if the cosmology is flat (see
+            L{isFlat}) or USE_TABLES is set; otherwise each redshift is
+            integrated separately.
+
+        """
+
+        integralValue = self._comovingIntegral(z)
+
+        DC = C_LIGHT / self.H0 * integralValue
+
+        return DC
+
+    def dVcdz(self, z):
+        """Calculates the line of sight comoving volume element per steradian
+        dV/dz at redshift z. The unit is Mpc^3/sr.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: comoving volume element per steradian
+
+        @note: numpy arrays are fastest if the cosmology is flat (see
+            L{isFlat}) or USE_TABLES is set; otherwise each redshift is
+            integrated separately.
+
+        """
+
+        dH = C_LIGHT / self.H0
+        dVcdz = (dH * (self.da(z)**2) * ((1 + z)**2) / self.Ez(z))
+
+        return dVcdz
+
+    def dl2z(self, distanceMpc):
+        """Calculates the redshift z corresponding to the luminosity distance
+        given in Mpc.
+
+        @type distanceMpc: float
+        @param distanceMpc: distance in Mpc
+        @rtype: float
+        @return: redshift
+
+        """
+
+        return self._bisect(self.dl, distanceMpc, 0.1)
+
+    def dc2z(self, distanceMpc):
+        """Calculates the redshift z corresponding to the comoving distance
+        given in Mpc.
+
+        @type distanceMpc: float
+        @param distanceMpc: distance in Mpc
+        @rtype: float
+        @return: redshift
+
+        """
+
+        return self._bisect(self.dc, distanceMpc, 0.1)
+
+    def _bisect(self, func, target, tolerance):
+        """Finds the redshift at which func(z) is within tolerance of target,
+        by bisection.
+
+        """
+
+        zMin = 0.0
+        zMax = 10.0
+
+        diff = func(zMax) - target
+        while diff < 0:
+            zMax = zMax + 5.0
+            diff = func(zMax) - target
+
+        zTrial = zMin + (zMax - zMin) / 2.0
+
+        trial = func(zTrial)
+        diff = trial - target
+        while abs(diff) > tolerance:
+
+            if diff > 0:
+                zMax = zMax - (zMax - zMin) / 2.0
+            else:
+                zMin = zMin + (zMax - zMin) / 2.0
+
+            zTrial = zMin + (zMax - zMin) / 2.0
+            trial = func(zTrial)
+            diff = trial - target
+
+        return zTrial
+
+    def t0(self):
+        """Calculates the age of the universe in Gyr at z=0. The result is
+        cached until the cosmological parameters change.
+
+        @rtype: float
+        @return: age of the universe in Gyr at z=0
+
+        """
+
+        key = (self.OMEGA_M0, self.OMEGA_L0, self.H0)
+        if self._t0Cache is not None and self._t0Cache[0] == key:
+            return self._t0Cache[1]
+
+        integralValue = self._lookbackIntegral(None)
+
+        T0 = (1.0 / self.H0 * integralValue * 3.08e19) / 3.16e7 / 1e9
+
+        self._t0Cache = (key, T0)
+
+        return T0
+
+    def tl(self, z):
+        """ Calculates the lookback time in Gyr to redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: lookback time in Gyr to redshift z
+
+        @note: numpy arrays are fastest if the cosmology is flat (see
+            L{isFlat}) or USE_TABLES is set; otherwise each redshift is
+            integrated separately.
+
+        """
+
+        integralValue = self._lookbackIntegral(z)
+
+        T0 = (1.0 / self.H0 * integralValue * 3.08e19) / 3.16e7 / 1e9
+
+        return T0
+
+    def tz(self, z):
+        """Calculates the age of the universe at redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: age of the universe in Gyr at redshift z
+
+        @note: numpy arrays are fastest if the cosmology is flat (see
+            L{isFlat}) or USE_TABLES is set; otherwise each redshift is
+            integrated separately.
+
+        """
+
+        TZ = self.t0() - self.tl(z)
+
+        return TZ
+
+    def tl2z(self, tlGyr):
+        """Calculates the redshift z corresponding to lookback time tlGyr given
+        in Gyr.
+
+        @type tlGyr: float
+        @param tlGyr: lookback time in Gyr
+        @rtype: float
+        @return: redshift
+
+        @note: Raises ValueError if tlGyr is not positive.
+
+        """
+        if tlGyr < 0.:
+            raise ValueError('Lookback time must be positive')
+
+        return self._bisect(self.tl, tlGyr, 0.001)
+
+    def tz2z(self, tzGyr):
+        """Calculates the redshift z corresponding to age of the universe tzGyr
+        given in Gyr.
+
+        @type tzGyr: float
+        @param tzGyr: age of the universe in Gyr
+        @rtype: float
+        @return: redshift
+
+        @note: Raises ValueError if Universe age not positive
+
+        """
+        if tzGyr <= 0:
+            raise ValueError('Universe age must be positive.')
+        tl = self.t0() - tzGyr
+        z = self.tl2z(tl)
+
+        return z
+
+    def Ez(self, z):
+        """Calculates the value of E(z), which describes evolution of the
+        Hubble parameter with redshift, at redshift z. See, e.g., Bryan &
+        Norman 1998 (ApJ, 495, 80).
+
+        @type z: float
+        @param z: redshift
+        @rtype: float
+        @return: value of E(z) at redshift z
+
+        """
+
+        Ez = numpy.sqrt(self.Ez2(z))
+
+        return Ez
+
+    def Ez2(self, z):
+        """Calculates the value of E(z)^2, which describes evolution of the
+        Hubble parameter with redshift, at redshift z. See, e.g., Bryan &
+        Norman 1998 (ApJ, 495, 80).
+
+        @type z: float
+        @param z: redshift
+        @rtype: float
+        @return: value of E(z)^2 at redshift z
+
+        """
+        # This form of E(z) is more reliable at high redshift. It is basically
+        # the same for all redshifts below 10. But above that, the radiation
+        # term begins to dominate. From Peebles 1993.
+
+        Ez2 = (self.OMEGA_R0 * (1.0 + z)**4 + self.OMEGA_M0 * (1.0 + z)**3 +
+               (1.0 - self.OMEGA_M0 - self.OMEGA_L0) * (1.0 + z)**2 +
+               self.OMEGA_L0)
+
+        return Ez2
+
+    def OmegaMz(self, z):
+        """Calculates the matter density of the universe at redshift z. See,
+        e.g., Bryan & Norman 1998 (ApJ, 495, 80).
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: matter density of universe at redshift z
+
+        """
+        ez2 = self.Ez2(z)
+
+        Omega_Mz = (self.OMEGA_M0 * (1.0 + z)**3) / ez2
+
+        return Omega_Mz
+
+    def OmegaLz(self, z):
+        """ Calculates the dark energy density of the universe at redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: dark energy density of universe at redshift z
+
+        """
+        ez2 = self.Ez2(z)
+
+        return self.OMEGA_L0 / ez2
+
+    def OmegaRz(self, z):
+        """ Calculates the radiation density of the universe at redshift z.
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: radiation density of universe at redshift z
+
+        """
+        ez2 = self.Ez2(z)
+
+        return self.OMEGA_R0 * (1.0 + z)**4 / ez2
+
+    def DeltaVz(self, z):
+        """Calculates the density contrast of a virialised region
+        S{Delta}V(z), assuming a S{Lambda}CDM-type flat cosmology. See, e.g.,
+        Bryan & Norman 1998 (ApJ, 495, 80).
+
+        @type z: float or numpy array
+        @param z: redshift
+        @rtype: float or numpy array
+        @return: density contrast of a virialised region at redshift z
+
+        @note: Raises an Exception if OMEGA_M0+OMEGA_L0 is not equal to 1.
+
+        """
+
+        if self._omegaK() == 0.0:
+            Omega_Mz = self.OmegaMz(z)
+            deltaVz = (18.0 * numpy.pi**2 + 82.0 * (Omega_Mz - 1.0) -
+                       39.0 * (Omega_Mz - 1.0)**2)
+            return deltaVz
+        else:
+            raise Exception("cosmology is NOT flat.")
+
+    def RVirialXRayCluster(self, kT, z, betaT):
+        """Calculates the virial radius (in Mpc) of a galaxy cluster at
+        redshift z with X-ray temperature kT, assuming self-similar evolution
+        and a flat cosmology. See Arnaud et al. 2002 (A&A, 389, 1) and Bryan &
+        Norman 1998 (ApJ, 495, 80).
+
+        @type kT: float or numpy array
+        @param kT: cluster X-ray temperature in keV
+        @type z: float or numpy array
+        @param z: redshift
+        @type betaT: float or numpy array
+        @param betaT: the normalisation of the virial relation, for which
+            Evrard et al. 1996 (ApJ,469, 494) find a value of 1.05
+        @rtype: float or numpy array
+        @return: virial radius of cluster in Mpc
+
+        @note: Raises an Exception if OMEGA_M0+OMEGA_L0 is not equal to 1.
+
+        """
+
+        return self.virialXRayClusters(kT, z, betaT)[0]
+
+    def virialXRayClusters(self, kT, z, betaT):
+        """Calculates the virial radii (in Mpc) and density contrasts
+        S{Delta}V(z) of galaxy clusters with X-ray temperatures kT at
+        redshifts z, as in L{RVirialXRayCluster} and L{DeltaVz}. The inputs
+        are broadcast against each other, so that, e.g., kT and betaT arrays
+        of shape (n_samples, n_clusters) from an MCMC chain may be combined
+        with a redshift array of shape (n_clusters,).
+
+        @type kT: float or numpy array
+        @param kT: cluster X-ray temperatures in keV
+        @type z: float or numpy array
+        @param z: redshifts
+        @type betaT: float or numpy array
+        @param betaT: the normalisation(s) of the virial relation
+        @rtype: tuple
+        @return: virial radii in Mpc, density contrasts S{Delta}V(z)
+
+        @note: Raises an Exception if OMEGA_M0+OMEGA_L0 is not equal to 1.
+
+        """
+
+        z = numpy.asarray(z, dtype=float)
+        deltaVz = self.DeltaVz(z)
+        Omega_Mz = self.OmegaMz(z)
+        deltaz = (deltaVz * self.OMEGA_M0) / (18.0 * numpy.pi**2 * Omega_Mz)
+
+        # The equation quoted in Arnaud, Aghanim & Neumann is for h50, so
+        # need to scale it
+        h50 = self.H0 / 50.0
+        Rv = (3.80 * numpy.sqrt(betaT) * deltaz**-0.5 * (1.0 + z)**-1.5 *
+              numpy.sqrt(numpy.asarray(kT, dtype=float) / 10.0) * (1.0 / h50))
+
+        return Rv, deltaVz
+
+
+_DEFAULT_COSMOLOGY = None
+
+
+#------------------------------------------------------------------------------
+def _defaultCosmology():
+    """Returns the L{Cosmology} instance used by the module-level functions.
+    This is cached, keyed on the module-level parameters, and is replaced by
+    a new instance (never modified) whenever they change, so that it may be
+    shared safely between threads. The distance table of the previous
+    instance is handed on to the new one, and is reused if still valid.
+
+    """
+
+    global _DEFAULT_COSMOLOGY
+
+    key = (OMEGA_M0, OMEGA_L0, OMEGA_R0, H0, USE_TABLES, TABLE_ZMAX,
+           TABLE_STEPS, TABLE_CACHE_DIR)
+    cached = _DEFAULT_COSMOLOGY
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    cosmology = Cosmology(*key)
+    if cached is not None:
+        cosmology._distanceTable = cached[1]._distanceTable
+    _DEFAULT_COSMOLOGY = (key, cosmology)
+
+    return cosmology
+
+
 #------------------------------------------------------------------------------
 def dl(z):
     """Calculates the luminosity distance in Mpc at redshift z.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: luminosity distance in Mpc
 
-    """
+    @note: numpy arrays are fastest if the cosmology is flat (see
+        L{Cosmology.isFlat}) or L{USE_TABLES} is set; otherwise each
+        redshift is integrated separately.
 
-    DM = dm(z)
-    DL = (1.0 + z) * DM
+    """
 
-    return DL
+    return _defaultCosmology().dl(z)
 
 
 #------------------------------------------------------------------------------
 def da(z):
     """Calculates the angular diameter distance in Mpc at redshift z.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: angular diameter distance in Mpc
 
+    @note: numpy arrays are fastest if the cosmology is flat (see
+        L{Cosmology.isFlat}) or L{USE_TABLES} is set; otherwise each
+        redshift is integrated separately.
+
     """
-    DM = dm(z)
-    DA = DM / (1.0 + z)
 
-    return DA
+    return _defaultCosmology().da(z)
 
 
 #------------------------------------------------------------------------------
@@ -82,66 +979,36 @@ def dm(z):
     """Calculates the transverse comoving distance (proper motion distance) in
     Mpc at redshift z.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: transverse comoving distance (proper motion distance) in Mpc
 
-    """
-
-    def _yn(x):
-        # Function to be integrated
-        return (1.0 / math.sqrt(OMEGA_M0 * x + OMEGA_L0 * math.pow(x, 4) +
-                                OMEGA_K * math.pow(x, 2)))
+    @note: numpy arrays are fastest if the cosmology is flat (see
+        L{Cosmology.isFlat}) or L{USE_TABLES} is set; otherwise each
+        redshift is integrated separately.
 
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
-
-    # Integration limits
-    xMax = 1.0
-    xMin = 1.0 / (1.0 + z)
-
-    integralValue, integralError = integrate.quad(_yn, xMin, xMax)
-
-    if OMEGA_K > 0.0:
-        DM = (C_LIGHT / H0 * math.pow(
-            abs(OMEGA_K), -0.5) *
-              math.sinh(math.sqrt(abs(OMEGA_K)) * integralValue))
-    elif OMEGA_K == 0.0:
-        DM = C_LIGHT / H0 * integralValue
-    elif OMEGA_K < 0.0:
-        DM = (C_LIGHT / H0 * math.pow(
-            abs(OMEGA_K), -0.5) *
-              math.sin(math.sqrt(abs(OMEGA_K)) * integralValue))
+    """
 
-    return DM
+    return _defaultCosmology().dm(z)
 
 
 #------------------------------------------------------------------------------
 def dc(z):
     """Calculates the line of sight comoving distance in Mpc at redshift z.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: transverse comoving distance (proper motion distance) in Mpc
 
-    """
-    def _yn(x):
-        # Function to be integrated
-        return (1.0 / math.sqrt(OMEGA_M0 * x + OMEGA_L0 * math.pow(x, 4) +
-                                OMEGA_K * math.pow(x, 2)))
-
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
-
-    # Integration limits
-    xMax = 1.0
-    xMin = 1.0 / (1.0 + z)
+    @note: numpy arrays are fastest if the cosmology is flat (see
+        L{Cosmology.isFlat}) or L{USE_TABLES} is set; otherwise each
+        redshift is integrated separately.
 
-    integralValue, integralError = integrate.quad(_yn, xMin, xMax)
-
-    DC = C_LIGHT / H0 * integralValue
+    """
 
-    return DC
+    return _defaultCosmology().dc(z)
 
 
 #------------------------------------------------------------------------------
@@ -151,17 +1018,18 @@ def dVcdz(z):
     universe integrate this function between two redshifts and multiply by the
     total area of the sky, 4pi steradians.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: comoving volume element per steradian
 
-    """
+    @note: numpy arrays are fastest if the cosmology is flat (see
+        L{Cosmology.isFlat}) or L{USE_TABLES} is set; otherwise each
+        redshift is integrated separately.
 
-    dH = C_LIGHT / H0
-    dVcdz = (dH * (math.pow(da(z), 2)) * (math.pow(1 + z, 2)) / Ez(z))
+    """
 
-    return dVcdz
+    return _defaultCosmology().dVcdz(z)
 
 
 #------------------------------------------------------------------------------
@@ -176,34 +1044,7 @@ def dl2z(distanceMpc):
 
     """
 
-    dTarget = distanceMpc
-
-    toleranceMpc = 0.1
-
-    zMin = 0.0
-    zMax = 10.0
-
-    diff = dl(zMax) - dTarget
-    while diff < 0:
-        zMax = zMax + 5.0
-        diff = dl(zMax) - dTarget
-
-    zTrial = zMin + (zMax - zMin) / 2.0
-
-    dTrial = dl(zTrial)
-    diff = dTrial - dTarget
-    while abs(diff) > toleranceMpc:
-
-        if diff > 0:
-            zMax = zMax - (zMax - zMin) / 2.0
-        else:
-            zMin = zMin + (zMax - zMin) / 2.0
-
-        zTrial = zMin + (zMax - zMin) / 2.0
-        dTrial = dl(zTrial)
-        diff = dTrial - dTarget
-
-    return zTrial
+    return _defaultCosmology().dl2z(distanceMpc)
 
 
 #------------------------------------------------------------------------------
@@ -218,34 +1059,7 @@ def dc2z(distanceMpc):
 
     """
 
-    dTarget = distanceMpc
-
-    toleranceMpc = 0.1
-
-    zMin = 0.0
-    zMax = 10.0
-
-    diff = dc(zMax) - dTarget
-    while diff < 0:
-        zMax = zMax + 5.0
-        diff = dc(zMax) - dTarget
-
-    zTrial = zMin + (zMax - zMin) / 2.0
-
-    dTrial = dc(zTrial)
-    diff = dTrial - dTarget
-    while abs(diff) > toleranceMpc:
-
-        if diff > 0:
-            zMax = zMax - (zMax - zMin) / 2.0
-        else:
-            zMin = zMin + (zMax - zMin) / 2.0
-
-        zTrial = zMin + (zMax - zMin) / 2.0
-        dTrial = dc(zTrial)
-        diff = dTrial - dTarget
-
-    return zTrial
+    return _defaultCosmology().dc2z(distanceMpc)
 
 
 #------------------------------------------------------------------------------
@@ -258,22 +1072,7 @@ def t0():
 
     """
 
-    def _yn(x):
-        # Function to be integrated
-        return (1.0 / math.sqrt(OMEGA_M0 * x + OMEGA_L0 * math.pow(x, 4) +
-                                OMEGA_K * math.pow(x, 2)))
-
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
-
-    # Integration limits
-    xMax = 1.0
-    xMin = 0
-
-    integralValue, integralError = integrate.quad(_yn, xMin, xMax)
-
-    T0 = (1.0 / H0 * integralValue * 3.08e19) / 3.16e7 / 1e9
-
-    return T0
+    return _defaultCosmology().t0()
 
 
 #------------------------------------------------------------------------------
@@ -281,29 +1080,18 @@ def tl(z):
     """ Calculates the lookback time in Gyr to redshift z for the current set
     of cosmological parameters.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: lookback time in Gyr to redshift z
 
-    """
-
-    def _yn(x):
-        # Function to be integrated
-        return (1.0 / math.sqrt(OMEGA_M0 * x + OMEGA_L0 * math.pow(x, 4) +
-                                OMEGA_K * math.pow(x, 2)))
-
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
-
-    # Integration limits
-    xMax = 1.0
-    xMin = 1. / (1. + z)
-
-    integralValue, integralError = integrate.quad(_yn, xMin, xMax)
+    @note: numpy arrays are fastest if the cosmology is flat (see
+        L{Cosmology.isFlat}) or L{USE_TABLES} is set; otherwise each
+        redshift is integrated separately.
 
-    T0 = (1.0 / H0 * integralValue * 3.08e19) / 3.16e7 / 1e9
+    """
 
-    return T0
+    return _defaultCosmology().tl(z)
 
 
 #------------------------------------------------------------------------------
@@ -311,16 +1099,18 @@ def tz(z):
     """Calculates the age of the universe at redshift z for the current set of
     cosmological parameters.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: age of the universe in Gyr at redshift z
 
-    """
+    @note: numpy arrays are fastest if the cosmology is flat (see
+        L{Cosmology.isFlat}) or L{USE_TABLES} is set; otherwise each
+        redshift is integrated separately.
 
-    TZ = t0() - tl(z)
+    """
 
-    return TZ
+    return _defaultCosmology().tz(z)
 
 
 #------------------------------------------------------------------------------
@@ -336,37 +1126,8 @@ def tl2z(tlGyr):
     @note: Raises ValueError if tlGyr is not positive.
 
     """
-    if tlGyr < 0.:
-        raise ValueError('Lookback time must be positive')
 
-    tTarget = tlGyr
-
-    toleranceGyr = 0.001
-
-    zMin = 0.0
-    zMax = 10.0
-
-    diff = tl(zMax) - tTarget
-    while diff < 0:
-        zMax = zMax + 5.0
-        diff = tl(zMax) - tTarget
-
-    zTrial = zMin + (zMax - zMin) / 2.0
-
-    tTrial = tl(zTrial)
-    diff = tTrial - tTarget
-    while abs(diff) > toleranceGyr:
-
-        if diff > 0:
-            zMax = zMax - (zMax - zMin) / 2.0
-        else:
-            zMin = zMin + (zMax - zMin) / 2.0
-
-        zTrial = zMin + (zMax - zMin) / 2.0
-        tTrial = tl(zTrial)
-        diff = tTrial - tTarget
-
-    return zTrial
+    return _defaultCosmology().tl2z(tlGyr)
 
 
 #------------------------------------------------------------------------------
@@ -382,12 +1143,8 @@ def tz2z(tzGyr):
     @note: Raises ValueError if Universe age not positive
 
     """
-    if tzGyr <= 0:
-        raise ValueError('Universe age must be positive.')
-    tl = t0() - tzGyr
-    z = tl2z(tl)
 
-    return z
+    return _defaultCosmology().tz2z(tzGyr)
 
 
 #------------------------------------------------------------------------------
@@ -421,9 +1178,7 @@ def Ez(z):
 
     """
 
-    Ez = math.sqrt(Ez2(z))
-
-    return Ez
+    return _defaultCosmology().Ez(z)
 
 
 #------------------------------------------------------------------------------
@@ -438,14 +1193,8 @@ def Ez2(z):
     @return: value of E(z)^2 at redshift z
 
     """
-    # This form of E(z) is more reliable at high redshift. It is basically the
-    # same for all redshifts below 10. But above that, the radiation term
-    # begins to dominate. From Peebles 1993.
-
-    Ez2 = (OMEGA_R0 * math.pow(1.0 + z, 4) + OMEGA_M0 * math.pow(1.0 + z, 3) +
-           (1.0 - OMEGA_M0 - OMEGA_L0) * math.pow(1.0 + z, 2) + OMEGA_L0)
 
-    return Ez2
+    return _defaultCosmology().Ez2(z)
 
 
 #------------------------------------------------------------------------------
@@ -453,47 +1202,42 @@ def OmegaMz(z):
     """Calculates the matter density of the universe at redshift z. See, e.g.,
     Bryan & Norman 1998 (ApJ, 495, 80).
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: matter density of universe at redshift z
 
     """
-    ez2 = Ez2(z)
 
-    Omega_Mz = (OMEGA_M0 * math.pow(1.0 + z, 3)) / ez2
-
-    return Omega_Mz
+    return _defaultCosmology().OmegaMz(z)
 
 
 #------------------------------------------------------------------------------
 def OmegaLz(z):
     """ Calculates the dark energy density of the universe at redshift z.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: dark energy density of universe at redshift z
 
     """
-    ez2 = Ez2(z)
 
-    return OMEGA_L0 / ez2
+    return _defaultCosmology().OmegaLz(z)
 
 
 #------------------------------------------------------------------------------
 def OmegaRz(z):
     """ Calculates the radiation density of the universe at redshift z.
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: radiation density of universe at redshift z
 
     """
-    ez2 = Ez2(z)
 
-    return OMEGA_R0 * math.pow(1 + z, 4) / ez2
+    return _defaultCosmology().OmegaRz(z)
 
 
 #------------------------------------------------------------------------------
@@ -502,9 +1246,9 @@ def DeltaVz(z):
     assuming a S{Lambda}CDM-type flat cosmology. See, e.g., Bryan & Norman
     1998 (ApJ, 495, 80).
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: density contrast of a virialised region at redshift z
 
     @note: If OMEGA_M0+OMEGA_L0 is not equal to 1, this routine exits and
@@ -513,15 +1257,7 @@ def DeltaVz(z):
 
     """
 
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
-
-    if OMEGA_K == 0.0:
-        Omega_Mz = OmegaMz(z)
-        deltaVz = (18.0 * math.pow(math.pi, 2) + 82.0 *
-                   (Omega_Mz - 1.0) - 39.0 * math.pow(Omega_Mz - 1, 2))
-        return deltaVz
-    else:
-        raise Exception("cosmology is NOT flat.")
+    return _defaultCosmology().DeltaVz(z)
 
 
 #------------------------------------------------------------------------------
@@ -531,14 +1267,14 @@ def RVirialXRayCluster(kT, z, betaT):
     cosmology. See Arnaud et al. 2002 (A&A, 389, 1) and Bryan & Norman 1998
     (ApJ, 495, 80). A flat S{Lambda}CDM-type flat cosmology is assumed.
 
-    @type kT: float
+    @type kT: float or numpy array
     @param kT: cluster X-ray temperature in keV
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @type betaT: float
+    @type betaT: float or numpy array
     @param betaT: the normalisation of the virial relation, for which Evrard et
     al. 1996 (ApJ,469, 494) find a value of 1.05
-    @rtype: float
+    @rtype: float or numpy array
     @return: virial radius of cluster in Mpc
 
     @note: If OMEGA_M0+OMEGA_L0 is not equal to 1, this routine exits and
@@ -546,25 +1282,32 @@ def RVirialXRayCluster(kT, z, betaT):
 
     """
 
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+    return _defaultCosmology().RVirialXRayCluster(kT, z, betaT)
+
 
-    if OMEGA_K == 0.0:
-        Omega_Mz = OmegaMz(z)
-        deltaVz = (18.0 * math.pow(math.pi, 2) + 82.0 *
-                   (Omega_Mz - 1.0) - 39.0 * math.pow(Omega_Mz - 1, 2))
-        deltaz = (deltaVz * OMEGA_M0) / (18.0 * math.pow(math.pi, 2) *
-                                         Omega_Mz)
+#------------------------------------------------------------------------------
+def virialXRayClusters(kT, z, betaT):
+    """Calculates the virial radii (in Mpc) and density contrasts
+    S{Delta}V(z) of galaxy clusters with X-ray temperatures kT at redshifts
+    z, as in L{RVirialXRayCluster} and L{DeltaVz}, in one call. The inputs
+    are broadcast against each other, so that, e.g., kT and betaT arrays of
+    shape (n_samples, n_clusters) from an MCMC chain may be combined with a
+    redshift array of shape (n_clusters,).
+
+    @type kT: float or numpy array
+    @param kT: cluster X-ray temperatures in keV
+    @type z: float or numpy array
+    @param z: redshifts
+    @type betaT: float or numpy array
+    @param betaT: the normalisation(s) of the virial relation
+    @rtype: tuple
+    @return: virial radii in Mpc, density contrasts S{Delta}V(z)
+
+    @note: Raises an Exception if OMEGA_M0+OMEGA_L0 is not equal to 1.
 
-        # The equation quoted in Arnaud, Aghanim & Neumann is for h50, so need
-        # to scale it
-        h50 = H0 / 50.0
-        Rv = (3.80 * math.sqrt(betaT) * math.pow(deltaz, -0.5) *
-              math.pow(1.0 + z,
-                       (-3.0 / 2.0)) * math.sqrt(kT / 10.0) * (1.0 / h50))
+    """
 
-        return Rv
+    return _defaultCosmology().virialXRayClusters(kT, z, betaT)
 
-    else:
-        raise Exception("cosmology is NOT flat.")
 
 #------------------------------------------------------------------------------
@@ -8,8 +8,301 @@ U{http://astlib.sourceforge.net}
 
 """
 
+import warnings
+from multiprocessing.pool import ThreadPool
 import numpy
+try:
+    from scipy import sparse, spatial
+    from scipy.sparse import csgraph
+except ImportError:
+    print("WARNING: astCoords failed to import scipy modules - ", )
+    print("some functions will not work")
 from PyWCSTools import wcscon
+from . import astCalc
+
+
+#-----------------------------------------------------------------------------
+def _parseFixedFields(chars):
+    """Parses whitespace separated plain decimal numbers (an optional sign,
+    digits and an optional decimal point) from a (N, width) uint8 array of
+    characters, one column at a time. Each number is formed as an exact
+    integer divided by a power of ten, so that the result is identical to
+    float() of the same text.
+
+    @rtype: tuple
+    @return: (fields, nFields, bad), where fields is an (N, 3) array of the
+        first three numbers in each row, nFields the count of numbers in each
+        row, and bad flags rows containing anything else (which must be
+        parsed another way)
+
+    """
+    # Character classes: 0 space, 1 digit, 2 point, 3 sign, 4 anything else
+    classes = numpy.full(256, 4, dtype=numpy.uint8)
+    classes[ord(' ')] = 0
+    classes[ord('0'):ord('9') + 1] = 1
+    classes[ord('.')] = 2
+    classes[ord('-')] = 3
+    classes[ord('+')] = 3
+
+    N = chars.shape[0]
+    charClasses = classes[chars]
+    if N > 0 and numpy.all(charClasses == charClasses[0]):
+        result = _parseUniformFields(chars, charClasses[0])
+        if result is not None:
+            return result
+
+    fields = numpy.zeros((4, N))
+    nFields = numpy.zeros(N, dtype=int)
+    bad = numpy.zeros(N, dtype=bool)
+    mantissa = numpy.zeros(N, dtype=numpy.int64)
+    digits = numpy.zeros(N, dtype=int)
+    decimals = numpy.zeros(N, dtype=int)
+    negative = numpy.zeros(N, dtype=bool)
+    point = numpy.zeros(N, dtype=bool)
+    inField = numpy.zeros(N, dtype=bool)
+    powers = 10.0**numpy.arange(16)
+    rows = numpy.arange(N)
+
+    # Work on contiguous columns
+    columns = numpy.ascontiguousarray(chars.T)
+    for c in columns:
+        cls = classes[c]
+        space = cls == 0
+        end = space & inField
+        if end.any():
+            # Store each completed number (numbers after the third go to a
+            # spare row), then reset the state of those rows
+            # Up to 15 digits keeps the mantissa exact as a float (and well
+            # clear of int64 overflow)
+            bad |= end & ((digits == 0) | (digits > 15))
+            value = mantissa / powers[numpy.minimum(decimals, 15)]
+            value[negative] = -value[negative]
+            index = numpy.minimum(nFields[end], 3)
+            fields[index, rows[end]] = value[end]
+            nFields += end
+            keep = ~end
+            mantissa *= keep
+            digits *= keep
+            decimals *= keep
+            negative &= keep
+            point &= keep
+        isDigit = cls == 1
+        isPoint = cls == 2
+        isSign = cls == 3
+        bad |= (cls == 4) | (isSign & inField) | (isPoint & point)
+        mantissa = numpy.where(isDigit, mantissa * 10 + (c - ord('0')),
+                               mantissa)
+        digits += isDigit
+        decimals += isDigit & point
+        point |= isPoint
+        negative |= isSign & (c == ord('-'))
+        inField = ~space
+
+    fields = fields[:3].T
+
+    return fields, nFields, bad
+
+
+#-----------------------------------------------------------------------------
+def _parseUniformFields(chars, pattern):
+    """Fast path of L{_parseFixedFields} for when every row has the same
+    layout, given by the character classes in pattern (so the digits of each
+    number are in the same columns in every row). Returns None if the layout
+    is not one of plain decimal numbers.
+
+    """
+    N = chars.shape[0]
+    starts = [j for j in range(len(pattern)) if pattern[j] != 0 and
+              (j == 0 or pattern[j - 1] == 0)]
+    if len(starts) == 0 or numpy.any(pattern == 4):
+        return None
+
+    fields = numpy.zeros((N, 3))
+    for k, start in enumerate(starts):
+        end = start
+        while end < len(pattern) and pattern[end] != 0:
+            end += 1
+        token = list(pattern[start:end])
+        if (3 in token[1:] or token.count(2) > 1 or
+                not 0 < token.count(1) <= 15):
+            return None
+        if k > 2:
+            continue
+        mantissa = numpy.zeros(N, dtype=numpy.int64)
+        decimals = 0
+        for j in range(start, end):
+            if pattern[j] == 1:
+                mantissa = mantissa * 10 + (chars[:, j] - ord('0'))
+                if 2 in token[:j - start]:
+                    decimals += 1
+        value = mantissa / 10.0**decimals
+        if token[0] == 3:
+            value[chars[:, start] == ord('-')] *= -1
+        fields[:, k] = value
+
+    nFields = numpy.full(N, len(starts), dtype=int)
+
+    return fields, nFields, numpy.zeros(N, dtype=bool)
+
+
+#-----------------------------------------------------------------------------
+def _checkDelimitedFields(chars, delimiter, strings):
+    """Checks that a (N, width) uint8 array of characters splits into fields
+    in the same way as in the scalar code, which splits each string on the
+    delimiter (or on whitespace, if delimiter is None) and passes each of
+    the first three fields to float(). Each of those fields must hold a
+    single token, surrounded by nothing but whitespace. Raises ValueError
+    for the first string that does not.
+
+    @rtype: numpy array
+    @return: chars, with everything after the third field (which the scalar
+        code ignores) blanked out
+
+    """
+    # Character kinds: 0 whitespace (including null padding, and everything
+    # stripped by float()), 1 delimiter, 2 anything else
+    kindTable = numpy.full(256, 2, dtype=numpy.uint8)
+    kindTable[[0, 9, 10, 11, 12, 13, 28, 29, 30, 31, 32]] = 0
+    if delimiter is not None:
+        kindTable[delimiter] = 1
+    kinds = kindTable[chars]
+
+    # Rows with the same layout need only be checked once. For strings of
+    # up to 32 characters, the layouts are found by packing each into an
+    # integer
+    layout = None
+    if chars.shape[0] > 0 and chars.shape[1] <= 32:
+        key = numpy.zeros(chars.shape[0], dtype=numpy.uint64)
+        for column in kinds.T:
+            key = (key << numpy.uint64(2)) | column
+        key, first, layout = numpy.unique(key, return_index=True,
+                                          return_inverse=True)
+        kinds = kinds[first]
+        layout = layout.reshape(-1)
+
+    isToken = kinds == 2
+    tokenStart = isToken.copy()
+    tokenStart[:, 1:] &= ~isToken[:, :-1]
+    tokens = numpy.cumsum(tokenStart, axis=1)
+
+    if delimiter is None:
+        used = tokens <= 3
+    else:
+        # Each of the first three fields must hold exactly one token, i.e.
+        # the n-th token must be in the n-th field, and there must be as
+        # many tokens as fields
+        field = numpy.cumsum(kinds == 1, axis=1)
+        used = field < 3
+        bad = numpy.any(tokenStart & used & (tokens != field + 1), axis=1)
+        nTokens = numpy.max(numpy.where(used, tokens, 0), axis=1)
+        bad |= nTokens != numpy.minimum(field[:, -1], 2) + 1
+        if layout is not None:
+            bad = bad[layout]
+        if bad.any():
+            raise ValueError("could not convert string to float: %r" %
+                             strings[numpy.argmax(bad)])
+
+    if numpy.all(used):
+        return chars
+    if layout is not None:
+        used = used[layout]
+
+    return numpy.where(used, chars, ord(' ')).astype(numpy.uint8)
+
+
+#-----------------------------------------------------------------------------
+def _sexagesimalFields(strings, delimiter):
+    """Splits an array of delimited coordinate strings (unicode or bytes) into
+    fields, working on the characters as a uint8 array rather than string by
+    string. Numeric arrays are returned unchanged as float arrays.
+
+    @rtype: tuple
+    @return: (fields, nFields), where fields is an (N, 3) float array of the
+        first three fields of each string (zero padded), and nFields is the
+        number of fields found in each string; or, for numeric input, (values,
+        None)
+
+    """
+    strings = numpy.asarray(strings)
+    if strings.dtype.kind in 'biuf':
+        return strings.astype(float).ravel(), None
+    if strings.dtype.kind == 'O':
+        strings = numpy.array([s if isinstance(s, bytes) else str(s)
+                               for s in strings.ravel()])
+    strings = strings.ravel()
+    original = strings
+    if delimiter == "":
+        delimiterCode = None
+    elif len(delimiter) == 1 and ord(delimiter) <= 127:
+        delimiterCode = ord(delimiter)
+    else:
+        # Other delimiters are replaced by a single control character
+        delimiterCode = 1
+        if strings.dtype.kind == 'U':
+            strings = numpy.char.replace(strings, delimiter, chr(1))
+        else:
+            strings = numpy.char.replace(strings, delimiter.encode(), b'\x01')
+
+    # Unicode strings are stored as 4 byte characters; these are converted
+    # to single bytes directly, provided that they are all ASCII
+    if strings.dtype.kind == 'U':
+        width = strings.dtype.itemsize // 4
+        codes = strings.view(numpy.uint32).reshape(-1, max(width, 1))
+        if width > 0 and codes.max() > 127:
+            try:
+                strings = strings.astype('S')
+            except UnicodeEncodeError:
+                row = numpy.argmax(numpy.any(codes > 127, axis=1))
+                raise ValueError("could not convert string to float: %r" %
+                                 original[row])
+            width = strings.dtype.itemsize
+            codes = strings.view(numpy.uint8).reshape(-1, max(width, 1))
+    else:
+        width = strings.dtype.itemsize
+        codes = strings.view(numpy.uint8).reshape(-1, max(width, 1))
+    chars = numpy.zeros((strings.shape[0], width + 1), numpy.uint8)
+    if width > 0:
+        chars[:, :-1] = codes
+
+    chars = _checkDelimitedFields(chars, delimiterCode, original)
+
+    # Delimiters, padding and other whitespace all become field separators
+    translation = numpy.arange(256, dtype=numpy.uint8)
+    translation[[0, 9, 10, 11, 12, 13, 28, 29, 30, 31]] = ord(' ')
+    if delimiterCode is not None:
+        translation[delimiterCode] = ord(' ')
+    chars = translation[chars]
+
+    fields, nFields, bad = _parseFixedFields(chars)
+    if bad.any():
+        # Anything else (e.g. exponents) is parsed by numpy, in groups of rows
+        # with the same number of fields
+        badRows = numpy.where(bad)[0]
+        isSpace = chars[badRows] == ord(' ')
+        starts = ~isSpace
+        starts[:, 1:] = starts[:, 1:] & isSpace[:, :-1]
+        nFields[badRows] = starts.sum(axis=1)
+        for n in numpy.unique(nFields[badRows]):
+            rows = badRows[nFields[badRows] == n]
+            if n == 0:
+                continue
+            buffer = chars[rows].tobytes()
+            try:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('error')
+                    values = numpy.fromstring(buffer, sep=' ')
+            except (ValueError, DeprecationWarning):
+                values = None
+            if values is None or values.shape[0] != rows.shape[0] * n:
+                # Slower, but raises ValueError for the first bad field
+                values = numpy.array(buffer.split()).astype(float)
+            values = values.reshape(rows.shape[0], n)
+            fields[rows, :min(n, 3)] = values[:, :3]
+    if numpy.any(nFields == 0):
+        raise ValueError("could not convert string to float: %r" %
+                         strings[numpy.argmin(nFields)])
+
+    return fields, nFields
 
 
 #-----------------------------------------------------------------------------
@@ -17,14 +310,32 @@ def hms2decimal(RAString, delimiter):
     """Converts a delimited string of Hours:Minutes:Seconds format into decimal
     degrees.
 
-    @type RAString: string
-    @param RAString: coordinate string in H:M:S format
+    RAString may also be a list or numpy array of strings (unicode or bytes,
+    e.g. a catalogue column), in which case all of the strings are parsed
+    together and a numpy array of the same shape is returned.
+
+    @type RAString: string, list or numpy array
+    @param RAString: coordinate string(s) in H:M:S format
     @type delimiter: string
     @param delimiter: delimiter character in RAString
-    @rtype: float
-    @return: coordinate in decimal degrees
+    @rtype: float or numpy array
+    @return: coordinate(s) in decimal degrees
 
     """
+    if isinstance(RAString, (list, tuple, numpy.ndarray)):
+        shape = numpy.shape(RAString)
+        fields, nFields = _sexagesimalFields(RAString, delimiter)
+        if nFields is None:
+            return fields.reshape(shape)
+        RAHDecimal = fields[:, 0] + (fields[:, 1] / 60.0)
+        RAHDecimal = RAHDecimal + (fields[:, 2] / 3600.0)
+        RADeg = numpy.where(nFields > 1, (RAHDecimal / 24.0) * 360.0,
+                            fields[:, 0])
+        return RADeg.reshape(shape)
+
+    if isinstance(RAString, bytes) and not isinstance(RAString, str):
+        RAString = RAString.decode()
+
     # is it in HH:MM:SS format?
     if delimiter == "":
         RABits = str(RAString).split()
@@ -48,14 +359,35 @@ def dms2decimal(decString, delimiter):
     """Converts a delimited string of Degrees:Minutes:Seconds format into
     decimal degrees.
 
-    @type decString: string
-    @param decString: coordinate string in D:M:S format
+    decString may also be a list or numpy array of strings (unicode or bytes,
+    e.g. a catalogue column), in which case all of the strings are parsed
+    together and a numpy array of the same shape is returned. As for single
+    strings, a negative sign on the degrees applies to the minutes and
+    seconds too, including when the degrees are zero (e.g. "-00:30:00").
+
+    @type decString: string, list or numpy array
+    @param decString: coordinate string(s) in D:M:S format
     @type delimiter: string
     @param delimiter: delimiter character in decString
-    @rtype: float
-    @return: coordinate in decimal degrees
+    @rtype: float or numpy array
+    @return: coordinate(s) in decimal degrees
 
     """
+    if isinstance(decString, (list, tuple, numpy.ndarray)):
+        shape = numpy.shape(decString)
+        fields, nFields = _sexagesimalFields(decString, delimiter)
+        if nFields is None:
+            return fields.reshape(shape)
+        # "-00" parses as -0.0, so the sign bit identifies negative values
+        sign = numpy.where(numpy.signbit(fields[:, 0]), -1.0, 1.0)
+        decDeg = fields[:, 0] + sign * (fields[:, 1] / 60.0)
+        decDeg = decDeg + sign * (fields[:, 2] / 3600.0)
+        decDeg = numpy.where(nFields > 1, decDeg, fields[:, 0])
+        return decDeg.reshape(shape)
+
+    if isinstance(decString, bytes) and not isinstance(decString, str):
+        decString = decString.decode()
+
     # is it in DD:MM:SS format?
     if delimiter == "":
         decBits = str(decString).split()
@@ -80,18 +412,258 @@ def dms2decimal(decString, delimiter):
 
 
 #-----------------------------------------------------------------------------
-def decimal2hms(RADeg, delimiter):
+def _truncatedRepr(x, decimals):
+    """Emulates truncating repr(x) after the given number of decimal places,
+    for an array of positive floats x that repr() writes in positional
+    notation (1e-4 <= x < 1e12), without forming any strings.
+
+    This relies on repr() giving the shortest string that rounds to x: that
+    string has at most `decimals` decimal places if and only if a multiple of
+    10**-decimals rounds to x, in which case it is that multiple. Otherwise,
+    the truncated string is the largest multiple of 10**-decimals below x.
+
+    @rtype: tuple
+    @return: (k, nDecimals), where the truncated string has the value
+        k/10**decimals and nDecimals decimal places (fewer than `decimals` if
+        repr(x) itself is shorter, e.g. '12.3')
+
+    """
+    scale = 10.0**decimals
+    k0 = numpy.floor(x * scale)
+    k = k0 - 1
+    for candidate in [k0, k0 + 1]:
+        k = numpy.where(candidate / scale < x, candidate, k)
+    exact = numpy.zeros(x.shape, dtype=bool)
+    for candidate in [k0 - 1, k0, k0 + 1]:
+        isExact = candidate / scale == x
+        k = numpy.where(isExact, candidate, k)
+        exact |= isExact
+
+    k = k.astype(numpy.int64)
+    nDecimals = numpy.full(x.shape, decimals)
+    for i in range(1, decimals):
+        nDecimals[exact & (k % 10**i == 0)] = decimals - i
+
+    return k, nDecimals
+
+
+#-----------------------------------------------------------------------------
+def _digitChars(values, width):
+    """Returns the zero padded decimal digits of an array of non-negative
+    integers as a (N, width) array of character codes.
+
+    """
+    powers = 10**numpy.arange(width - 1, -1, -1, dtype=numpy.int64)
+    values = numpy.asarray(values, dtype=numpy.int64)[:, numpy.newaxis]
+
+    return ((values // powers) % 10 + ord('0')).astype(numpy.uint32)
+
+
+#-----------------------------------------------------------------------------
+def _charsToStrings(pieces, N):
+    """Joins a list of (N, w) arrays of character codes and strings (repeated
+    on every row) into an array of N unicode strings. Null characters at the
+    end of a row are dropped.
+
+    """
+    columns = []
+    for piece in pieces:
+        if isinstance(piece, str):
+            piece = numpy.array([ord(c) for c in piece], dtype=numpy.uint32)
+            piece = numpy.tile(piece, (N, 1))
+        columns.append(piece.astype(numpy.uint32))
+    chars = numpy.ascontiguousarray(numpy.hstack(columns))
+    if chars.shape[1] == 0:
+        return numpy.full(N, '', dtype='U1')
+
+    return chars.view('U%d' % chars.shape[1]).reshape(N)
+
+
+#-----------------------------------------------------------------------------
+def _roundedSexagesimal(degrees, delimiter, precision, signed):
+    """Formats an array of angles as fixed width sexagesimal strings, with
+    the seconds correctly rounded to the given number of decimal places (and
+    rounding carried into the minutes and degrees/hours). If signed is False,
+    the angles are taken to be hours, wrapped into 0 <= h < 24.
+
+    """
+    N = degrees.shape[0]
+    scale = 10**int(precision)
+    units = numpy.rint(numpy.abs(degrees) * 3600.0 * scale).astype(
+        numpy.int64)
+    if not signed:
+        units = units % (24 * 3600 * scale)
+    seconds = units % (60 * scale)
+    minutes = (units // (60 * scale)) % 60
+    whole = units // (3600 * scale)
+    wholeWidth = max(2, len(str(whole.max())) if N > 0 else 2)
+
+    pieces = [_digitChars(whole, wholeWidth), delimiter,
+              _digitChars(minutes, 2), delimiter,
+              _digitChars(seconds // scale, 2)]
+    if precision > 0:
+        pieces = pieces + ['.', _digitChars(seconds % scale, int(precision))]
+    if signed:
+        sign = numpy.where(degrees < 0, ord('-'), ord('+'))
+        pieces = [sign[:, numpy.newaxis]] + pieces
+
+    return _charsToStrings(pieces, N)
+
+
+#-----------------------------------------------------------------------------
+def _fillIrregular(strings, irregular, values, scalarFunc, delimiter):
+    """Formats the rows flagged as irregular with the scalar function,
+    widening the string array if needed.
+
+    """
+    if not numpy.any(irregular):
+        return strings
+    rows = numpy.where(irregular)[0]
+    extra = [scalarFunc(float(values[i]), delimiter) for i in rows]
+    width = max(strings.dtype.itemsize // 4, max(len(e) for e in extra))
+    strings = strings.astype('U%d' % width)
+    strings[rows] = extra
+
+    return strings
+
+
+#-----------------------------------------------------------------------------
+def _decimal2hmsArray(RADeg, delimiter, precision):
+    """Array version of L{decimal2hms}.
+
+    """
+    RADeg = numpy.asarray(RADeg, dtype=float)
+    shape = RADeg.shape
+    RADeg = RADeg.ravel()
+    N = RADeg.shape[0]
+    if not numpy.all(numpy.isfinite(RADeg)):
+        raise ValueError("coordinates must be finite")
+    if precision is not None:
+        return _roundedSexagesimal((RADeg % 360.0) / 15.0, delimiter,
+                                   precision, False).reshape(shape)
+
+    with numpy.errstate(invalid='ignore'):
+        hours = (RADeg / 360.0) * 24
+        # Rows that need the scalar code: very small or large values (which
+        # repr() writes in exponent notation), and minutes within rounding
+        # error of an integer (where the scalar code, which works on the
+        # digits of repr(hours), may round differently)
+        irregular = ~((hours < 100) &
+                      ((hours >= 1e-4) | (hours == 0)))
+        hours = numpy.where(irregular, 0.0, hours)
+        sHours = numpy.where(hours >= 1, numpy.floor(hours), 0.0)
+        fraction = hours - numpy.floor(hours)
+        mins = fraction * 60.0
+        irregular |= ((numpy.abs(mins - numpy.rint(mins)) < 1e-9) &
+                      (fraction != 0))
+        sMins = numpy.where(mins >= 1, numpy.floor(mins), 0.0)
+
+        secs = (hours - (sHours + sMins / 60.0)) * 3600.0
+        k, nDecimals = _truncatedRepr(numpy.where(secs > 0, secs, 1.0), 3)
+    # Seconds that would round up to 60
+    irregular |= (secs >= 0.0001) & (k >= 60000)
+
+    # Emulate the three ways the scalar code writes the seconds
+    tens = _digitChars(k // 1000, 2)
+    decimals = _digitChars(k % 1000, 3)
+    point = numpy.full((N, 1), ord('.'), dtype=numpy.uint32)
+    sSecs = numpy.hstack([tens, point, decimals])
+    twoPlaces = (secs > 0.001) & (nDecimals == 2)
+    sSecs[twoPlaces, 5] = 0
+    small = (secs >= 0.0001) & (secs <= 0.001)
+    sSecs[small] = numpy.hstack([tens[small, 1:], point[small],
+                                 decimals[small], 0 * point[small]])
+    sSecs[secs < 0.0001] = [ord(c) for c in "00.001"]
+
+    strings = _charsToStrings([_digitChars(sHours, 2), delimiter,
+                               _digitChars(sMins, 2), delimiter, sSecs], N)
+    strings = _fillIrregular(strings, irregular, RADeg, decimal2hms,
+                             delimiter)
+
+    return strings.reshape(shape)
+
+
+#-----------------------------------------------------------------------------
+def _decimal2dmsArray(decDeg, delimiter, precision):
+    """Array version of L{decimal2dms}.
+
+    """
+    decDeg = numpy.asarray(decDeg, dtype=float)
+    shape = decDeg.shape
+    decDeg = decDeg.ravel()
+    N = decDeg.shape[0]
+    if not numpy.all(numpy.isfinite(decDeg)):
+        raise ValueError("coordinates must be finite")
+    if precision is not None:
+        return _roundedSexagesimal(decDeg, delimiter, precision,
+                                   True).reshape(shape)
+
+    with numpy.errstate(invalid='ignore'):
+        absDeg = numpy.abs(decDeg)
+        # As in L{_decimal2hmsArray}
+        irregular = ~((absDeg < 100) & ((absDeg >= 1e-4) | (decDeg == 0)))
+        values = decDeg
+        decDeg = numpy.where(irregular, 0.0, decDeg)
+        absDeg = numpy.abs(decDeg)
+        positive = decDeg > 0
+        sDeg = numpy.where(absDeg >= 1, numpy.floor(absDeg), 0.0)
+        fraction = absDeg - numpy.floor(absDeg)
+        mins = fraction * 60.0
+        irregular |= ((numpy.abs(mins - numpy.rint(mins)) < 1e-9) &
+                      (fraction != 0))
+        sMins = numpy.where(mins >= 1, numpy.floor(mins), 0.0)
+
+        # "-00" is -0.0 in the scalar code
+        secs = numpy.where(positive, (decDeg - (sDeg + sMins / 60.0)) * 3600.0,
+                           (decDeg - (-sDeg - sMins / 60.0)) * 3600.0)
+        absSecs = numpy.where(positive, secs, -secs)
+        k, nDecimals = _truncatedRepr(numpy.where(absSecs > 0, absSecs, 1.0),
+                                      2)
+    k = numpy.where(absSecs > 0, k, 0)
+    irregular |= (absSecs > 0) & (absSecs < 0.0001)
+    irregular |= k >= 6000
+
+    sign = numpy.where(positive, ord('+'), ord('-'))[:, numpy.newaxis]
+    strings = _charsToStrings([sign, _digitChars(sDeg, 2), delimiter,
+                               _digitChars(sMins, 2), delimiter,
+                               _digitChars(k // 100, 2), '.',
+                               _digitChars(k % 100, 2)], N)
+    strings = _fillIrregular(strings, irregular, values, decimal2dms,
+                             delimiter)
+
+    return strings.reshape(shape)
+
+
+#-----------------------------------------------------------------------------
+def decimal2hms(RADeg, delimiter, precision=None):
     """Converts decimal degrees to string in Hours:Minutes:Seconds format with
     user specified delimiter.
 
-    @type RADeg: float
-    @param RADeg: coordinate in decimal degrees
+    RADeg may also be a list or numpy array, in which case the whole column is
+    formatted at once and a numpy string array of the same shape is returned,
+    with exactly the same strings as formatting each value in turn.
+
+    If precision is given, the seconds are instead rounded to that many
+    decimal places (carrying into the minutes and hours), RADeg is wrapped
+    into 0 <= RA < 360, and every string has the same width.
+
+    @type RADeg: float, list or numpy array
+    @param RADeg: coordinate(s) in decimal degrees
     @type delimiter: string
     @param delimiter: delimiter character in returned string
-    @rtype: string
-    @return: coordinate string in H:M:S format
+    @type precision: int
+    @param precision: number of decimal places in the seconds, or None
+    @rtype: string or numpy array
+    @return: coordinate string(s) in H:M:S format
 
     """
+    if precision is not None or isinstance(RADeg, (list, tuple,
+                                                   numpy.ndarray)):
+        strings = _decimal2hmsArray(RADeg, delimiter, precision)
+        if strings.ndim == 0:
+            return str(strings)
+        return strings
+
     hours = (RADeg / 360.0) * 24
     #if hours < 10 and hours >= 1:
     if 1 <= hours < 10:
@@ -135,18 +707,35 @@ def decimal2hms(RADeg, delimiter):
 
 
 #------------------------------------------------------------------------------
-def decimal2dms(decDeg, delimiter):
+def decimal2dms(decDeg, delimiter, precision=None):
     """Converts decimal degrees to string in Degrees:Minutes:Seconds format
     with user specified delimiter.
 
-    @type decDeg: float
-    @param decDeg: coordinate in decimal degrees
+    decDeg may also be a list or numpy array, in which case the whole column
+    is formatted at once and a numpy string array of the same shape is
+    returned, with exactly the same strings as formatting each value in turn.
+
+    If precision is given, the seconds are instead rounded to that many
+    decimal places (carrying into the minutes and degrees), and every string
+    has the same width.
+
+    @type decDeg: float, list or numpy array
+    @param decDeg: coordinate(s) in decimal degrees
     @type delimiter: string
     @param delimiter: delimiter character in returned string
-    @rtype: string
-    @return: coordinate string in D:M:S format
+    @type precision: int
+    @param precision: number of decimal places in the seconds, or None
+    @rtype: string or numpy array
+    @return: coordinate string(s) in D:M:S format
 
     """
+    if precision is not None or isinstance(decDeg, (list, tuple,
+                                                    numpy.ndarray)):
+        strings = _decimal2dmsArray(decDeg, delimiter, precision)
+        if strings.ndim == 0:
+            return str(strings)
+        return strings
+
     # Positive
     if decDeg > 0:
         #if decDeg < 10 and decDeg>=1:
@@ -292,51 +881,765 @@ def cart2eq(x, y, z):
     return ra, dec, r
 
 
+#-----------------------------------------------------------------------------
+def _decimalCoords(coords, converter):
+    """Returns coordinates as decimal degrees, parsing them with converter
+    (L{hms2decimal} or L{dms2decimal}, with ':' delimiters) only if they are
+    strings.
+
+    """
+    if isinstance(coords, (str, bytes)) or \
+            numpy.asarray(coords).dtype.kind in ['S', 'U', 'O']:
+        return converter(coords, ':')
+
+    return numpy.asarray(coords, dtype=float)
+
+
+#-----------------------------------------------------------------------------
+def _greatCircleSep(RARad1, sinDec1, cosDec1, RARad2, sinDec2, cosDec2):
+    """Returns the angular separation in radians of positions given by R.A.
+    and the sine and cosine of the dec., using the Vincenty formula, which is
+    accurate at all separations.
+
+    """
+    dRA = RARad2 - RARad1
+    cosdRA = numpy.cos(dRA)
+    x = cosDec2 * numpy.sin(dRA)
+    y = cosDec1 * sinDec2 - sinDec1 * cosDec2 * cosdRA
+    z = sinDec1 * sinDec2 + cosDec1 * cosDec2 * cosdRA
+
+    return numpy.arctan2(numpy.sqrt(x * x + y * y), z)
+
+
 #-----------------------------------------------------------------------------
 def calcAngSepDeg(RADeg1, decDeg1, RADeg2, decDeg2):
     """Calculates the angular separation of two positions on the sky (specified
-    in decimal degrees) in decimal degrees, assuming a tangent plane projection
-    (so separation has to be <90 deg). Note that RADeg2, decDeg2 can be numpy
-    arrays.
+    in decimal degrees) in decimal degrees, along a great circle. The Vincenty
+    formula is used, which is accurate for all separations (0 to 180
+    degrees). All of the arguments can be numpy arrays, which are broadcast
+    against each other. Strings (or arrays of strings) are converted using
+    L{hms2decimal} and L{dms2decimal}, with ':' delimiters.
 
-    @type RADeg1: float
+    @type RADeg1: float or numpy array
     @param RADeg1: R.A. in decimal degrees for position 1
-    @type decDeg1: float
+    @type decDeg1: float or numpy array
     @param decDeg1: dec. in decimal degrees for position 1
     @type RADeg2: float or numpy array
     @param RADeg2: R.A. in decimal degrees for position 2
     @type decDeg2: float or numpy array
     @param decDeg2: dec. in decimal degrees for position 2
-    @rtype: float or numpy array, depending upon type of RADeg2, decDeg2
+    @rtype: float or numpy array, depending upon type of the inputs
     @return: angular separation in decimal degrees
 
     """
 
-    if not isinstance(RADeg1, float):
-        RADeg1 = hms2decimal(RADeg1, ':')
-    if not isinstance(decDeg1, float):
-        decDeg1 = dms2decimal(decDeg1, ':')
-    if not isinstance(RADeg2, float):
-        RADeg2 = hms2decimal(RADeg2, ':')
-    if not isinstance(decDeg2, float):
-        decDeg2 = dms2decimal(decDeg2, ':')
+    RARad1 = numpy.radians(_decimalCoords(RADeg1, hms2decimal))
+    decRad1 = numpy.radians(_decimalCoords(decDeg1, dms2decimal))
+    RARad2 = numpy.radians(_decimalCoords(RADeg2, hms2decimal))
+    decRad2 = numpy.radians(_decimalCoords(decDeg2, dms2decimal))
 
-    cRA = numpy.radians(RADeg1)
-    cDec = numpy.radians(decDeg1)
+    r = numpy.degrees(_greatCircleSep(RARad1, numpy.sin(decRad1),
+                                      numpy.cos(decRad1), RARad2,
+                                      numpy.sin(decRad2), numpy.cos(decRad2)))
 
-    gRA = numpy.radians(RADeg2)
-    gDec = numpy.radians(decDeg2)
+    return r
 
-    #dRA = cRA-gRA
-    #dDec = gDec-cDec
-    cosC = ((numpy.sin(gDec) * numpy.sin(cDec)) +
-            (numpy.cos(gDec) * numpy.cos(cDec) * numpy.cos(gRA - cRA)))
-    x = (numpy.cos(cDec) * numpy.sin(gRA - cRA)) / cosC
-    y = (((numpy.cos(gDec) * numpy.sin(cDec)) -
-          (numpy.sin(gDec) * numpy.cos(cDec) * numpy.cos(gRA - cRA))) / cosC)
-    r = numpy.degrees(numpy.sqrt(x * x + y * y))
 
-    return r
+#-----------------------------------------------------------------------------
+def calcAngSepDegBlocks(RADeg1, decDeg1, RADeg2, decDeg2, maxBytes=2**27):
+    """Calculates the angular separations (see L{calcAngSepDeg}) of every pair
+    of positions in two catalogues, one block of rows at a time, so that the
+    full N x M matrix never has to be held in memory. This is a generator,
+    for example:
+
+    for start, stop, sepDeg in calcAngSepDegBlocks(RA1, dec1, RA2, dec2):
+        nClose[start:stop] = numpy.sum(sepDeg < 0.1, axis=1)
+
+    @type RADeg1: numpy array
+    @param RADeg1: R.A.s in decimal degrees of catalogue 1
+    @type decDeg1: numpy array
+    @param decDeg1: dec.s in decimal degrees of catalogue 1
+    @type RADeg2: numpy array
+    @param RADeg2: R.A.s in decimal degrees of catalogue 2
+    @type decDeg2: numpy array
+    @param decDeg2: dec.s in decimal degrees of catalogue 2
+    @type maxBytes: int
+    @param maxBytes: approximate limit on the memory used by each block,
+        including temporary arrays (at least one row is always computed)
+    @rtype: generator
+    @return: yields (start, stop, sepDeg), where sepDeg is the
+        (stop - start) x M array of separations in decimal degrees between
+        objects start to stop-1 of catalogue 1 and all of catalogue 2
+
+    """
+
+    RARad1 = numpy.radians(numpy.ravel(_decimalCoords(RADeg1, hms2decimal)))
+    decRad1 = numpy.radians(numpy.ravel(_decimalCoords(decDeg1, dms2decimal)))
+    RARad2 = numpy.radians(numpy.ravel(_decimalCoords(RADeg2, hms2decimal)))
+    decRad2 = numpy.radians(numpy.ravel(_decimalCoords(decDeg2, dms2decimal)))
+    sinDec2 = numpy.sin(decRad2)
+    cosDec2 = numpy.cos(decRad2)
+
+    # _greatCircleSep holds about 8 block-sized float arrays at once
+    rowBytes = 8 * 8 * max(RARad2.shape[0], 1)
+    blockRows = max(1, int(maxBytes // rowBytes))
+    for start in range(0, RARad1.shape[0], blockRows):
+        stop = min(start + blockRows, RARad1.shape[0])
+        decRad = decRad1[start:stop, numpy.newaxis]
+        sepRad = _greatCircleSep(RARad1[start:stop, numpy.newaxis],
+                                 numpy.sin(decRad), numpy.cos(decRad),
+                                 RARad2, sinDec2, cosDec2)
+        yield start, stop, numpy.degrees(sepRad)
+
+
+#-----------------------------------------------------------------------------
+def _unitVectors(RADeg, decDeg):
+    """Returns an (N, 3) array of the Cartesian unit vectors (see L{eq2cart})
+    of the given positions in decimal degrees.
+
+    """
+    RADeg = numpy.atleast_1d(numpy.asarray(RADeg, dtype=float)).ravel()
+    decDeg = numpy.atleast_1d(numpy.asarray(decDeg, dtype=float)).ravel()
+    if RADeg.shape != decDeg.shape:
+        raise ValueError("RA and dec. arrays must have the same length")
+
+    return numpy.column_stack(eq2cart(RADeg, decDeg, 1.0))
+
+
+#-----------------------------------------------------------------------------
+def _chordToDeg(chord):
+    """Converts distances between unit vectors into angular separations in
+    decimal degrees.
+
+    """
+    return numpy.degrees(2.0 * numpy.arcsin(numpy.minimum(chord / 2.0, 1.0)))
+
+
+#-----------------------------------------------------------------------------
+def _degToChord(sepDeg):
+    """Converts angular separations in decimal degrees into distances between
+    unit vectors.
+
+    """
+    sepDeg = numpy.minimum(sepDeg, 180.0)
+
+    return 2.0 * numpy.sin(numpy.radians(sepDeg) / 2.0)
+
+
+#-----------------------------------------------------------------------------
+def crossMatch(RADeg1, decDeg1, RADeg2, decDeg2, radiusDeg, nearest=True):
+    """Cross-matches two catalogues of positions (in decimal degrees). The
+    positions are converted to unit vectors (using L{eq2cart}) and catalogue 2
+    is indexed with a k-d tree, so matching takes O((N+M) log M) time rather
+    than the O(N*M) of comparing every pair with L{calcAngSepDeg}. Matching
+    works anywhere on the sky, including near the poles and across RA = 0/360.
+
+    If nearest is True, each object in catalogue 1 is matched to its nearest
+    neighbour in catalogue 2, if that lies within radiusDeg. Otherwise, every
+    pair of objects separated by less than radiusDeg is returned.
+
+    @type RADeg1: numpy array
+    @param RADeg1: R.A.s in decimal degrees of catalogue 1
+    @type decDeg1: numpy array
+    @param decDeg1: dec.s in decimal degrees of catalogue 1
+    @type RADeg2: numpy array
+    @param RADeg2: R.A.s in decimal degrees of catalogue 2
+    @type decDeg2: numpy array
+    @param decDeg2: dec.s in decimal degrees of catalogue 2
+    @type radiusDeg: float
+    @param radiusDeg: matching radius in decimal degrees
+    @type nearest: bool
+    @param nearest: if True, return only the nearest match to each object in
+        catalogue 1; if False, return all matches within radiusDeg
+    @rtype: tuple
+    @return: (index1, index2, sepDeg) - numpy arrays of the indices of the
+        matched objects in catalogues 1 and 2, and their angular separations
+        in decimal degrees, sorted by index1 (and then by separation)
+
+    """
+
+    xyz1 = _unitVectors(RADeg1, decDeg1)
+    xyz2 = _unitVectors(RADeg2, decDeg2)
+    chordRadius = _degToChord(radiusDeg)
+    tree2 = spatial.cKDTree(xyz2)
+
+    if nearest:
+        if xyz2.shape[0] == 0:
+            chord = numpy.full(xyz1.shape[0], numpy.inf)
+            index2 = numpy.zeros(xyz1.shape[0], dtype=int)
+        else:
+            chord, index2 = tree2.query(xyz1, k=1,
+                                        distance_upper_bound=chordRadius)
+        index1 = numpy.where(numpy.isfinite(chord))[0]
+        index2 = index2[index1]
+        chord = chord[index1]
+    else:
+        pairs = spatial.cKDTree(xyz1).sparse_distance_matrix(
+            tree2, chordRadius, output_type='ndarray')
+        order = numpy.lexsort((pairs['v'], pairs['i']))
+        index1 = pairs['i'][order].astype(int)
+        index2 = pairs['j'][order].astype(int)
+        chord = pairs['v'][order]
+
+    return index1, index2, _chordToDeg(chord)
+
+
+#-----------------------------------------------------------------------------
+def _countPairs(xyz1, xyz2, chordEdges, weights1, weights2):
+    """Counts (weighted) pairs between two sets of unit vectors (or k-d trees
+    of them) in the bins between the given chord lengths (with
+    d <= chordEdges[0] discarded).
+
+    """
+    trees = []
+    for xyz in [xyz1, xyz2]:
+        if not isinstance(xyz, spatial.cKDTree):
+            xyz = spatial.cKDTree(xyz)
+        trees.append(xyz)
+    if trees[0].n == 0 or trees[1].n == 0:
+        return numpy.zeros(len(chordEdges) - 1)
+    weights = None
+    if weights1 is not None:
+        weights = (weights1, weights2)
+    counts = trees[0].count_neighbors(trees[1], chordEdges, weights=weights,
+                                      cumulative=False)
+
+    return numpy.asarray(counts, dtype=float)[1:]
+
+
+#-----------------------------------------------------------------------------
+def angularPairCounts(RADeg1, decDeg1, binEdgesDeg, RADeg2=None,
+                      decDeg2=None, weights1=None, weights2=None,
+                      regions1=None, regions2=None, nThreads=1,
+                      chunkSize=100000):
+    """Counts pairs of objects in bins of angular separation, e.g. the DD, DR
+    and RR counts needed to estimate an angular correlation function. The
+    positions are converted to unit vectors (see L{eq2cart}) and the pairs
+    are counted with k-d trees, which is far faster than comparing every
+    pair with L{calcAngSepDeg}.
+
+    If RADeg2, decDeg2 are not given, the pairs within catalogue 1 are
+    counted (each unique pair once); otherwise, pairs with one object from
+    each catalogue are counted. If weights are given, each pair counts the
+    product of the weights of its objects.
+
+    If jackknife region labels are given (for both catalogues, when there are
+    two), the counts with each region left out in turn are also returned.
+
+    The work is split into chunks of catalogue 1 (or into regions), which
+    are counted in parallel by nThreads threads.
+
+    @type RADeg1: numpy array
+    @param RADeg1: R.A.s in decimal degrees of catalogue 1
+    @type decDeg1: numpy array
+    @param decDeg1: dec.s in decimal degrees of catalogue 1
+    @type binEdgesDeg: numpy array
+    @param binEdgesDeg: increasing edges of the separation bins in decimal
+        degrees, e.g. numpy.logspace(-2, 1, 16)
+    @type RADeg2: numpy array
+    @param RADeg2: R.A.s in decimal degrees of catalogue 2, or None
+    @type decDeg2: numpy array
+    @param decDeg2: dec.s in decimal degrees of catalogue 2, or None
+    @type weights1: numpy array
+    @param weights1: weights of the objects in catalogue 1, or None
+    @type weights2: numpy array
+    @param weights2: weights of the objects in catalogue 2, or None
+    @type regions1: numpy array
+    @param regions1: jackknife region labels of the objects in catalogue 1,
+        or None
+    @type regions2: numpy array
+    @param regions2: jackknife region labels of the objects in catalogue 2,
+        or None
+    @type nThreads: int
+    @param nThreads: number of threads to count pairs with
+    @type chunkSize: int
+    @param chunkSize: number of objects of catalogue 1 in each chunk
+    @rtype: numpy array or tuple
+    @return: array of the (weighted) pair counts in each bin; or, if regions
+        are given, (counts, jackknifeCounts, regions), where
+        jackknifeCounts[i] are the counts with the objects in regions[i] left
+        out
+
+    """
+
+    auto = RADeg2 is None
+    xyz1 = _unitVectors(RADeg1, decDeg1)
+    xyz2 = xyz1 if auto else _unitVectors(RADeg2, decDeg2)
+    chordEdges = _degToChord(numpy.asarray(binEdgesDeg, dtype=float))
+    if numpy.any(numpy.diff(chordEdges) < 0):
+        raise ValueError("binEdgesDeg must be increasing")
+
+    if auto:
+        weights2 = weights1
+        regions2 = regions1
+    if weights1 is not None or weights2 is not None:
+        weights1 = numpy.ones(xyz1.shape[0]) if weights1 is None else \
+            numpy.asarray(weights1, dtype=float).ravel()
+        weights2 = numpy.ones(xyz2.shape[0]) if weights2 is None else \
+            numpy.asarray(weights2, dtype=float).ravel()
+
+    def subset(xyz, weights, mask):
+        return xyz[mask], None if weights is None else weights[mask]
+
+    # Trees of whole catalogues are shared between the tasks
+    tree1 = spatial.cKDTree(xyz1)
+    tree2 = tree1 if auto else spatial.cKDTree(xyz2)
+
+    if regions1 is None:
+        tasks = []
+        for start in range(0, xyz1.shape[0], chunkSize):
+            rows = slice(start, start + chunkSize)
+            tasks.append((xyz1[rows], tree2,
+                          None if weights1 is None else weights1[rows],
+                          weights2))
+    else:
+        if regions2 is None:
+            raise ValueError("regions must be given for both catalogues")
+        regions1 = numpy.asarray(regions1).ravel()
+        regions2 = numpy.asarray(regions2).ravel()
+        regions = numpy.union1d(regions1, regions2)
+        # For each region: pairs with the first object in the region, with
+        # the second in the region (unless counting within one catalogue,
+        # when this is the same), and with both in the region
+        tasks = []
+        for region in regions:
+            in1 = subset(xyz1, weights1, regions1 == region)
+            in2 = subset(xyz2, weights2, regions2 == region)
+            tasks.append((in1[0], tree2, in1[1], weights2))
+            if not auto:
+                tasks.append((tree1, in2[0], weights1, in2[1]))
+            tasks.append((in1[0], in2[0], in1[1], in2[1]))
+
+    def count(task):
+        return _countPairs(task[0], task[1], chordEdges, task[2], task[3])
+
+    if nThreads > 1:
+        pool = ThreadPool(nThreads)
+        try:
+            results = pool.map(count, tasks)
+        finally:
+            pool.close()
+    else:
+        results = [count(task) for task in tasks]
+
+    # Within one catalogue, every pair was counted in both orders
+    scale = 0.5 if auto else 1.0
+
+    if regions1 is None:
+        return scale * numpy.sum(results, axis=0)
+
+    results = numpy.array(results).reshape(len(regions), -1,
+                                           len(chordEdges) - 1)
+    first = results[:, 0]
+    second = first if auto else results[:, 1]
+    both = results[:, -1]
+    counts = first.sum(axis=0)
+    jackknifeCounts = counts - first - second + both
+
+    return scale * counts, scale * jackknifeCounts, regions
+
+
+#-----------------------------------------------------------------------------
+def friendsOfFriends(RADeg, decDeg, linkingLength, distances=None,
+                     redshifts=None, deltaZ=None):
+    """Finds groups of objects with the friends-of-friends algorithm: objects
+    closer than the linking length are linked, and each group is a set of
+    objects connected by links. The positions are indexed with a k-d tree
+    once, and the groups are found as the connected components of the links,
+    so this takes roughly O(N log N) time.
+
+    If distances (e.g. comoving distances from L{astCalc.dc}) are given,
+    objects are linked in 3D, using positions from L{eq2cart}, and
+    linkingLength is in the units of the distances. Otherwise objects are
+    linked by angular separation on the sky, and linkingLength is in decimal
+    degrees. If redshifts and deltaZ are given, only objects with
+    |z1 - z2| <= deltaZ are linked.
+
+    @type RADeg: numpy array
+    @param RADeg: R.A.s of the objects in decimal degrees
+    @type decDeg: numpy array
+    @param decDeg: dec.s of the objects in decimal degrees
+    @type linkingLength: float
+    @param linkingLength: linking length, in decimal degrees, or in the units
+        of distances if given
+    @type distances: numpy array
+    @param distances: distances to the objects, or None
+    @type redshifts: numpy array
+    @param redshifts: redshifts of the objects, or None
+    @type deltaZ: float
+    @param deltaZ: maximum redshift difference of linked objects, or None
+    @rtype: numpy array
+    @return: group label (0, 1, 2, ...) of each object; objects that are not
+        linked to any other are in groups of their own
+
+    """
+
+    if distances is None:
+        positions = _unitVectors(RADeg, decDeg)
+        radius = _degToChord(linkingLength)
+    else:
+        RADeg = numpy.asarray(RADeg, dtype=float).ravel()
+        decDeg = numpy.asarray(decDeg, dtype=float).ravel()
+        distances = numpy.asarray(distances, dtype=float).ravel()
+        positions = numpy.column_stack(eq2cart(RADeg, decDeg, distances))
+        radius = linkingLength
+    nObjects = positions.shape[0]
+
+    pairs = spatial.cKDTree(positions).query_pairs(radius,
+                                                   output_type='ndarray')
+    if redshifts is not None and deltaZ is not None:
+        redshifts = numpy.asarray(redshifts, dtype=float).ravel()
+        dz = numpy.abs(redshifts[pairs[:, 0]] - redshifts[pairs[:, 1]])
+        pairs = pairs[dz <= deltaZ]
+
+    links = sparse.coo_matrix((numpy.ones(pairs.shape[0], dtype=bool),
+                               (pairs[:, 0], pairs[:, 1])),
+                              shape=(nObjects, nObjects))
+    nGroups, labels = csgraph.connected_components(links, directed=False)
+
+    return labels
+
+
+#-----------------------------------------------------------------------------
+def nearestNeighbours(RADeg, decDeg, k, RADeg2=None, decDeg2=None,
+                      redshifts=None):
+    """Finds the k nearest neighbours of every object in a catalogue at once,
+    using a k-d tree of unit vectors (see L{eq2cart}). Neighbours are found
+    in the same catalogue (excluding each object itself), or in catalogue 2
+    if RADeg2, decDeg2 are given.
+
+    If the redshifts of the objects are given, separations are converted to
+    projected distances in Mpc at the redshift of each object, using the
+    angular diameter distance from L{astCalc.da} (so the current astCalc
+    cosmology is used, with L{astCalc.USE_TABLES} set).
+
+    @type RADeg: numpy array
+    @param RADeg: R.A.s in decimal degrees of the objects
+    @type decDeg: numpy array
+    @param decDeg: dec.s in decimal degrees of the objects
+    @type k: int
+    @param k: number of neighbours to find
+    @type RADeg2: numpy array
+    @param RADeg2: R.A.s in decimal degrees of the neighbour catalogue, or
+        None
+    @type decDeg2: numpy array
+    @param decDeg2: dec.s in decimal degrees of the neighbour catalogue, or
+        None
+    @type redshifts: numpy array
+    @param redshifts: redshifts of the objects, or None
+    @rtype: tuple
+    @return: (separations, indices) - N x k arrays of the separations of the
+        k nearest neighbours of each object (in decimal degrees, or Mpc if
+        redshifts are given), nearest first, and their indices
+
+    """
+
+    xyz = _unitVectors(RADeg, decDeg)
+    auto = RADeg2 is None
+    xyz2 = xyz if auto else _unitVectors(RADeg2, decDeg2)
+    nQuery = k + 1 if auto else k
+    if nQuery > xyz2.shape[0]:
+        raise ValueError("there are fewer than k neighbours")
+
+    chord, indices = spatial.cKDTree(xyz2).query(xyz, k=nQuery)
+    chord = chord.reshape(xyz.shape[0], nQuery)
+    indices = indices.reshape(xyz.shape[0], nQuery)
+    if auto:
+        # Remove each object from its own neighbours (it is not necessarily
+        # first, if other objects have the same position)
+        isSelf = indices == numpy.arange(xyz.shape[0])[:, numpy.newaxis]
+        isSelf[~numpy.any(isSelf, axis=1), -1] = True
+        keep = ~isSelf
+        chord = chord[keep].reshape(-1, k)
+        indices = indices[keep].reshape(-1, k)
+
+    separations = _chordToDeg(chord)
+    if redshifts is not None:
+        # The current astCalc cosmology, with distance tables so that curved
+        # models are not integrated one redshift at a time
+        cosmology = astCalc.Cosmology(astCalc.OMEGA_M0, astCalc.OMEGA_L0,
+                                      astCalc.OMEGA_R0, astCalc.H0, True,
+                                      astCalc.TABLE_ZMAX, astCalc.TABLE_STEPS,
+                                      astCalc.TABLE_CACHE_DIR)
+        DA = cosmology.da(numpy.asarray(redshifts, dtype=float).ravel())
+        separations = numpy.radians(separations) * DA[:, numpy.newaxis]
+
+    return separations, indices
+
+
+#-----------------------------------------------------------------------------
+def nearestNeighbourDensity(RADeg, decDeg, N, RADeg2=None, decDeg2=None,
+                            redshifts=None):
+    """Estimates the local surface density of every object in a catalogue from
+    the distance to its Nth nearest neighbour (see L{nearestNeighbours}), as
+    Sigma_N = N / area, where the area is that of the circle reaching the Nth
+    nearest neighbour.
+
+    @type RADeg: numpy array
+    @param RADeg: R.A.s in decimal degrees of the objects
+    @type decDeg: numpy array
+    @param decDeg: dec.s in decimal degrees of the objects
+    @type N: int
+    @param N: which neighbour to use
+    @type RADeg2: numpy array
+    @param RADeg2: R.A.s in decimal degrees of the neighbour catalogue, or
+        None
+    @type decDeg2: numpy array
+    @param decDeg2: dec.s in decimal degrees of the neighbour catalogue, or
+        None
+    @type redshifts: numpy array
+    @param redshifts: redshifts of the objects, or None
+    @rtype: numpy array
+    @return: surface densities, per square degree, or per square Mpc
+        (projected, using L{astCalc.da}) if redshifts are given
+
+    """
+
+    separations, indices = nearestNeighbours(RADeg, decDeg, N, RADeg2,
+                                             decDeg2, redshifts)
+    radius = separations[:, -1]
+    if redshifts is None:
+        # Area of a spherical cap, in square degrees
+        area = (4.0 * numpy.pi * numpy.sin(numpy.radians(radius) / 2.0) ** 2 *
+                numpy.degrees(1.0) ** 2)
+    else:
+        area = numpy.pi * radius ** 2
+
+    return N / area
+
+
+#-----------------------------------------------------------------------------
+class SkyIndex:
+    """This class indexes a static catalogue of positions for repeated cone,
+    box and polygon searches. Objects are sorted into declination zones of
+    height zoneHeightDeg, and by RA within each zone, so that a search only
+    needs a binary search for the RA range in each zone it overlaps, and an
+    exact test of the few candidates found. For example:
+
+    index=astCoords.SkyIndex(RADeg, decDeg)
+    inCone=index.coneSearch(150.0, 2.2, 0.05)
+
+    Searches return the indices (into the RADeg, decDeg arrays given when the
+    index was built) of the matching objects, in ascending order. An index
+    may be written to disk with L{save}, and reloaded with L{loadSkyIndex}.
+
+    """
+
+    def __init__(self, RADeg, decDeg, zoneHeightDeg=0.1):
+        """Builds the index.
+
+        @type RADeg: numpy array
+        @param RADeg: R.A.s of the objects in decimal degrees
+        @type decDeg: numpy array
+        @param decDeg: dec.s of the objects in decimal degrees
+        @type zoneHeightDeg: float
+        @param zoneHeightDeg: height of the declination zones in decimal
+            degrees; this should be comparable to the typical search radius
+
+        """
+
+        RADeg = numpy.asarray(RADeg, dtype=float).ravel() % 360.0
+        decDeg = numpy.asarray(decDeg, dtype=float).ravel()
+        if RADeg.shape != decDeg.shape:
+            raise ValueError("RA and dec. arrays must have the same length")
+
+        self.zoneHeightDeg = float(zoneHeightDeg)
+        self.nZones = int(numpy.ceil(180.0 / self.zoneHeightDeg))
+        zones = self._zone(decDeg)
+        self.index = numpy.lexsort((RADeg, zones))
+        self.RADeg = RADeg[self.index]
+        self.decDeg = decDeg[self.index]
+        # RA sorted within each zone, so that this key is sorted overall
+        self._keys = zones[self.index] * 400.0 + self.RADeg
+        self._xyz = _unitVectors(self.RADeg, self.decDeg)
+
+    def _zone(self, decDeg):
+        """Returns the declination zone numbers of the given dec.s.
+
+        """
+        zones = numpy.floor((numpy.asarray(decDeg) + 90.0) /
+                            self.zoneHeightDeg).astype(int)
+
+        return numpy.clip(zones, 0, self.nZones - 1)
+
+    def _candidates(self, RAMin, RAMax, decMin, decMax):
+        """Returns the positions (in the sorted arrays) of the objects in the
+        zones overlapping decMin to decMax, with RAMin <= RA <= RAMax. The
+        RA range may cross RA = 0/360 (i.e., RAMin > RAMax after wrapping).
+
+        """
+        zones = numpy.arange(self._zone(decMin), self._zone(decMax) + 1)
+        if RAMax - RAMin >= 360.0:
+            ranges = [(0.0, 360.0)]
+        else:
+            RAMin = RAMin % 360.0
+            RAMax = RAMax % 360.0
+            if RAMin <= RAMax:
+                ranges = [(RAMin, RAMax)]
+            else:
+                ranges = [(RAMin, 360.0), (0.0, RAMax)]
+
+        first = []
+        last = []
+        for low, high in ranges:
+            first.append(numpy.searchsorted(self._keys, zones * 400.0 + low,
+                                            side='left'))
+            last.append(numpy.searchsorted(self._keys, zones * 400.0 + high,
+                                           side='right'))
+        first = numpy.concatenate(first)
+        counts = numpy.concatenate(last) - first
+        # All of the positions first[i] ... first[i]+counts[i]-1
+        offsets = numpy.repeat(first - numpy.cumsum(counts) + counts, counts)
+
+        return offsets + numpy.arange(counts.sum())
+
+    def _result(self, rows):
+        """Converts positions in the sorted arrays into sorted indices of the
+        original arrays.
+
+        """
+        return numpy.sort(self.index[rows])
+
+    def _coneRows(self, RADeg, decDeg, radiusDeg):
+        """Returns the positions (in the sorted arrays) of the objects within
+        radiusDeg of the given position.
+
+        """
+        decMin = decDeg - radiusDeg
+        decMax = decDeg + radiusDeg
+        sinRadius = numpy.sin(numpy.radians(min(radiusDeg, 90.0)))
+        cosDec = numpy.cos(numpy.radians(decDeg))
+        if decMin <= -90.0 or decMax >= 90.0 or sinRadius >= cosDec:
+            halfWidth = 180.0
+        else:
+            # Widest RA extent of a cone that does not contain a pole, plus
+            # a little to allow for rounding
+            halfWidth = numpy.degrees(numpy.arcsin(sinRadius / cosDec)) + 1e-9
+
+        rows = self._candidates(RADeg - halfWidth, RADeg + halfWidth, decMin,
+                                decMax)
+        centre = _unitVectors(RADeg, decDeg)
+        chord2 = numpy.sum((self._xyz[rows] - centre) ** 2, axis=1)
+
+        return rows[chord2 <= _degToChord(radiusDeg) ** 2]
+
+    def coneSearch(self, RADeg, decDeg, radiusDeg):
+        """Finds the objects within radiusDeg of the given position.
+
+        @type RADeg: float
+        @param RADeg: R.A. of the centre of the cone in decimal degrees
+        @type decDeg: float
+        @param decDeg: dec. of the centre of the cone in decimal degrees
+        @type radiusDeg: float
+        @param radiusDeg: radius of the cone in decimal degrees
+        @rtype: numpy array
+        @return: indices of the objects inside the cone
+
+        """
+        return self._result(self._coneRows(RADeg, decDeg, radiusDeg))
+
+    def boxSearch(self, RAMin, RAMax, decMin, decMax):
+        """Finds the objects inside a box in R.A. and dec., for example as
+        returned by L{calcRADecSearchBox}. If RAMin > RAMax, the box crosses
+        RA = 0/360.
+
+        @type RAMin: float
+        @param RAMin: minimum R.A. of the box in decimal degrees
+        @type RAMax: float
+        @param RAMax: maximum R.A. of the box in decimal degrees
+        @type decMin: float
+        @param decMin: minimum dec. of the box in decimal degrees
+        @type decMax: float
+        @param decMax: maximum dec. of the box in decimal degrees
+        @rtype: numpy array
+        @return: indices of the objects inside the box
+
+        """
+        rows = self._candidates(RAMin, RAMax, decMin, decMax)
+        dec = self.decDeg[rows]
+        rows = rows[(dec >= decMin) & (dec <= decMax)]
+
+        return self._result(rows)
+
+    def polygonSearch(self, RADegs, decDegs):
+        """Finds the objects inside a polygon on the sky, with edges that are
+        great circle arcs between the given vertices. The polygon must fit
+        inside a hemisphere.
+
+        @type RADegs: numpy array
+        @param RADegs: R.A.s of the vertices in decimal degrees
+        @type decDegs: numpy array
+        @param decDegs: dec.s of the vertices in decimal degrees
+        @rtype: numpy array
+        @return: indices of the objects inside the polygon
+
+        """
+        vertices = _unitVectors(RADegs, decDegs)
+        centre = vertices.sum(axis=0)
+        centre = centre / numpy.sqrt(numpy.sum(centre ** 2))
+        RAc, decc, r = cart2eq(centre[0], centre[1], centre[2])
+        radiusDeg = _chordToDeg(numpy.sqrt(numpy.max(numpy.sum(
+            (vertices - centre) ** 2, axis=1))))
+        if radiusDeg >= 90.0:
+            raise ValueError("polygon must fit inside a hemisphere")
+
+        rows = self._coneRows(RAc, decc, radiusDeg)
+
+        # The gnomonic projection about the centre maps great circles to
+        # straight lines, so a plane point-in-polygon test is exact
+        east = numpy.cross([0.0, 0.0, 1.0], centre)
+        if numpy.sum(east ** 2) < 1e-20:
+            east = numpy.array([1.0, 0.0, 0.0])
+        east = east / numpy.sqrt(numpy.sum(east ** 2))
+        north = numpy.cross(centre, east)
+
+        def project(xyz):
+            depth = numpy.dot(xyz, centre)
+            return numpy.dot(xyz, east) / depth, numpy.dot(xyz, north) / depth
+
+        px, py = project(self._xyz[rows])
+        vx, vy = project(vertices)
+        inside = numpy.zeros(len(rows), dtype=bool)
+        for i in range(len(vx)):
+            x1, y1 = vx[i - 1], vy[i - 1]
+            x2, y2 = vx[i], vy[i]
+            crosses = (y1 > py) != (y2 > py)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                xCross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (px < xCross)
+
+        return self._result(rows[inside])
+
+    def save(self, fileName):
+        """Writes the index to a numpy .npz file, which can be read back with
+        L{loadSkyIndex}.
+
+        @type fileName: string
+        @param fileName: path of the file to write
+
+        """
+        numpy.savez(fileName, RADeg=self.RADeg, decDeg=self.decDeg,
+                    index=self.index, zoneHeightDeg=self.zoneHeightDeg)
+
+
+#-----------------------------------------------------------------------------
+def loadSkyIndex(fileName):
+    """Reads a L{SkyIndex} written by L{SkyIndex.save}.
+
+    @type fileName: string
+    @param fileName: path of the .npz file
+    @rtype: L{SkyIndex}
+    @return: the index
+
+    """
+    data = numpy.load(fileName)
+    # The saved arrays are already in index order, so re-indexing them
+    # leaves them in place
+    skyIndex = SkyIndex(data['RADeg'], data['decDeg'],
+                        float(data['zoneHeightDeg']))
+    skyIndex.index = data['index'][skyIndex.index]
+
+    return skyIndex
 
 
 #-----------------------------------------------------------------------------
@@ -346,19 +1649,24 @@ def shiftRADec(ra1, dec1, deltaRA, deltaDec):
     (deltaRA, deltaDec) are arcseconds, and output is decimal degrees. Based on
     an IDL routine of the same name.
 
-    @param ra1: float
+    All of the arguments may be numpy arrays, which are broadcast against
+    each other.
+
+    @param ra1: float or numpy array
     @type ra1: R.A. in decimal degrees
-    @param dec1: float
+    @param dec1: float or numpy array
     @type dec1: dec. in decimal degrees
-    @param deltaRA: float
+    @param deltaRA: float or numpy array
     @type deltaRA: shift in R.A. in arcseconds
-    @param deltaDec: float
+    @param deltaDec: float or numpy array
     @type deltaDec: shift in dec. in arcseconds
     @rtype: float [newRA, newDec]
     @return: shifted R.A. and dec.
 
     """
 
+    ra1, dec1, deltaRA, deltaDec = [numpy.asarray(x, dtype=float) for x in
+                                    [ra1, dec1, deltaRA, deltaDec]]
     d2r = numpy.pi / 180.
     as2r = numpy.pi / 648000.
 
@@ -376,31 +1684,244 @@ def shiftRADec(ra1, dec1, deltaRA, deltaDec):
 
     # Make changes
     ra2 = ra1 + delra
-    dec2 = dec1 + deltaDec / 3600.0
+    dec2 = (dec1 + deltaDec / 3600.0)[()]
 
     # Make sure 0 < RA < 360.
-    if ra2 > 360:
-        ra2 -= 360
-    elif ra2 < 0:
-        ra2 += 360
+    ra2 = numpy.where(ra2 > 360, ra2 - 360,
+                      numpy.where(ra2 < 0, ra2 + 360, ra2))[()]
 
     return ra2, dec2
 
 
+#-----------------------------------------------------------------------------
+# Constants from wcscon.c in WCSTools, used by the array version of
+# convertCoords: the e-terms of aberration and their rate of change (a, ad),
+# the 6x6 position and velocity matrices between FK5 J2000 and FK4 B1950
+# (emi, em), and the equatorial to galactic rotations (bgal, jgal)
+_ETERMS = numpy.array([-1.62557e-6, -0.31919e-6, -0.13843e-6])
+_ETERMS_RATE = numpy.array([1.245e-3, -1.580e-3, -0.659e-3])
+_FK5_TO_FK4 = numpy.array([
+    [0.9999256795, 0.0111814828, 0.0048590039,
+     -0.00000242389840, -0.00000002710544, -0.00000001177742],
+    [-0.0111814828, 0.9999374849, -0.0000271771,
+     0.00000002710544, -0.00000242392702, 0.00000000006585],
+    [-0.0048590040, -0.0000271557, 0.9999881946,
+     0.00000001177742, 0.00000000006585, -0.00000242404995],
+    [-0.000551, 0.238509, -0.435614, 0.99990432, 0.01118145, 0.00485852],
+    [-0.238560, -0.002667, 0.012254, -0.01118145, 0.99991613, -0.00002717],
+    [0.435730, -0.008541, 0.002117, -0.00485852, -0.00002716, 0.99996684]])
+_FK4_TO_FK5 = numpy.array([
+    [0.9999256782, -0.0111820611, -0.0048579477,
+     0.00000242395018, -0.00000002710663, -0.00000001177656],
+    [0.0111820610, 0.9999374784, -0.0000271765,
+     0.00000002710663, 0.00000242397878, -0.00000000006587],
+    [0.0048579479, -0.0000271474, 0.9999881997,
+     0.00000001177656, -0.00000000006582, 0.00000242410173],
+    [-0.000551, -0.238565, 0.435739, 0.99994704, -0.01118251, -0.00485767],
+    [0.238514, -0.002667, -0.008541, 0.01118251, 0.99995883, -0.00002718],
+    [-0.435623, 0.012254, 0.002117, 0.00485767, -0.00002714, 1.00000956]])
+_FK4_TO_GALACTIC = numpy.array([
+    [-0.066988739415, -0.872755765852, -0.483538914632],
+    [0.492728466075, -0.450346958020, 0.744584633283],
+    [-0.867600811151, -0.188374601723, 0.460199784784]])
+_FK5_TO_GALACTIC = numpy.array([
+    [-0.054875539726, -0.873437108010, -0.483834985808],
+    [0.494109453312, -0.444829589425, 0.746982251810],
+    [-0.867666135858, -0.198076386122, 0.455983795705]])
+
+
+#-----------------------------------------------------------------------------
+def _matrixProduct(matrix, vector):
+    """Multiplies a list of coordinate arrays by a matrix, summing the terms
+    in the same order as wcscon.c.
+
+    """
+    product = []
+    for row in matrix:
+        total = row[0] * vector[0]
+        for j in range(1, len(vector)):
+            total = total + row[j] * vector[j]
+        product.append(total)
+
+    return product
+
+
+#-----------------------------------------------------------------------------
+def _rotateCoords(coordX, coordY, matrix):
+    """Array version of the fk42gal, gal2fk4, fk52gal and gal2fk5 routines in
+    wcscon.c: rotates coordinates (in decimal degrees) by the given matrix.
+
+    """
+    rx = coordX * numpy.pi / 180.0
+    ry = coordY * numpy.pi / 180.0
+    pos = [numpy.cos(rx) * numpy.cos(ry), numpy.sin(rx) * numpy.cos(ry),
+           numpy.sin(ry)]
+    x, y, z = _matrixProduct(matrix, pos)
+
+    rOut = numpy.arctan2(y, x)
+    rOut = numpy.where(rOut < 0.0, rOut + 2.0 * numpy.pi, rOut)
+    rOut = numpy.where(rOut > 2.0 * numpy.pi, rOut - 2.0 * numpy.pi, rOut)
+    dOut = numpy.arctan2(z, numpy.sqrt(x * x + y * y))
+
+    return rOut * 180.0 / numpy.pi, dOut * 180.0 / numpy.pi
+
+
+#-----------------------------------------------------------------------------
+def _toSpherical(x, y, z, xd, yd, zd, ur, ud):
+    """Converts position and velocity vectors back to RA, dec (radians) and
+    proper motions, as at the end of fk524pv and fk425pv in wcscon.c.
+
+    """
+    rxysq = (x * x) + (y * y)
+    rxy = numpy.sqrt(rxysq)
+    r = numpy.arctan2(y, x)
+    r = numpy.where(r < 0.0, r + 2.0 * numpy.pi, r)
+    r = numpy.where((x == 0.0) & (y == 0.0), 0.0, r)
+    d = numpy.arctan2(z, rxy)
+
+    moving = rxy > 1e-30
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        ur = numpy.where(moving, (x * yd - y * xd) / rxysq, ur)
+        ud = numpy.where(moving, (zd * rxysq - z * (x * xd + y * yd)) /
+                         ((rxysq + z * z) * rxy), ud)
+
+    return r, d, ur, ud
+
+
+#-----------------------------------------------------------------------------
+def _fk524(ra, dec, epoch):
+    """Array version of fk524 (or fk524e, if epoch > 0) in wcscon.c: converts
+    J2000 FK5 coordinates to B1950 FK4, adding the e-terms.
+
+    """
+    r2000 = ra * numpy.pi / 180.0
+    d2000 = dec * numpy.pi / 180.0
+    cd = numpy.cos(d2000)
+    v1 = [numpy.cos(r2000) * cd, numpy.sin(r2000) * cd, numpy.sin(d2000)]
+    v2 = _matrixProduct(_FK5_TO_FK4[:, :3], v1)
+    a = _ETERMS
+    ad = _ETERMS_RATE
+
+    x, y, z = v2[:3]
+    rxyz = numpy.sqrt(x * x + y * y + z * z)
+    w = (x * a[0]) + (y * a[1]) + (z * a[2])
+    x = x + (a[0] * rxyz) - (w * x)
+    y = y + (a[1] * rxyz) - (w * y)
+    z = z + (a[2] * rxyz) - (w * z)
+    rxyz = numpy.sqrt(x * x + y * y + z * z)
+
+    x, y, z = v2[:3]
+    w = (x * a[0]) + (y * a[1]) + (z * a[2])
+    wd = (x * ad[0]) + (y * ad[1]) + (z * ad[2])
+    x = x + (a[0] * rxyz) - (w * x)
+    y = y + (a[1] * rxyz) - (w * y)
+    z = z + (a[2] * rxyz) - (w * z)
+    xd = v2[3] + (ad[0] * rxyz) - (wd * x)
+    yd = v2[4] + (ad[1] * rxyz) - (wd * y)
+    zd = v2[5] + (ad[2] * rxyz) - (wd * z)
+
+    r1950, d1950, ur, ud = _toSpherical(x, y, z, xd, yd, zd, 0.0, 0.0)
+    ra = r1950 * 180.0 / numpy.pi
+    dec = d1950 * 180.0 / numpy.pi
+    if epoch > 0:
+        ra = ra + ((ur / 360000.0) * (epoch - 1950.0))
+        dec = dec + ((ud / 360000.0) * (epoch - 1950.0))
+
+    return ra, dec
+
+
+#-----------------------------------------------------------------------------
+def _fk425(ra, dec, epoch):
+    """Array version of fk425 (or fk425e, if epoch > 0) in wcscon.c: converts
+    B1950 FK4 coordinates to J2000 FK5, removing the e-terms.
+
+    """
+    r1950 = ra * numpy.pi / 180.0
+    d1950 = dec * numpy.pi / 180.0
+    sr = numpy.sin(r1950)
+    cr = numpy.cos(r1950)
+    sd = numpy.sin(d1950)
+    cd = numpy.cos(d1950)
+    r0 = [cr * cd, sr * cd, sd]
+    a = _ETERMS
+    ad = _ETERMS_RATE
+
+    w = (r0[0] * a[0]) + (r0[1] * a[1]) + (r0[2] * a[2])
+    wd = (r0[0] * ad[0]) + (r0[1] * ad[1]) + (r0[2] * ad[2])
+    v1 = [r0[i] - a[i] + (w * r0[i]) for i in range(3)]
+    v1 = v1 + [0.0 - ad[i] + (wd * r0[i]) for i in range(3)]
+    x, y, z, xd, yd, zd = _matrixProduct(_FK4_TO_FK5, v1)
+
+    r2000, d2000, ur, ud = _toSpherical(x, y, z, xd, yd, zd, 0.0, 0.0)
+    ra = r2000 * 180.0 / numpy.pi
+    dec = d2000 * 180.0 / numpy.pi
+    if epoch > 0:
+        ra = ra + ((ur / 360000.0) * (epoch - 2000.0))
+        dec = dec + ((ud / 360000.0) * (epoch - 2000.0))
+
+    return ra, dec
+
+
+#-----------------------------------------------------------------------------
+def _convertCoordsArray(inputSystem, outputSystem, coordX, coordY, epoch):
+    """Array version of L{convertCoords}, following the same steps as wcscon
+    in wcscon.c.
+
+    """
+    coordX, coordY = numpy.broadcast_arrays(numpy.asarray(coordX, float),
+                                            numpy.asarray(coordY, float))
+    if inputSystem == outputSystem:
+        return coordX.copy(), coordY.copy()
+
+    if outputSystem == "B1950":
+        if inputSystem == "J2000":
+            coordX, coordY = _fk524(coordX, coordY, epoch)
+        else:
+            coordX, coordY = _rotateCoords(coordX, coordY,
+                                           _FK4_TO_GALACTIC.T)
+    elif outputSystem == "J2000":
+        if inputSystem == "B1950":
+            coordX, coordY = _fk425(coordX, coordY, epoch)
+        else:
+            coordX, coordY = _rotateCoords(coordX, coordY,
+                                           _FK5_TO_GALACTIC.T)
+    else:
+        if inputSystem == "B1950":
+            coordX, coordY = _rotateCoords(coordX, coordY, _FK4_TO_GALACTIC)
+        else:
+            coordX, coordY = _rotateCoords(coordX, coordY, _FK5_TO_GALACTIC)
+
+    # Keep latitude within +/-90 and longitude within 0-360 degrees
+    flip = numpy.abs(coordY) > 90.0
+    coordY = numpy.where(coordY > 90.0, 180.0 - coordY, coordY)
+    coordY = numpy.where(coordY < -90.0, -180.0 - coordY, coordY)
+    coordX = numpy.where(flip, coordX + 180.0, coordX)
+    coordX = numpy.where(coordX > 360.0, coordX - 360.0,
+                         numpy.where(coordX < 0.0, coordX + 360.0, coordX))
+
+    return coordX, coordY
+
+
 #-----------------------------------------------------------------------------
 def convertCoords(inputSystem, outputSystem, coordX, coordY, epoch):
     """Converts specified coordinates (given in decimal degrees) between J2000,
     B1950, and Galactic.
 
+    coordX and coordY may also be lists or numpy arrays, in which case the
+    whole catalogue is converted at once with numpy (following the same steps,
+    constants and order of operations as the WCSTools wcscon routine used for
+    single coordinates, and agreeing with it to within about 1e-12 degrees),
+    and a tuple of arrays is returned.
+
     @type inputSystem: string
     @param inputSystem: system of the input coordinates (either "J2000",
         "B1950" or "GALACTIC")
     @type outputSystem: string
     @param outputSystem: system of the returned coordinates (either "J2000",
         "B1950" or "GALACTIC")
-    @type coordX: float
+    @type coordX: float, list or numpy array
     @param coordX: longitude coordinate in decimal degrees, e.g. R. A.
-    @type coordY: float
+    @type coordY: float, list or numpy array
     @param coordY: latitude coordinate in decimal degrees, e.g. dec.
     @type epoch: float
     @param epoch: epoch of the input coordinates
@@ -413,6 +1934,11 @@ def convertCoords(inputSystem, outputSystem, coordX, coordY, epoch):
         if outputSystem == "J2000" or outputSystem == "B1950" or \
                                     outputSystem == "GALACTIC":
 
+            if isinstance(coordX, (list, tuple, numpy.ndarray)) or \
+                    isinstance(coordY, (list, tuple, numpy.ndarray)):
+                return _convertCoordsArray(inputSystem, outputSystem, coordX,
+                                           coordY, epoch)
+
             outCoords = wcscon.wcscon(
                 wcscon.wcscsys(inputSystem), wcscon.wcscsys(outputSystem), 0,
                 0, coordX, coordY, epoch)
@@ -423,6 +1949,148 @@ def convertCoords(inputSystem, outputSystem, coordX, coordY, epoch):
                     "or 'GALACTIC'")
 
 
+#-----------------------------------------------------------------------------
+def _rotationZYZ(zeta, theta, z):
+    """Returns the rotation matrix Rz(-z) Ry(theta) Rz(-zeta), as made by
+    rotmat(323, -zeta, theta, -z) in wcscon.c (angles in radians). Given
+    arrays of angles, a stack of matrices of shape angles.shape + (3, 3) is
+    returned.
+
+    """
+    zeta, theta, z = numpy.broadcast_arrays(numpy.asarray(zeta, dtype=float),
+                                            numpy.asarray(theta, dtype=float),
+                                            numpy.asarray(z, dtype=float))
+    matrix = numpy.identity(3)
+    for axis, angle in [(3, -zeta), (2, theta), (3, -z)]:
+        c = numpy.cos(angle)
+        s = numpy.sin(angle)
+        zero = numpy.zeros(angle.shape)
+        one = numpy.ones(angle.shape)
+        if axis == 3:
+            rotation = [c, s, zero, -s, c, zero, zero, zero, one]
+        else:
+            rotation = [c, zero, -s, zero, one, zero, s, zero, c]
+        rotation = numpy.stack(rotation, axis=-1).reshape(angle.shape +
+                                                          (3, 3))
+        matrix = numpy.matmul(rotation, matrix)
+
+    return matrix
+
+
+#-----------------------------------------------------------------------------
+def _precessionMatrix(system, epoch0, epoch1):
+    """Returns the matrix that precesses unit vectors from equinox epoch0 to
+    epoch1, using the IAU 1976 (FK5, Julian epochs; system "J2000") or
+    Bessel-Newcomb (FK4, Besselian epochs; system "B1950") model, as in
+    mprecfk5 and mprecfk4 in wcscon.c. The epochs may be arrays, in which
+    case a stack of matrices is returned (see L{_rotationZYZ}).
+
+    """
+    # Arcsec to radians, as defined in WCSTools
+    tas2r = ((epoch1 - epoch0) / 100.0) * 4.8481368110953e-6
+    t = (epoch1 - epoch0) / 100.0
+    if system == "J2000":
+        t0 = (epoch0 - 2000.0) / 100.0
+        w = 2306.2181 + ((1.39656 - (0.000139 * t0)) * t0)
+        zeta = (w + ((0.30188 - 0.000344 * t0) + 0.017998 * t) * t) * tas2r
+        z = (w + ((1.09468 + 0.000066 * t0) + 0.018203 * t) * t) * tas2r
+        theta = ((2004.3109 + (-0.85330 - 0.000217 * t0) * t0) +
+                 ((-0.42665 - 0.000217 * t0) - 0.041833 * t) * t) * tas2r
+    elif system == "B1950":
+        bigt = (epoch0 - 1850.0) / 100.0
+        w = 2303.5548 + (1.39720 + 0.000059 * bigt) * bigt
+        zeta = (w + (0.30242 - 0.000269 * bigt + 0.017996 * t) * t) * tas2r
+        z = (w + (1.09478 + 0.000387 * bigt + 0.018324 * t) * t) * tas2r
+        theta = (2005.1125 + (-0.85294 - 0.000365 * bigt) * bigt +
+                 (-0.42647 - 0.000365 * bigt - 0.041802 * t) * t) * tas2r
+    else:
+        raise Exception("system must be 'J2000' or 'B1950'")
+
+    return _rotationZYZ(zeta, theta, z)
+
+
+#-----------------------------------------------------------------------------
+def precessCoords(RADeg, decDeg, epoch, targetEpoch, pmRA=None, pmDec=None,
+                  system="J2000"):
+    """Brings catalogue positions (in decimal degrees) measured at different
+    epochs, each referred to the mean equator and equinox of its own epoch, to
+    a common target epoch and equinox. Positions are first moved by their
+    proper motions (if given) over the interval to targetEpoch, and then
+    precessed using the IAU 1976 (FK5) model, or the Bessel-Newcomb (FK4)
+    model if system is "B1950", in the same way (via the standard equinox) as
+    WCSTools, which L{convertCoords} uses.
+
+    Precession matrices are calculated together, once per distinct epoch, so
+    that a catalogue with a few distinct epochs costs about one 3x3 matrix
+    multiplication per object.
+
+    @type RADeg: numpy array
+    @param RADeg: R.A.s in decimal degrees
+    @type decDeg: numpy array
+    @param decDeg: dec.s in decimal degrees
+    @type epoch: float or numpy array
+    @param epoch: epoch (and equinox) of each position, in Julian years (or
+        Besselian years for system "B1950")
+    @type targetEpoch: float
+    @param targetEpoch: epoch (and equinox) of the returned positions
+    @type pmRA: numpy array
+    @param pmRA: proper motions in R.A. * cos(dec.), in milliarcsec per year
+    @type pmDec: numpy array
+    @param pmDec: proper motions in dec., in milliarcsec per year
+    @type system: string
+    @param system: "J2000" (FK5) or "B1950" (FK4)
+    @rtype: tuple
+    @return: (RADeg, decDeg) - positions at targetEpoch (floats for scalar
+        input, numpy arrays otherwise)
+
+    """
+
+    if system not in ["J2000", "B1950"]:
+        raise Exception("system must be 'J2000' or 'B1950'")
+    standardEpoch = {"J2000": 2000.0, "B1950": 1950.0}[system]
+
+    RADeg, decDeg, epoch = numpy.broadcast_arrays(
+        numpy.asarray(RADeg, dtype=float), numpy.asarray(decDeg, dtype=float),
+        numpy.asarray(epoch, dtype=float))
+    shape = RADeg.shape
+    RARad = numpy.radians(RADeg.ravel())
+    decRad = numpy.radians(decDeg.ravel())
+    epoch = epoch.ravel()
+
+    cosDec = numpy.cos(decRad)
+    xyz = numpy.column_stack([numpy.cos(RARad) * cosDec,
+                              numpy.sin(RARad) * cosDec, numpy.sin(decRad)])
+
+    if pmRA is not None or pmDec is not None:
+        # Move along the tangent plane, and back onto the unit sphere
+        masToRad = numpy.radians(1.0 / 3600000.0)
+        years = targetEpoch - epoch
+        pmRA = numpy.zeros(shape) if pmRA is None else pmRA
+        pmDec = numpy.zeros(shape) if pmDec is None else pmDec
+        dRA = numpy.broadcast_to(pmRA, shape).ravel() * masToRad * years
+        dDec = numpy.broadcast_to(pmDec, shape).ravel() * masToRad * years
+        sinRA = numpy.sin(RARad)
+        cosRA = numpy.cos(RARad)
+        sinDec = numpy.sin(decRad)
+        xyz = xyz + numpy.column_stack([-sinRA * dRA - cosRA * sinDec * dDec,
+                                        cosRA * dRA - sinRA * sinDec * dDec,
+                                        cosDec * dDec])
+        xyz = xyz / numpy.sqrt(numpy.sum(xyz ** 2, axis=1))[:, numpy.newaxis]
+
+    # One stacked matrix per distinct epoch, via the standard equinox
+    epochs, inverse = numpy.unique(epoch, return_inverse=True)
+    matrices = numpy.matmul(
+        _precessionMatrix(system, standardEpoch, targetEpoch),
+        _precessionMatrix(system, epochs, standardEpoch))
+    xyz = numpy.einsum('nij,nj->ni', matrices[inverse.ravel()], xyz)
+
+    RAOut, decOut, r = cart2eq(xyz[:, 0], xyz[:, 1], xyz[:, 2])
+    if len(shape) == 0:
+        return float(RAOut[0]), float(decOut[0])
+
+    return RAOut.reshape(shape), decOut.reshape(shape)
+
+
 #-----------------------------------------------------------------------------
 def calcSkyArea(RA1, RA2, DEC1, DEC2, units=True):
     """ Calculates the area of the quadrangle on the sky given by the
@@ -460,14 +2128,22 @@ def calcSkyArea(RA1, RA2, DEC1, DEC2, units=True):
 def calcRADecSearchBox(RADeg, decDeg, radiusSkyDeg):
     """Calculates minimum and maximum RA, dec coords needed to define a box
     enclosing a circle of radius radiusSkyDeg around the given RADeg, decDeg
-    coordinates. Useful for freeform queries of e.g. SDSS, UKIDSS etc.. Uses
-    L{calcAngSepDeg}, so has the same limitations.
+    coordinates. Useful for freeform queries of e.g. SDSS, UKIDSS etc..
 
-    @type RADeg: float
+    The box is found exactly: the widest RA extent of a circle that does not
+    contain a pole is +/- arcsin(sin(radius) / cos(dec)). Boxes around
+    circles that contain a pole span all RAs (RAMin = 0, RAMax = 360), and
+    extend to dec. = +/-90. Otherwise RAMin and RAMax are wrapped into
+    0 <= RA < 360, so RAMin > RAMax for boxes that cross RA = 0/360.
+
+    All of the arguments can be numpy arrays (which are broadcast against
+    each other), to calculate the boxes around many positions at once.
+
+    @type RADeg: float or numpy array
     @param RADeg: RA coordinate of centre of search region
-    @type decDeg: float
+    @type decDeg: float or numpy array
     @param decDeg: dec coordinate of centre of search region
-    @type radiusSkyDeg: float
+    @type radiusSkyDeg: float or numpy array
     @param radiusSkyDeg: radius in degrees on the sky used to define search
         region
     @rtype: list
@@ -476,47 +2152,43 @@ def calcRADecSearchBox(RADeg, decDeg, radiusSkyDeg):
 
     """
 
-    tolerance = 1e-5  # in degrees on sky
-    targetHalfSizeSkyDeg = radiusSkyDeg
-    funcCalls = ["calcAngSepDeg(RADeg, decDeg, guess, decDeg)",
-                 "calcAngSepDeg(RADeg, decDeg, guess, decDeg)",
-                 "calcAngSepDeg(RADeg, decDeg, RADeg, guess)",
-                 "calcAngSepDeg(RADeg, decDeg, RADeg, guess)"]
-    coords = [RADeg, RADeg, decDeg, decDeg]
-    signs = [1.0, -1.0, 1.0, -1.0]
-    results = []
-    for f, c, sign in zip(funcCalls, coords, signs):
-        # Initial guess range
-        maxGuess = sign * targetHalfSizeSkyDeg * 10.0
-        minGuess = sign * targetHalfSizeSkyDeg / 10.0
-        guessStep = (maxGuess - minGuess) / 10.0
-        guesses = numpy.arange(minGuess + c, maxGuess + c, guessStep)
-        for i in range(50):
-            minSizeDiff = 1e6
-            bestGuess = None
-            for guess in guesses:
-                sizeDiff = abs(eval(f) - targetHalfSizeSkyDeg)
-                if sizeDiff < minSizeDiff:
-                    minSizeDiff = sizeDiff
-                    bestGuess = guess
-            if minSizeDiff < tolerance:
-                break
-            else:
-                guessRange = abs((maxGuess - minGuess))
-                maxGuess = bestGuess + guessRange / 4.0
-                minGuess = bestGuess - guessRange / 4.0
-                guessStep = (maxGuess - minGuess) / 10.0
-                guesses = numpy.arange(minGuess, maxGuess, guessStep)
-        results.append(bestGuess)
+    RADeg, decDeg, radiusSkyDeg = numpy.broadcast_arrays(
+        numpy.asarray(RADeg, dtype=float), numpy.asarray(decDeg, dtype=float),
+        numpy.asarray(radiusSkyDeg, dtype=float))
 
-    RAMax = results[0]
-    RAMin = results[1]
-    decMax = results[2]
-    decMin = results[3]
+    decMin = numpy.maximum(decDeg - radiusSkyDeg, -90.0)
+    decMax = numpy.minimum(decDeg + radiusSkyDeg, 90.0)
 
-    return [RAMin, RAMax, decMin, decMax]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        sinRatio = (numpy.sin(numpy.radians(radiusSkyDeg)) /
+                    numpy.cos(numpy.radians(decDeg)))
+    allRA = ((decDeg + radiusSkyDeg >= 90.0) |
+             (decDeg - radiusSkyDeg <= -90.0) | ~(sinRatio < 1.0))
+    halfWidth = numpy.degrees(numpy.arcsin(numpy.where(allRA, 0.0, sinRatio)))
+    RAMin = numpy.where(allRA, 0.0, (RADeg - halfWidth) % 360.0)
+    RAMax = numpy.where(allRA, 360.0, (RADeg + halfWidth) % 360.0)
 
+    return [x[()] for x in [RAMin, RAMax, decMin, decMax]]
 
+
+#-----------------------------------------------------------------------------
+def _lonLatInRange(name, lon, lat):
+    """Checks that longitudes and latitudes (in radians) are within
+    [-pi, pi] and [-pi/2, pi/2], printing a message if not.
+
+    """
+    lon = numpy.asarray(lon)
+    lat = numpy.asarray(lat)
+    if numpy.any(numpy.abs(lon) > numpy.pi) or \
+            numpy.any(numpy.abs(lat) > numpy.pi / 2):
+        print('%s: Input longitude and latitude out of range.\n' % name)
+        print('           lon: [-pi,pi]; lat: [-pi/2,pi/2].\n')
+        return False
+
+    return True
+
+
+#-----------------------------------------------------------------------------
 def aitoff(lon, lat):
     """
     Make Aitoff map projection.
@@ -531,38 +2203,172 @@ def aitoff(lon, lat):
     first do:
     l = l if l <= numpy.pi else l - 2 * numpy.pi
 
+    lon and lat may be numpy arrays, to project a whole catalogue at once.
+
     Keyword arguments:
     lon -- Traditional longitude in radians, in range [-pi:pi]
     lat -- Traditional latitude in radians, in range [-pi/2:pi/2]
     """
 
-    def sinc(x):
-        # a quick unnormalized sinc function, with discontinuity removed
-        if not x:
-            return 0
-        else:
-            return numpy.sin(x) / x
+    # check if the input values are in the range
+    if not _lonLatInRange('Aitoff', lon, lat):
+        return None
 
-    x = numpy.zeros_like(lon)
-    y = numpy.zeros_like(lat)
+    lon = numpy.asarray(lon, dtype=float)
+    lat = numpy.asarray(lat, dtype=float)
+    alpha = numpy.arccos(numpy.cos(lat) * numpy.cos(lon / 2.0))
 
-    # check if the input values are in the range
-    if lon > numpy.pi or lon < -numpy.pi or lat > numpy.pi / 2 or \
-            lat < -numpy.pi / 2:
-        print('Aitoff: Input longitude and latitude out of range.\n')
-        print('           lon: [-pi,pi]; lat: [-pi/2,pi/2].\n')
+    # the unnormalized sinc function, sin(alpha)/alpha, which is 1 at the
+    # sigularity at (0, 0)
+    sincAlpha = numpy.sinc(alpha / numpy.pi)
+    x = 2.0 * numpy.cos(lat) * numpy.sin(lon / 2.0) / sincAlpha
+    y = numpy.sin(lat) / sincAlpha
+
+    return x[()], y[()]
+
+
+#-----------------------------------------------------------------------------
+def hammer(lon, lat):
+    """Makes the Hammer (Hammer-Aitoff) equal-area map projection of the given
+    longitudes and latitudes (as for L{aitoff}, in radians, with longitude in
+    [-pi, pi] from the central meridian). The map is an ellipse with
+    -2*sqrt(2) <= x <= 2*sqrt(2) and -sqrt(2) <= y <= sqrt(2).
+
+    @type lon: float or numpy array
+    @param lon: longitude in radians, in range [-pi, pi]
+    @type lat: float or numpy array
+    @param lat: latitude in radians, in range [-pi/2, pi/2]
+    @rtype: tuple
+    @return: (x, y) coordinates in the projection, or None if the input is out
+        of range
+
+    """
+
+    if not _lonLatInRange('Hammer', lon, lat):
         return None
 
-    # take care of the sigularity at (0, 0), otherwise division by zero may
-    # happen
-    if lon == 0 and lat == 0:
-        return 0.0, 0.0
+    lon = numpy.asarray(lon, dtype=float)
+    lat = numpy.asarray(lat, dtype=float)
+    cosLat = numpy.cos(lat)
+    scale = numpy.sqrt(2.0) / numpy.sqrt(1.0 + cosLat * numpy.cos(lon / 2.0))
+    x = 2.0 * scale * cosLat * numpy.sin(lon / 2.0)
+    y = scale * numpy.sin(lat)
+
+    return x[()], y[()]
+
+
+#-----------------------------------------------------------------------------
+def hammerInverse(x, y):
+    """Converts coordinates in the Hammer projection (see L{hammer}) back into
+    longitude and latitude.
+
+    @type x: float or numpy array
+    @param x: x coordinate in the projection
+    @type y: float or numpy array
+    @param y: y coordinate in the projection
+    @rtype: tuple
+    @return: (lon, lat) in radians; these are NaN for points outside the map
+
+    """
+
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    with numpy.errstate(invalid='ignore'):
+        z2 = 1.0 - (x / 4.0) ** 2 - (y / 2.0) ** 2
+        outside = (x / 2.0) ** 2 + y ** 2 > 2.0 * (1.0 + 1e-12)
+        z = numpy.sqrt(numpy.maximum(z2, 0.0))
+        lon = 2.0 * numpy.arctan2(z * x, 2.0 * (2.0 * z2 - 1.0))
+        lat = numpy.arcsin(numpy.clip(z * y, -1.0, 1.0))
+    lon = numpy.where(outside, numpy.nan, lon)
+    lat = numpy.where(outside, numpy.nan, lat)
 
-    alpha = numpy.acos(numpy.cos(lat) * numpy.cos(lon / 2.0))
+    return lon[()], lat[()]
 
-    # the sinc function used here is the unnormalized sinc function
-    x = 2.0 * numpy.cos(lat) * numpy.sin(lon / 2.0) / sinc(alpha)
 
-    y = numpy.sin(lat) / sinc(alpha)
+#-----------------------------------------------------------------------------
+def _mollweideAngle(lat):
+    """Solves 2*theta + sin(2*theta) = pi*sin(lat) for the auxiliary angle
+    theta of the Mollweide projection, by Halley's method.
+
+    """
+    target = numpy.pi * numpy.sin(lat)
+    # Starting points: the solution for small lat, and the leading term of
+    # the series about the poles (where convergence is otherwise slow)
+    poleDistance = numpy.cbrt(6.0 * (numpy.pi - numpy.abs(target)))
+    twoTheta = numpy.where(numpy.abs(lat) < 0.7, target / 2.0,
+                           numpy.sign(lat) * (numpy.pi - poleDistance))
+    for i in range(20):
+        sinTwoTheta = numpy.sin(twoTheta)
+        gradient = 1.0 + numpy.cos(twoTheta)
+        residual = twoTheta + sinTwoTheta - target
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            step = (2.0 * residual * gradient /
+                    (2.0 * gradient * gradient + residual * sinTwoTheta))
+        # Exactly at the poles, gradient and residual are both zero
+        step[~numpy.isfinite(step)] = 0.0
+        twoTheta -= step
+        # Convergence is cubic, so the next step would be negligible
+        if numpy.all(numpy.abs(step) < 1e-10):
+            break
+
+    return twoTheta / 2.0
+
+
+#-----------------------------------------------------------------------------
+def mollweide(lon, lat):
+    """Makes the Mollweide equal-area map projection of the given longitudes
+    and latitudes (as for L{aitoff}, in radians, with longitude in [-pi, pi]
+    from the central meridian). The map is an ellipse with
+    -2*sqrt(2) <= x <= 2*sqrt(2) and -sqrt(2) <= y <= sqrt(2).
+
+    @type lon: float or numpy array
+    @param lon: longitude in radians, in range [-pi, pi]
+    @type lat: float or numpy array
+    @param lat: latitude in radians, in range [-pi/2, pi/2]
+    @rtype: tuple
+    @return: (x, y) coordinates in the projection, or None if the input is out
+        of range
+
+    """
+
+    if not _lonLatInRange('Mollweide', lon, lat):
+        return None
+
+    lon, lat = numpy.broadcast_arrays(numpy.asarray(lon, dtype=float),
+                                      numpy.asarray(lat, dtype=float))
+    theta = _mollweideAngle(lat.ravel()).reshape(lat.shape)
+    x = (2.0 * numpy.sqrt(2.0) / numpy.pi) * lon * numpy.cos(theta)
+    y = numpy.sqrt(2.0) * numpy.sin(theta)
+
+    return x[()], y[()]
+
+
+#-----------------------------------------------------------------------------
+def mollweideInverse(x, y):
+    """Converts coordinates in the Mollweide projection (see L{mollweide})
+    back into longitude and latitude.
+
+    @type x: float or numpy array
+    @param x: x coordinate in the projection
+    @type y: float or numpy array
+    @param y: y coordinate in the projection
+    @rtype: tuple
+    @return: (lon, lat) in radians; these are NaN for points outside the map
+
+    """
 
-    return x, y
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        theta = numpy.arcsin(numpy.clip(y / numpy.sqrt(2.0), -1.0, 1.0))
+        lat = numpy.arcsin(numpy.clip((2.0 * theta + numpy.sin(2.0 * theta)) /
+                                      numpy.pi, -1.0, 1.0))
+        cosTheta = numpy.cos(theta)
+        lon = numpy.where(cosTheta > 0, numpy.pi * x /
+                          (2.0 * numpy.sqrt(2.0) * cosTheta), 0.0)
+        outside = ((x / 2.0) ** 2 + y ** 2 > 2.0 * (1.0 + 1e-12)) | \
+            (numpy.abs(lon) > numpy.pi * (1.0 + 1e-12))
+    lon = numpy.where(outside, numpy.nan, lon)
+    lat = numpy.where(outside, numpy.nan, lat)
+
+    return lon[()], lat[()]
@@ -21,14 +21,129 @@ For extensive statistics modules, the Python bindings for GNU R
 (U{http://rpy.sourceforge.net}), or SciPy (U{http://www.scipy.org}) are
 suggested.
 
+The inner loops of the biweight estimators and the binners are compiled with
+numba, if it is installed. Set astStats.USE_JIT=False (or the environment
+variable ASTLIB_JIT=0) to use the pure-Python versions of these loops instead,
+e.g. to compare the two.
+
 """
 
+import os
 import math
 import numpy
 import collections
+try:
+    import numba
+except ImportError:
+    numba = None
 
 REPORT_ERRORS = True
 
+USE_JIT = os.environ.get('ASTLIB_JIT', '1') != '0'
+
+
+#-----------------------------------------------------------------------------
+def _jit(func):
+    """Decorator that compiles func with numba (lazily, on first call), if
+    numba is installed. The compiled function keeps the original as .py_func.
+
+    """
+    if numba is None:
+        return func
+    return numba.njit(func)
+
+
+#-----------------------------------------------------------------------------
+def _kernel(func, dataList):
+    """Returns the version of the kernel func selected by USE_JIT, together
+    with dataList converted to the type that version works fastest on (a
+    float array for compiled code, a list of floats for Python).
+
+    """
+    data = numpy.asarray(dataList, dtype=float)
+    if USE_JIT and numba is not None:
+        return func, data
+    return getattr(func, 'py_func', func), data.tolist()
+
+
+#-----------------------------------------------------------------------------
+@_jit
+def _biweightLocationSums(data, listMedian, scale):
+    """Returns the numerator and denominator sums of equation (5) of Beers et
+    al. 1990, where scale is the tuning constant times the MAD.
+
+    """
+    top = 0.0
+    bottom = 0.0
+    for i in range(len(data)):
+        u = (data[i] - listMedian) / scale
+        if abs(u) <= 1.0:
+            top = top + ((data[i] - listMedian) * (1.0 - (u * u)) *
+                         (1.0 - (u * u)))
+            bottom = bottom + ((1.0 - (u * u)) * (1.0 - (u * u)))
+
+    return top, bottom
+
+
+#-----------------------------------------------------------------------------
+@_jit
+def _biweightScaleSums(data, listMedian, scale):
+    """Returns the numerator and denominator sums of equation (9) of Beers et
+    al. 1990, and the number of values with |u| <= 1, where scale is the
+    tuning constant times the MAD.
+
+    """
+    top = 0.0
+    bottom = 0.0
+    valCount = 0
+    for i in range(len(data)):
+        u = (data[i] - listMedian) / scale
+        if abs(u) <= 1.0:
+            u2Term = 1.0 - u**2
+            u4Term = u2Term**4
+            top += abs(data[i] - listMedian)**2 * u4Term
+            bottom += (u2Term * (1.0 - (5.0 * u**2)))
+            valCount += 1
+
+    return top, bottom, valCount
+
+
+#-----------------------------------------------------------------------------
+@_jit
+def _binSums(data, weights, binMin, binStep, binTotal):
+    """Returns the sum of the weights of the data in each of the bins
+    (binMin + i*binStep, binMin + (i+1)*binStep].
+
+    """
+    bins = numpy.zeros(binTotal)
+    for i in range(binTotal):
+        total = 0.0
+        for j in range(len(data)):
+            if data[j] > (binMin + (i * binStep)) and data[j] <= (binMin + (
+                    (i + 1) * binStep)):
+                total += weights[j]
+        bins[i] = total
+
+    return bins
+
+
+#-----------------------------------------------------------------------------
+@_jit
+def _cumulativeSums(data, binMin, binStep, binTotal):
+    """Returns the fraction of the data greater than binMin + i*binStep, for
+    each bin i.
+
+    """
+    bins = numpy.zeros(binTotal)
+    for i in range(binTotal):
+        total = 0.0
+        for j in range(len(data)):
+            if data[j] > (binMin + (i * binStep)):
+                total = total + 1.0 / len(data)
+        bins[i] = total
+
+    return bins
+
 
 #-----------------------------------------------------------------------------
 def mean(dataList):
@@ -222,20 +337,9 @@ def biweightLocation(dataList, tuningConstant=6.0):
     listMedian = numpy.median(dataList)
     listMAD = MAD(dataList)
     if listMAD != 0:
-        uValues = []
-        for item in dataList:
-            uValues.append((item - listMedian) / (C * listMAD))
-
-        top = 0  # numerator equation (5) Beers et al if you like
-        bottom = 0  # denominator
-        for i in range(len(uValues)):
-            if math.fabs(uValues[i]) <= 1.0:
-                top = top + ((dataList[i] - listMedian) *
-                             (1.0 - (uValues[i] * uValues[i])) *
-                             (1.0 - (uValues[i] * uValues[i])))
-
-                bottom = bottom + ((1.0 - (uValues[i] * uValues[i])) *
-                                   (1.0 - (uValues[i] * uValues[i])))
+        # numerator and denominator of equation (5) Beers et al if you like
+        sums, data = _kernel(_biweightLocationSums, dataList)
+        top, bottom = sums(data, float(listMedian), float(C * listMAD))
 
         CBI = listMedian + (top / bottom)
 
@@ -267,30 +371,15 @@ def biweightScale(dataList, tuningConstant=9.0):
     # Calculate |x-M| values and u values
     listMedian = median(dataList)
     listMAD = MAD(dataList)
-    diffModuli = []
-    for item in dataList:
-        diffModuli.append(math.fabs(item - listMedian))
-    uValues = []
-    for item in dataList:
-        try:
-            uValues.append((item - listMedian) / (C * listMAD))
-        except ZeroDivisionError:
-            if REPORT_ERRORS:
-                print("ERROR: astStats.biweightScale(): divide by zero error.")
-            return None
+    if C * listMAD == 0:
+        if REPORT_ERRORS:
+            print("ERROR: astStats.biweightScale(): divide by zero error.")
+        return None
 
-    top = 0  # numerator equation (9) Beers etal 1990
-    bottom = 0  # denominator equation (9) Beers etal 1990
-    valCount = 0  # Count values where u<1 only
-
-    for i in range(len(uValues)):
-        # Skip u values >1
-        if math.fabs(uValues[i]) <= 1.0:
-            u2Term = 1.0 - math.pow(uValues[i], 2)
-            u4Term = math.pow(u2Term, 4)
-            top += math.pow(diffModuli[i], 2) * u4Term
-            bottom += (u2Term * (1.0 - (5.0 * math.pow(uValues[i], 2))))
-            valCount += 1
+    # numerator and denominator of equation (9) Beers etal 1990, and count of
+    # values where u<1 only
+    sums, data = _kernel(_biweightScaleSums, dataList)
+    top, bottom, valCount = sums(data, float(listMedian), float(C * listMAD))
 
     top = math.sqrt(top)
     bottom = math.fabs(bottom)
@@ -866,13 +955,9 @@ def cumulativeBinner(data, binMin, binMax, binTotal):
     """
     #Bin data
     binStep = float(binMax - binMin) / binTotal
-    bins = []
-    totalItems = len(data)
-    for i in range(binTotal):
-        bins.append(0)
-        for item in data:
-            if item > (binMin + (i * binStep)):
-                bins[i] = bins[i] + 1.0 / totalItems
+    sums, data = _kernel(_cumulativeSums, data)
+    bins = [float(b) for b in sums(data, float(binMin), binStep,
+                                   int(binTotal))]
 
     # Gnuplot requires points at bin midpoints
     coords = []
@@ -899,13 +984,10 @@ def binner(data, binMin, binMax, binTotal):
     """
     #Bin data
     binStep = float(binMax - binMin) / binTotal
-    bins = []
-    for i in range(binTotal):
-        bins.append(0)
-        for item in data:
-            if item > (binMin + (i * binStep)) and item <= (binMin + ((i + 1) *
-                                                                      binStep)):
-                bins[i] += 1
+    sums, data = _kernel(_binSums, data)
+    _, weights = _kernel(_binSums, numpy.ones(len(data)))
+    bins = [int(b) for b in sums(data, weights, float(binMin), binStep,
+                                 int(binTotal))]
 
     # Gnuplot requires points at bin midpoints
     coords = []
@@ -932,13 +1014,10 @@ def weightedBinner(data, weights, binMin, binMax, binTotal):
     """
     #Bin data
     binStep = float(binMax - binMin) / binTotal
-    bins = []
-    for i in range(binTotal):
-        bins.append(0.0)
-        for item, weight in zip(data, weights):
-            if item > (binMin + (i * binStep)) and item <= (binMin + ((i + 1) *
-                                                                      binStep)):
-                bins[i] += weight
+    sums, data = _kernel(_binSums, data)
+    _, weights = _kernel(_binSums, weights)
+    bins = [float(b) for b in sums(data, weights, float(binMin), binStep,
+                                   int(binTotal))]
 
     # Gnuplot requires points at bin midpoints
     coords = []
@@ -28,6 +28,35 @@ for details).
 @var C_LIGHT: The speed of light in km/s.
 @type C_LIGHT: float
 
+@var MAX_STEP: The largest step in ln(1+z) taken when integrating
+    cumulatively over a sorted array of redshifts (see L{dm}, L{dc}, L{tl}).
+    Each step is integrated with 5 point Gauss-Legendre quadrature, so the
+    default gives results accurate to machine precision.
+@type MAX_STEP: float
+
+@var CHUNK_SIZE: The number of integration steps (or, for the 'gauss'
+    method, redshifts) evaluated at once, which bounds the size of the
+    temporary arrays used by the integration engines.
+@type CHUNK_SIZE: int
+
+@var STREAM_CHUNK_SIZE: The number of redshifts converted at a time by
+    L{stream} when given a single (e.g. memory-mapped) array.
+@type STREAM_CHUNK_SIZE: int
+
+@var INTEGRATION_METHOD: The method used by L{dm}, L{dc}, L{tl} and L{t0}.
+    Either 'cumulative' (the default; one integration over the sorted
+    redshifts, best for large arrays) or 'gauss', which integrates every
+    redshift independently with fixed-order Gauss-Legendre quadrature in
+    w = (1+z)^-1/2, in which the integrands are smooth up to infinite
+    redshift. The 'gauss' method involves no sorting or interpolation, and
+    is well suited to scattered, unsorted redshifts.
+@type INTEGRATION_METHOD: string
+
+@var GAUSS_TOLERANCE: The relative tolerance used to choose the order of the
+    Gauss-Legendre quadrature when INTEGRATION_METHOD is 'gauss'. This is the
+    default for the tolerance argument of L{dm}, L{dc}, L{tl} and L{t0}.
+@type GAUSS_TOLERANCE: float
+
 """
 
 OMEGA_M0 = 0.3
@@ -37,6 +66,13 @@ H0 = 70.0
 
 C_LIGHT = 3.0e5
 
+MAX_STEP = 0.01
+CHUNK_SIZE = 65536
+STREAM_CHUNK_SIZE = 1048576
+
+INTEGRATION_METHOD = 'cumulative'
+GAUSS_TOLERANCE = 1e-12
+
 try:
     import numpy
 except:
@@ -48,6 +84,481 @@ except ImportError:
     print("WARNING: astCalc failed to import scipy modules - ",)
     print("some functions will not work")
 
+#------------------------------------------------------------------------------
+def _comovingIntegrand(omegaM0, omegaL0):
+    """Returns the line of sight comoving distance integrand dz/E(z) written as
+    a function of u = ln(1+z), ignoring radiation.
+
+    """
+    omegaK = 1.0 - omegaM0 - omegaL0
+
+    def _yn(u):
+        s = numpy.exp(u)
+        return s/numpy.sqrt(omegaM0*s**3 + omegaK*s**2 + omegaL0)
+
+    return _yn
+
+#------------------------------------------------------------------------------
+def _lookbackIntegrand(omegaM0, omegaL0):
+    """Returns the lookback time integrand dz/((1+z)E(z)) written as a function
+    of u = ln(1+z), ignoring radiation.
+
+    """
+    omegaK = 1.0 - omegaM0 - omegaL0
+
+    def _yn(u):
+        s = numpy.exp(u)
+        return 1.0/numpy.sqrt(omegaM0*s**3 + omegaK*s**2 + omegaL0)
+
+    return _yn
+
+#------------------------------------------------------------------------------
+def _Ez(z):
+    """Returns E(z) without the radiation term, consistent with the distance
+    integrands above.
+
+    """
+    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+
+    return numpy.sqrt(OMEGA_M0*(1.0+z)**3 + OMEGA_K*(1.0+z)**2 + OMEGA_L0)
+
+#------------------------------------------------------------------------------
+def _cumulativeNodes(z):
+    """Returns the integration nodes used by L{_cumulativeIntegral} for the
+    redshifts z: the sorted union, in u = ln(1+z), of z, 0 and a grid of
+    spacing L{MAX_STEP}. Also returned are the positions in it of u = 0 and
+    of every element of the flattened z. These depend only on z, and so may
+    be shared by integrals for several cosmologies.
+
+    """
+
+    u = numpy.log1p(numpy.asarray(z, dtype=float).ravel())
+
+    if u.size > 0:
+        uLow = min(0.0, numpy.min(u))
+        uHigh = max(0.0, numpy.max(u))
+    else:
+        uLow = uHigh = 0.0
+    grid = numpy.arange(uLow, uHigh, MAX_STEP)
+    nodes = numpy.union1d(numpy.append(grid, 0.0), u)
+
+    return nodes, numpy.searchsorted(nodes, 0.0), numpy.searchsorted(nodes, u)
+
+#------------------------------------------------------------------------------
+def _cumulativeTotals(nodes, zeroIndex, integrand):
+    """Integrates integrand(u) from u = 0 to each of the sorted nodes, by
+    integrating each interval between neighbouring nodes with 5 point
+    Gauss-Legendre quadrature and taking the running total. Temporary arrays
+    are limited to L{CHUNK_SIZE} intervals.
+
+    """
+
+    gaussNodes, gaussWeights = numpy.polynomial.legendre.leggauss(5)
+    leadingShape = numpy.shape(integrand(nodes[:1, numpy.newaxis]))[:-2]
+    segments = numpy.empty(leadingShape + (nodes.size-1,))
+    for i in range(0, nodes.size-1, CHUNK_SIZE):
+        a = nodes[i:i+CHUNK_SIZE+1]
+        halfStep = (0.5*(a[1:] - a[:-1]))[:, numpy.newaxis]
+        x = a[:-1, numpy.newaxis] + halfStep*(1.0 + gaussNodes)
+        segments[..., i:i+a.size-1] = numpy.dot(integrand(x)*halfStep,
+                gaussWeights)
+
+    total = numpy.cumsum(segments, axis=-1)
+    total = numpy.concatenate([numpy.zeros(total.shape[:-1] + (1,)), total],
+            axis=-1)
+    total -= total[..., zeroIndex][..., numpy.newaxis]
+
+    return total
+
+#------------------------------------------------------------------------------
+def _cumulativeIntegral(z, integrand):
+    """Integrates integrand(u), u = ln(1+z), from z = 0 to every redshift in
+    z in a single pass. The redshifts are sorted and merged with a grid of
+    spacing L{MAX_STEP} (see L{_cumulativeNodes}), each interval between
+    neighbouring nodes is integrated with 5 point Gauss-Legendre quadrature,
+    and the running total is mapped back onto the original order of z.
+    Temporary arrays are limited to L{CHUNK_SIZE} intervals.
+
+    @type z: float or numpy array
+    @param z: redshifts
+    @type integrand: function
+    @param integrand: function of u to integrate, which given an array of
+        shape (n, k) may return an array with extra leading dimensions (e.g.
+        one row per cosmology)
+    @rtype: float or numpy array
+    @return: integral from 0 to each z, with the leading dimensions of the
+        integrand followed by the shape of z
+
+    """
+
+    z = numpy.asarray(z, dtype=float)
+    nodes, zeroIndex, index = _cumulativeNodes(z)
+    total = _cumulativeTotals(nodes, zeroIndex, integrand)
+
+    result = total[..., index].reshape(total.shape[:-1] + z.shape)
+    if result.ndim == 0:
+        result = float(result)
+
+    return result
+
+#------------------------------------------------------------------------------
+def _gaussOrder(wMin, integrand, tolerance):
+    """Returns the smallest Gauss-Legendre order, from a fixed set, that
+    integrates integrand(w) over [wMin, 1] to within the given relative
+    tolerance, judged by comparison with the next order up.
+
+    """
+    orders = [4, 8, 16, 32, 64, 128, 256]
+    values = []
+    for order in orders:
+        nodes, weights = numpy.polynomial.legendre.leggauss(order)
+        halfWidth = 0.5*(1.0 - wMin)
+        value = halfWidth*numpy.sum(weights*integrand(wMin + halfWidth*(1.0 +
+            nodes)))
+        values.append(value)
+        if (len(values) > 1 and
+                abs(values[-1] - values[-2]) <= tolerance*abs(values[-1])):
+            return orders[len(values)-2]
+
+    return orders[-1]
+
+#------------------------------------------------------------------------------
+def _gaussIntegral(z, integrand, tolerance=None):
+    """Integrates integrand(w), w = (1+z)^-1/2, from w(z) to 1 (i.e., from
+    redshift 0 to z) independently for every redshift in z, using fixed-order
+    Gauss-Legendre quadrature. The nodes for each redshift are formed as an
+    (N, k) array, in chunks of L{CHUNK_SIZE} redshifts. If z is None, the
+    integral to infinite redshift (w = 0) is returned.
+
+    @type z: float, numpy array or None
+    @param z: redshifts
+    @type integrand: function
+    @param integrand: vectorised function of w to integrate
+    @type tolerance: float
+    @param tolerance: relative tolerance used to choose the quadrature order
+        (defaults to L{GAUSS_TOLERANCE})
+    @rtype: float or numpy array
+    @return: integral from 0 to each z, with the shape of z
+
+    """
+
+    if tolerance is None:
+        tolerance = GAUSS_TOLERANCE
+    if z is None:
+        z = numpy.inf
+    z = numpy.asarray(z, dtype=float)
+    # 1 - w, written to avoid cancellation at low redshift
+    width = -numpy.expm1(-0.5*numpy.log1p(z.ravel()))
+
+    result = numpy.empty(width.shape)
+    if width.size > 0:
+        order = _gaussOrder(1.0 - numpy.max(width), integrand, tolerance)
+        nodes, weights = numpy.polynomial.legendre.leggauss(order)
+        for i in range(0, width.size, CHUNK_SIZE):
+            halfWidth = 0.5*width[i:i+CHUNK_SIZE, numpy.newaxis]
+            x = 1.0 - halfWidth*(1.0 - nodes)
+            result[i:i+CHUNK_SIZE] = numpy.dot(integrand(x)*halfWidth,
+                weights)
+    result = result.reshape(z.shape)
+    if result.ndim == 0:
+        result = float(result)
+
+    return result
+
+#------------------------------------------------------------------------------
+def _comovingIntegral(z, tolerance=None):
+    """Returns the dimensionless line of sight comoving distance integral
+    int_0^z dz'/E(z') for the current cosmology, using the engine selected by
+    L{INTEGRATION_METHOD}, with the given tolerance for the 'gauss' engine.
+
+    """
+    if INTEGRATION_METHOD == 'gauss':
+        OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+
+        def _yn(w):
+            # dz/E(z) in terms of w = (1+z)^-1/2
+            return 2.0/numpy.sqrt(OMEGA_M0 + OMEGA_K*w**2 + OMEGA_L0*w**6)
+
+        return _gaussIntegral(z, _yn, tolerance)
+
+    elif INTEGRATION_METHOD == 'cumulative':
+        return _cumulativeIntegral(z, _comovingIntegrand(OMEGA_M0, OMEGA_L0))
+
+    else:
+        raise ValueError("INTEGRATION_METHOD must be 'cumulative' or 'gauss'")
+
+#------------------------------------------------------------------------------
+def _lookbackIntegral(z, tolerance=None):
+    """Returns the dimensionless lookback time integral
+    int_0^z dz'/((1+z')E(z')) for the current cosmology, using the engine
+    selected by L{INTEGRATION_METHOD}, with the given tolerance for the
+    'gauss' engine.
+
+    """
+    if INTEGRATION_METHOD == 'gauss':
+        OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+
+        def _yn(w):
+            # dz/((1+z)E(z)) in terms of w = (1+z)^-1/2
+            return 2.0*w**2/numpy.sqrt(OMEGA_M0 + OMEGA_K*w**2 +
+                OMEGA_L0*w**6)
+
+        return _gaussIntegral(z, _yn, tolerance)
+
+    elif INTEGRATION_METHOD == 'cumulative':
+        return _cumulativeIntegral(z, _lookbackIntegrand(OMEGA_M0, OMEGA_L0))
+
+    else:
+        raise ValueError("INTEGRATION_METHOD must be 'cumulative' or 'gauss'")
+
+#------------------------------------------------------------------------------
+def _invertMonotonic(target, forward, derivative, refine=True):
+    """Finds the redshifts at which the monotonically increasing function
+    forward(z) takes the values in target. The forward function is evaluated
+    once on a grid in ln(1+z) that is extended until it spans the targets,
+    and inverted by interpolation. If refine is True, the result is then
+    polished with vectorised Newton iterations using derivative(z).
+
+    @type target: float or numpy array
+    @param target: values of forward(z) to invert
+    @type forward: function
+    @param forward: vectorised, monotonically increasing function of z
+    @type derivative: function
+    @param derivative: vectorised derivative of forward with respect to z
+    @type refine: bool
+    @param refine: if True, apply Newton refinement
+    @rtype: float or numpy array
+    @return: redshifts, with the shape of target
+
+    """
+
+    target = numpy.asarray(target, dtype=float)
+    if target.size == 0:
+        return numpy.zeros(target.shape)
+
+    zMax = 10.0
+    while forward(zMax) < numpy.max(target):
+        zMax = zMax*10.0
+        if zMax > 1e10:
+            raise ValueError("target value out of range")
+
+    uGrid = numpy.linspace(0.0, numpy.log1p(zMax), 2001)
+    zGrid = numpy.expm1(uGrid)
+    z = numpy.expm1(numpy.interp(target, forward(zGrid), uGrid))
+
+    if refine:
+        for i in range(10):
+            step = (forward(z) - target)/derivative(z)
+            z = numpy.maximum(z - step, 0.0)
+            if numpy.all(numpy.abs(step) < 1e-10*(1.0 + z)):
+                break
+
+    if z.ndim == 0:
+        z = float(z)
+
+    return z
+
+#------------------------------------------------------------------------------
+def _curvatureCorrection(integralValue, omegaK):
+    """Converts the dimensionless line of sight comoving distance integral into
+    the dimensionless transverse comoving distance, for an array of curvature
+    parameters omegaK that broadcasts against integralValue.
+
+    """
+    omegaK = numpy.asarray(omegaK, dtype=float)
+    sqrtK = numpy.sqrt(numpy.where(omegaK == 0.0, 1.0, numpy.abs(omegaK)))
+
+    return numpy.where(omegaK > 0.0, numpy.sinh(sqrtK*integralValue)/sqrtK,
+        numpy.where(omegaK < 0.0, numpy.sin(sqrtK*integralValue)/sqrtK,
+        integralValue))
+
+#------------------------------------------------------------------------------
+def _sweepBlock(args):
+    """Evaluates the dimensionless quantity needed by L{sweep} for a chunk of
+    (omegaM0, omegaL0) pairs, with one row per pair, on the integration nodes
+    shared by all chunks (see L{_cumulativeNodes}). The rows are integrated
+    rowsPerBlock at a time. Kept at module level so that it can be used with
+    a multiprocessing pool.
+
+    """
+    zShape, nodes, zeroIndex, index, omegaM0, omegaL0, quantity, \
+        rowsPerBlock = args
+
+    results = []
+    for i in range(0, omegaM0.size, rowsPerBlock):
+        blockM0 = omegaM0[i:i+rowsPerBlock, numpy.newaxis, numpy.newaxis]
+        blockL0 = omegaL0[i:i+rowsPerBlock, numpy.newaxis, numpy.newaxis]
+        if quantity == 'tl':
+            integrand = _lookbackIntegrand(blockM0, blockL0)
+        else:
+            integrand = _comovingIntegrand(blockM0, blockL0)
+        values = _cumulativeTotals(nodes, zeroIndex, integrand)[:, index]
+        if quantity in ['dl', 'da', 'dm']:
+            values = _curvatureCorrection(values,
+                (1.0 - blockM0 - blockL0)[:, :, 0])
+        results.append(values)
+
+    return numpy.concatenate(results, axis=0).reshape((-1,) + zShape)
+
+#------------------------------------------------------------------------------
+def sweep(z, omegaM0, omegaL0, hubble0=70.0, quantity='dl', processes=None):
+    """Evaluates a distance or time for every redshift in z, for each of a
+    set of cosmologies, without changing the module-level parameters. The
+    parameters omegaM0, omegaL0 and hubble0 are broadcast against each other
+    to give n_cosmo cosmologies, e.g. the flattened output of numpy.meshgrid.
+    The integral is evaluated once for each distinct (omegaM0, omegaL0) pair,
+    with blocks of pairs integrated together with the vectorised engine used
+    by L{dc} on integration nodes shared by all of them, and H0 is applied
+    as a scale factor.
+
+    @type z: numpy array
+    @param z: redshifts
+    @type omegaM0: float or numpy array
+    @param omegaM0: matter density parameter(s) at z=0
+    @type omegaL0: float or numpy array
+    @param omegaL0: dark energy density parameter(s) at z=0
+    @type hubble0: float or numpy array
+    @param hubble0: Hubble parameter(s) in km/s/Mpc at z=0
+    @type quantity: string
+    @param quantity: one of 'dl', 'da', 'dm', 'dc' (in Mpc) or 'tl' (in Gyr)
+    @type processes: int
+    @param processes: if greater than 1, chunks of cosmologies are evaluated
+        in parallel using a multiprocessing pool of this size
+    @rtype: numpy array
+    @return: array of shape (n_cosmo,) + z.shape
+
+    """
+
+    if quantity not in ['dl', 'da', 'dm', 'dc', 'tl']:
+        raise ValueError("quantity must be 'dl', 'da', 'dm', 'dc' or 'tl'")
+
+    z = numpy.asarray(z, dtype=float)
+    omegaM0, omegaL0, hubble0 = numpy.broadcast_arrays(
+        numpy.atleast_1d(numpy.asarray(omegaM0, dtype=float)),
+        numpy.atleast_1d(numpy.asarray(omegaL0, dtype=float)),
+        numpy.atleast_1d(numpy.asarray(hubble0, dtype=float)))
+    omegaM0 = omegaM0.ravel()
+    omegaL0 = omegaL0.ravel()
+    hubble0 = hubble0.ravel()
+
+    pairs, inverse = numpy.unique(numpy.column_stack([omegaM0, omegaL0]),
+        axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    # The redshifts are sorted and merged with the integration grid once, and
+    # the nodes shared by every cosmology. Within a chunk of pairs, blocks
+    # are limited to roughly CHUNK_SIZE integration steps in total
+    nodes, zeroIndex, index = _cumulativeNodes(z)
+    rowsPerBlock = max(1, CHUNK_SIZE//nodes.size)
+    if processes is not None and processes > 1:
+        nChunks = min(pairs.shape[0], 4*processes)
+    else:
+        nChunks = 1
+    blocks = [(z.shape, nodes, zeroIndex, index, chunk[:, 0], chunk[:, 1],
+        quantity, rowsPerBlock) for chunk in numpy.array_split(pairs,
+        nChunks)]
+
+    if len(blocks) > 1:
+        from multiprocessing import Pool
+        pool = Pool(processes)
+        try:
+            results = pool.map(_sweepBlock, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_sweepBlock(block) for block in blocks]
+
+    values = numpy.concatenate(results, axis=0)[inverse]
+
+    scaleShape = (-1,) + (1,)*z.ndim
+    if quantity == 'tl':
+        values = values*((1.0/hubble0*3.08e19)/3.16e7/1e9).reshape(scaleShape)
+    else:
+        values = values*(C_LIGHT/hubble0).reshape(scaleShape)
+    if quantity == 'dl':
+        values = values*(1.0+z)
+    elif quantity == 'da':
+        values = values/(1.0+z)
+
+    return values
+
+#------------------------------------------------------------------------------
+def stream(zChunks, quantity='dl', out=None, chunkSize=None):
+    """Generator that converts redshifts into distances chunk by chunk, so
+    that catalogues too large to process in one go (e.g. held in a
+    numpy.memmap) can be handled with bounded peak memory. The distance integral
+    is evaluated once per chunk and shared between all of the requested
+    quantities.
+
+    @type zChunks: numpy array or iterable
+    @param zChunks: either a 1d array of redshifts (e.g. a numpy.memmap), which
+        is read in slices of chunkSize rows, or an iterable yielding arrays of
+        redshifts
+    @type quantity: string or list
+    @param quantity: 'dl', 'da', 'dm', 'dc' (in Mpc) or 'mu' (distance
+        modulus, see L{distanceModulus}), or a list of these
+    @type out: numpy array or list
+    @param out: optional preallocated array (e.g. a numpy.memmap opened in
+        write mode), or list of arrays matching a list of quantities, into
+        which the results are written in input order (list entries may be
+        None)
+    @type chunkSize: int
+    @param chunkSize: number of rows per chunk when zChunks is an array
+        (defaults to L{STREAM_CHUNK_SIZE})
+    @rtype: generator
+    @return: yields an array for each chunk (a tuple of arrays if quantity is
+        a list); when out is given, these are views into out
+    """
+
+    quantities = quantity
+    if isinstance(quantity, str):
+        quantities = [quantity]
+        if out is not None:
+            out = [out]
+    for q in quantities:
+        if q not in ['dl', 'da', 'dm', 'dc', 'mu']:
+            raise ValueError("quantity must be 'dl', 'da', 'dm', 'dc' or "
+                "'mu'")
+    if out is not None and len(out) != len(quantities):
+        raise ValueError("out must give one array per quantity")
+
+    if chunkSize is None:
+        chunkSize = STREAM_CHUNK_SIZE
+    if hasattr(zChunks, 'shape'):
+        zArray = zChunks
+        zChunks = (zArray[i:i+chunkSize] for i in range(0, zArray.shape[0],
+            chunkSize))
+
+    start = 0
+    for z in zChunks:
+        z = numpy.asarray(z, dtype=float)
+        integralValue = _comovingIntegral(z)
+        DM = C_LIGHT/H0*_curvatureCorrection(integralValue,
+            1.0 - OMEGA_M0 - OMEGA_L0)
+        results = []
+        for i, q in enumerate(quantities):
+            if q == 'dm':
+                value = DM
+            elif q == 'dc':
+                value = C_LIGHT/H0*integralValue
+            elif q == 'da':
+                value = DM/(1.0+z)
+            else:
+                value = DM*(1.0+z)
+                if q == 'mu':
+                    value = 5.0*numpy.log10(value) + 25.0
+            if out is not None and out[i] is not None:
+                out[i][start:start+z.shape[0]] = value
+                value = out[i][start:start+z.shape[0]]
+            results.append(value)
+        start = start+z.shape[0]
+
+        if isinstance(quantity, str):
+            yield results[0]
+        else:
+            yield tuple(results)
+
 #------------------------------------------------------------------------------
 def dl(z):
     """Calculates the luminosity distance in Mpc at redshift z.
@@ -80,50 +591,24 @@ def da(z):
     return DA
 
 #------------------------------------------------------------------------------
-#@numpy.vectorize
-def dm(z):
+def dm(z, tolerance=None):
     """Calculates the transverse comoving distance (proper motion distance) in
-    Mpc at redshift z.
+    Mpc at redshift z. By default, all redshifts are handled with a single
+    cumulative integration (see L{INTEGRATION_METHOD}).
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @type tolerance: float
+    @param tolerance: relative tolerance used to choose the quadrature order
+        when INTEGRATION_METHOD is 'gauss' (defaults to L{GAUSS_TOLERANCE})
+    @rtype: float or numpy array
     @return: transverse comoving distance (proper motion distance) in Mpc
 
     """
 
     OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
 
-    N = 1000
-
-    # Integration limits
-    xMax = numpy.ones(len(z))
-    xMin = 1.0 / (1.0 + z)
-    xStep = (xMax - xMin)/N
-
-    # Running total of y as we integrate
-    yTotal = numpy.zeros(len(z))
-
-    # Simpson's rule integration
-    for n in range(N):
-        x = xMin + xStep * n
-
-        # Function to be integrated
-        yn = (1.0/numpy.sqrt(OMEGA_M0*x + OMEGA_L0*numpy.power(x, 4) +
-            OMEGA_K*numpy.power(x, 2)))
-
-        if n==0 or n== N:
-            yTotal += yn
-        else:
-            oddness = n/2.0
-            fractPart = numpy.modf(oddness)[0]
-            if fractPart == 0.5: # odd
-                yTotal += (4. * yn)
-            else:
-                yTotal += (2.* yn)
-
-    integralValue = (xMax - xMin)/ (3*N) * yTotal
-    #integralValue, integralError = integrate.quad(yn, xMin, xMax)
+    integralValue = _comovingIntegral(z, tolerance)
 
     if OMEGA_K > 0.0:
         DM = (C_LIGHT/H0 * numpy.power(abs(OMEGA_K), -0.5) *
@@ -137,30 +622,24 @@ def dm(z):
     return DM
 
 #------------------------------------------------------------------------------
-@numpy.vectorize
-def dc(z):
+def dc(z, tolerance=None):
     """Calculates the line of sight comoving distance in Mpc at redshift z.
+    By default, all redshifts are handled with a single cumulative
+    integration (see L{INTEGRATION_METHOD}).
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @type tolerance: float
+    @param tolerance: relative tolerance used to choose the quadrature order
+        when INTEGRATION_METHOD is 'gauss' (defaults to L{GAUSS_TOLERANCE})
+    @rtype: float or numpy array
     @return: transverse comoving distance (proper motion distance) in Mpc
 
     """
 
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+    integralValue = _comovingIntegral(z, tolerance)
 
-    # Integration limits
-    xMax = 1.0
-    xMin = 1.0 / (1.0 + z)
-
-    # Function to be integrated
-    yn = lambda x: (1.0/numpy.sqrt(OMEGA_M0*x + OMEGA_L0*numpy.power(x, 4) +
-            OMEGA_K*numpy.power(x, 2)))
-
-    integralValue, integralError = integrate.quad(yn, xMin, xMax)
-
-    DC= C_LIGHT/H0*integralValue
+    DC = C_LIGHT/H0*integralValue
 
     return DC
 
@@ -182,142 +661,169 @@ def dVcdz(z):
     return dVcdz
 
 #------------------------------------------------------------------------------
-def dl2z(distanceMpc):
-    """Calculates the redshift z corresponding to the luminosity distance given
-    in Mpc.
-
-    @type distanceMpc: float
-    @param distanceMpc: distance in Mpc
-    @rtype: float
-    @return: redshift
+def Vc(z, areaDeg2=None):
+    """Calculates the total comoving volume in Mpc^3 out to redshift z, over
+    the whole sky or, if areaDeg2 is given, over a survey of that area. The
+    volume follows from the transverse comoving distance (Hogg 1999, astro-
+    ph/9905116, eq. 29), so all redshifts are handled with the single
+    cumulative integration used by L{dm}.
+
+    @type z: float or numpy array
+    @param z: redshift
+    @type areaDeg2: float
+    @param areaDeg2: survey area in square degrees (None for the whole sky)
+    @rtype: float or numpy array
+    @return: comoving volume in Mpc^3
 
     """
 
-    dTarget = distanceMpc
-    toleranceMpc = 0.1
+    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+    dH = C_LIGHT/H0
 
-    zMin = numpy.zeros(len(dTarget))
-    zMax = 10* numpy.ones(len(dTarget))
+    DM = dm(z)
 
-    diff = dl(zMax) - dTarget
-    while 1:
-        x = diff < 0
-        if not x.all():
-            break
-        zMax[x] += 5.
-        diff[x] = dl(zMax[x]) - dTarget
+    if OMEGA_K > 0.0:
+        x = numpy.sqrt(OMEGA_K)*DM/dH
+        VC = (4.0*numpy.pi*dH**3/(2.0*OMEGA_K) * (DM/dH*numpy.sqrt(1.0 +
+            x**2) - numpy.arcsinh(x)/numpy.sqrt(OMEGA_K)))
+    elif OMEGA_K == 0.0:
+        VC = 4.0*numpy.pi/3.0*DM**3
+    elif OMEGA_K < 0.0:
+        x = numpy.sqrt(abs(OMEGA_K))*DM/dH
+        VC = (4.0*numpy.pi*dH**3/(2.0*OMEGA_K) * (DM/dH*numpy.sqrt(1.0 -
+            x**2) - numpy.arcsin(x)/numpy.sqrt(abs(OMEGA_K))))
+
+    if areaDeg2 is not None:
+        VC = VC*areaDeg2/(4.0*numpy.pi*numpy.degrees(1.0)**2)
 
-    zTrial = zMin + (zMax - zMin)/2.
+    return VC
 
-    dTrial = dl(zTrial)
-    diff = dTrial - dTarget
-    while 1:
-        x = numpy.abs(diff) < toleranceMpc
-        if x.all():
-            break
-        y = diff > 0
-        zMax[y] -= (zMax[y] - zMin[y])/2.
-        zMin[~y] += (zMax[~y] - zMin[~y])/2.
+#------------------------------------------------------------------------------
+def VcBins(zEdges, areaDeg2=None):
+    """Calculates the comoving volume in Mpc^3 of each of a set of redshift
+    bins, over the whole sky or, if areaDeg2 is given, over a survey of that
+    area. See L{Vc}.
+
+    @type zEdges: numpy array
+    @param zEdges: monotonically increasing redshift bin edges (n+1 values
+        for n bins)
+    @type areaDeg2: float
+    @param areaDeg2: survey area in square degrees (None for the whole sky)
+    @rtype: numpy array
+    @return: comoving volume of each bin in Mpc^3
 
-        zTrial[~x] = zMin[~x] + (zMax[~x] - zMin[~x])/2.
-        dTrial = dl(zTrial)
-        diff = dTrial - dTarget
+    """
 
-    return zTrial
+    return numpy.diff(Vc(zEdges, areaDeg2))
 
 #------------------------------------------------------------------------------
-def dc2z(distanceMpc):
-    """Calculates the redshift z corresponding to the comoving distance given
-    in Mpc.
+def dl2z(distanceMpc, refine=True):
+    """Calculates the redshift z corresponding to the luminosity distance given
+    in Mpc. All distances are handled at once by inverting a table of L{dl},
+    optionally refined with Newton iterations.
 
-    @type distanceMpc: float
+    @type distanceMpc: float or numpy array
     @param distanceMpc: distance in Mpc
-    @rtype: float
+    @type refine: bool
+    @param refine: if True, refine the interpolated redshifts with Newton
+        iterations using the analytic derivative of dl
+    @rtype: float or numpy array
     @return: redshift
 
+    @note: Raises ValueError if distanceMpc is negative.
+
     """
 
-    dTarget = distanceMpc
-    toleranceMpc = 0.1
+    if numpy.any(numpy.asarray(distanceMpc) < 0):
+        raise ValueError('Distance must be positive')
 
-    zMin = numpy.zeros(len(dTarget))
-    zMax = 10* numpy.ones(len(dTarget))
+    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+    dH = C_LIGHT/H0
 
-    diff = dc(zMax) - dTarget
-    while 1:
-        x = diff < 0
-        if not x.all():
-            break
-        zMax[x] += 5.
-        diff[x] = dc(zMax[x]) - dTarget
+    def _derivative(z):
+        DM = dm(z)
+        return (DM + (1.0+z)*dH/_Ez(z) *
+                numpy.sqrt(numpy.maximum(1.0 + OMEGA_K*(DM/dH)**2, 0.0)))
 
-    zTrial = zMin + (zMax - zMin)/2.
+    return _invertMonotonic(distanceMpc, dl, _derivative, refine)
 
-    dTrial = dc(zTrial)
-    diff = dTrial - dTarget
-    while 1:
-        x = numpy.abs(diff) < toleranceMpc
-        if x.all():
-            break
-        y = diff > 0
-        zMax[y] -= (zMax[y] - zMin[y])/2.
-        zMin[~y] += (zMax[~y] - zMin[~y])/2.
+#------------------------------------------------------------------------------
+def dc2z(distanceMpc, refine=True):
+    """Calculates the redshift z corresponding to the comoving distance given
+    in Mpc. All distances are handled at once by inverting a table of L{dc},
+    optionally refined with Newton iterations.
 
-        zTrial[~x] = zMin[~x] + (zMax[~x] - zMin[~x])/2.
-        dTrial = dc(zTrial)
-        diff = dTrial - dTarget
+    @type distanceMpc: float or numpy array
+    @param distanceMpc: distance in Mpc
+    @type refine: bool
+    @param refine: if True, refine the interpolated redshifts with Newton
+        iterations using the analytic derivative of dc
+    @rtype: float or numpy array
+    @return: redshift
+
+    @note: Raises ValueError if distanceMpc is negative.
 
-    return zTrial
+    """
+
+    if numpy.any(numpy.asarray(distanceMpc) < 0):
+        raise ValueError('Distance must be positive')
+
+    dH = C_LIGHT/H0
+
+    def _derivative(z):
+        return dH/_Ez(z)
+
+    return _invertMonotonic(distanceMpc, dc, _derivative, refine)
 
 #------------------------------------------------------------------------------
-def t0():
+def t0(tolerance=None):
     """Calculates the age of the universe in Gyr at z=0 for the current set of
     cosmological parameters.
 
+    @type tolerance: float
+    @param tolerance: relative tolerance used to choose the quadrature order
+        when INTEGRATION_METHOD is 'gauss' (defaults to L{GAUSS_TOLERANCE})
     @rtype: float
     @return: age of the universe in Gyr at z=0
 
     """
 
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+    if INTEGRATION_METHOD == 'gauss':
+        integralValue = _lookbackIntegral(None, tolerance)
+    else:
+        OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
 
-    # Integration limits
-    xMax = 1.0
-    xMin = 0
+        # Integration limits
+        xMax = 1.0
+        xMin = 0
 
-    # Function to be integrated
-    yn = lambda x: (x/numpy.sqrt(OMEGA_M0*x + OMEGA_L0*numpy.power(x, 4) +
-            OMEGA_K*numpy.power(x, 2)))
+        # Function to be integrated
+        yn = lambda x: (x/numpy.sqrt(OMEGA_M0*x + OMEGA_L0*numpy.power(x, 4) +
+                OMEGA_K*numpy.power(x, 2)))
 
-    integralValue, integralError = integrate.quad(yn, xMin, xMax)
+        integralValue, integralError = integrate.quad(yn, xMin, xMax)
 
     T0 = (1.0/H0*integralValue*3.08e19)/3.16e7/1e9
 
     return T0
 
 #------------------------------------------------------------------------------
-@numpy.vectorize
-def tl(z):
+def tl(z, tolerance=None):
     """ Calculates the lookback time in Gyr to redshift z for the current set
-    of cosmological parameters.
+    of cosmological parameters. By default, all redshifts are handled with a
+    single cumulative integration (see L{INTEGRATION_METHOD}).
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @type tolerance: float
+    @param tolerance: relative tolerance used to choose the quadrature order
+        when INTEGRATION_METHOD is 'gauss' (defaults to L{GAUSS_TOLERANCE})
+    @rtype: float or numpy array
     @return: lookback time in Gyr to redshift z
 
     """
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
-
-    # Integration limits
-    xMax = 1.0
-    xMin = 1./(1.+z)
 
-    # Function to be integrated
-    yn = lambda x: (x/numpy.sqrt(OMEGA_M0*x + OMEGA_L0*numpy.power(x, 4) +
-            OMEGA_K*numpy.power(x, 2)))
-
-    integralValue, integralError = integrate.quad(yn, xMin, xMax)
+    integralValue = _lookbackIntegral(z, tolerance)
 
     T0 = (1.0/H0*integralValue*3.08e19)/3.16e7/1e9
 
@@ -340,70 +846,59 @@ def tz(z):
     return TZ
 
 #------------------------------------------------------------------------------
-def tl2z(tlGyr):
+def tl2z(tlGyr, refine=True):
     """Calculates the redshift z corresponding to lookback time tlGyr given in
-    Gyr.
+    Gyr. All times are handled at once by inverting a table of L{tl},
+    optionally refined with Newton iterations.
 
-    @type tlGyr: float
+    @type tlGyr: float or numpy array
     @param tlGyr: lookback time in Gyr
-    @rtype: float
+    @type refine: bool
+    @param refine: if True, refine the interpolated redshifts with Newton
+        iterations using the analytic derivative of tl
+    @rtype: float or numpy array
     @return: redshift
 
-    @note: Raises ValueError if tlGyr is not positive.
+    @note: Raises ValueError if tlGyr is not positive, or is not less than the
+        age of the universe.
 
     """
-    if tlGyr.any() < 0.:
-        raise ValueError('Lookback time must be positive')
 
-    tTarget = tlGyr
-
-    toleranceGyr = 0.001
-
-    zMin = numpy.zeros(len(tTarget))
-    zMax = 10. * numpy.ones(len(tTarget))
-
-    diff = tl(zMax) - tTarget
-    while 1:
-        x = diff < 0
-        if not x.all():
-            zMax[x]  += 5.0
-            diff[x] = tl(zMax[x]) - tTarget
-
-    zTrial = zMin + (zMax - zMin)/2.0
+    tlGyr = numpy.asarray(tlGyr, dtype=float)
+    if numpy.any(tlGyr < 0.):
+        raise ValueError('Lookback time must be positive')
+    if numpy.any(tlGyr >= t0()):
+        raise ValueError('Lookback time must be less than the age of the '
+                         'universe')
 
-    tTrial = tl(zTrial)
-    diff = tTrial - tTarget
-    while 1:
-        x = numpy.abs(diff) < toleranceGyr
-        if x.all():
-            break
-        y = diff > 0
-        zMax[y] -= (zMax[y] - zMin[y])/2.
-        zMin[~y] += (zMax[~y] - zMin[~y])/2.
+    tH = (1.0/H0*3.08e19)/3.16e7/1e9
 
-        zTrial[~x] = zMin[~x] + (zMax[~x] - zMin[~x])/2.
-        tTrial = tl(zTrial)
-        diff = tTrial - tTarget
+    def _derivative(z):
+        return tH/((1.0+z)*_Ez(z))
 
-    return zTrial
+    return _invertMonotonic(tlGyr, tl, _derivative, refine)
 
 #------------------------------------------------------------------------------
-def tz2z(tzGyr):
+def tz2z(tzGyr, refine=True):
     """Calculates the redshift z corresponding to age of the universe tzGyr
-    given in Gyr.
+    given in Gyr. See L{tl2z}.
 
-    @type tzGyr: float
+    @type tzGyr: float or numpy array
     @param tzGyr: age of the universe in Gyr
-    @rtype: float
+    @type refine: bool
+    @param refine: if True, refine the interpolated redshifts with Newton
+        iterations using the analytic derivative of tl
+    @rtype: float or numpy array
     @return: redshift
 
     @note: Raises ValueError if Universe age not positive
 
     """
-    if tzGyr.any() <= 0:
+    tzGyr = numpy.asarray(tzGyr, dtype=float)
+    if numpy.any(tzGyr <= 0):
         raise ValueError('Universe age must be positive.')
     tl = t0() - tzGyr
-    z = tl2z(tl)
+    z = tl2z(tl, refine)
 
     return z
 
@@ -424,6 +919,80 @@ def absMag(appMag, distMpc):
 
     return absMag
 
+#------------------------------------------------------------------------------
+def distanceModulus(z):
+    """Calculates the distance modulus, 5 log10(D_L / 10 pc), at redshift z.
+
+    @type z: float or numpy array
+    @param z: redshift
+    @rtype: float or numpy array
+    @return: distance modulus in magnitudes
+
+    """
+
+    mu = 5.0*numpy.log10(dl(z)*1.0e5)
+
+    return mu
+
+#------------------------------------------------------------------------------
+def catalogueQuantities(z, appMag=None, angSizeArcsec=None, flux=None):
+    """Converts catalogue columns of observed quantities into physical ones.
+    The transverse comoving distance is evaluated once for all objects, and
+    dl, da and the other derived columns follow from it directly.
+
+    Instead of separate arrays, z may be a structured array (or a dictionary
+    of arrays) with a field named 'z' and, optionally, fields named 'appMag',
+    'angSizeArcsec' and 'flux'. These fields are used for any of the other
+    arguments that are not given.
+
+    @type z: numpy array, structured array or dictionary
+    @param z: redshifts, or a catalogue as described above
+    @type appMag: numpy array
+    @param appMag: apparent magnitudes
+    @type angSizeArcsec: numpy array
+    @param angSizeArcsec: angular sizes in arcsec
+    @type flux: numpy array
+    @param flux: bolometric fluxes in erg/s/cm^2
+    @rtype: dictionary
+    @return: dictionary of arrays with keys 'dl', 'da' (in Mpc) and 'mu'
+        (distance modulus), plus 'absMag', 'sizeKpc' and 'luminosity' (in
+        erg/s) if appMag, angSizeArcsec and flux respectively are available
+
+    """
+
+    if isinstance(z, dict) or getattr(getattr(z, 'dtype', None), 'names',
+            None) is not None:
+        catalogue = z
+        if isinstance(catalogue, dict):
+            names = list(catalogue.keys())
+        else:
+            names = catalogue.dtype.names
+        z = catalogue['z']
+        if appMag is None and 'appMag' in names:
+            appMag = catalogue['appMag']
+        if angSizeArcsec is None and 'angSizeArcsec' in names:
+            angSizeArcsec = catalogue['angSizeArcsec']
+        if flux is None and 'flux' in names:
+            flux = catalogue['flux']
+
+    z = numpy.asarray(z, dtype=float)
+    DM = dm(z)
+    DL = DM*(1.0+z)
+    DA = DM/(1.0+z)
+
+    columns = {'dl': DL, 'da': DA}
+    columns['mu'] = 5.0*numpy.log10(DL*1.0e5)
+    if appMag is not None:
+        columns['absMag'] = numpy.asarray(appMag, dtype=float) - columns['mu']
+    if angSizeArcsec is not None:
+        columns['sizeKpc'] = (numpy.radians(numpy.asarray(angSizeArcsec,
+            dtype=float)/3600.0)*DA*1000.0)
+    if flux is not None:
+        columns['luminosity'] = (4.0*numpy.pi*(DL*3.0857e24)**2*
+            numpy.asarray(flux, dtype=float))
+
+    return columns
+
 #------------------------------------------------------------------------------
 def Ez(z):
     """Calculates the value of E(z), which describes evolution of the Hubble
@@ -515,9 +1084,9 @@ def DeltaVz(z):
     assuming a S{Lambda}CDM-type flat cosmology. See, e.g., Bryan & Norman
     1998 (ApJ, 495, 80).
 
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @rtype: float
+    @rtype: float or numpy array
     @return: density contrast of a virialised region at redshift z
 
     @note: If OMEGA_M0+OMEGA_L0 is not equal to 1, this routine exits and
@@ -543,14 +1112,14 @@ def RVirialXRayCluster(kT, z, betaT):
     cosmology. See Arnaud et al. 2002 (A&A, 389, 1) and Bryan & Norman 1998
     (ApJ, 495, 80). A flat S{Lambda}CDM-type flat cosmology is assumed.
 
-    @type kT: float
+    @type kT: float or numpy array
     @param kT: cluster X-ray temperature in keV
-    @type z: float
+    @type z: float or numpy array
     @param z: redshift
-    @type betaT: float
+    @type betaT: float or numpy array
     @param betaT: the normalisation of the virial relation, for which Evrard et
     al. 1996 (ApJ,469, 494) find a value of 1.05
-    @rtype: float
+    @rtype: float or numpy array
     @return: virial radius of cluster in Mpc
 
     @note: If OMEGA_M0+OMEGA_L0 is not equal to 1, this routine exits and
@@ -558,24 +1127,42 @@ def RVirialXRayCluster(kT, z, betaT):
 
     """
 
-    OMEGA_K = 1.0 - OMEGA_M0 - OMEGA_L0
+    return virialXRayClusters(kT, z, betaT)[0]
 
-    if OMEGA_K == 0.0:
-        Omega_Mz = OmegaMz(z)
-        deltaVz = (18.0 * numpy.power(numpy.pi, 2) + 82.0 * (Omega_Mz-1.0)- 39.0 *
-                numpy.power(Omega_Mz-1, 2))
-        deltaz = (deltaVz*OMEGA_M0)/(18.0*numpy.power(numpy.pi, 2)*Omega_Mz)
+#------------------------------------------------------------------------------
+def virialXRayClusters(kT, z, betaT):
+    """Calculates the virial radii (in Mpc) and density contrasts
+    S{Delta}V(z) of galaxy clusters with X-ray temperatures kT at redshifts
+    z, as in L{RVirialXRayCluster} and L{DeltaVz}, in one call. The inputs
+    are broadcast against each other, so that, e.g., kT and betaT arrays of
+    shape (n_samples, n_clusters) from an MCMC chain may be combined with a
+    redshift array of shape (n_clusters,).
+
+    @type kT: float or numpy array
+    @param kT: cluster X-ray temperatures in keV
+    @type z: float or numpy array
+    @param z: redshifts
+    @type betaT: float or numpy array
+    @param betaT: the normalisation(s) of the virial relation
+    @rtype: tuple
+    @return: virial radii in Mpc, density contrasts S{Delta}V(z)
+
+    @note: Raises an Exception if OMEGA_M0+OMEGA_L0 is not equal to 1.
 
-        # The equation quoted in Arnaud, Aghanim & Neumann is for h50, so need
-        # to scale it
-        h50 = H0/50.0
-        Rv = (3.80*numpy.sqrt(betaT)*numpy.power(deltaz, -0.5) *
-            numpy.power(1.0+z, (-3.0/2.0)) * numpy.sqrt(kT/10.0)*(1.0/h50))
+    """
 
-        return Rv
+    z = numpy.asarray(z, dtype=float)
+    deltaVz = DeltaVz(z)
+    Omega_Mz = OmegaMz(z)
+    deltaz = (deltaVz*OMEGA_M0)/(18.0*numpy.power(numpy.pi, 2)*Omega_Mz)
 
-    else:
-        raise Exception("cosmology is NOT flat.")
+    # The equation quoted in Arnaud, Aghanim & Neumann is for h50, so need
+    # to scale it
+    h50 = H0/50.0
+    Rv = (3.80*numpy.sqrt(betaT)*numpy.power(deltaz, -0.5) *
+        numpy.power(1.0+z, (-3.0/2.0)) *
+        numpy.sqrt(numpy.asarray(kT, dtype=float)/10.0)*(1.0/h50))
 
-#------------------------------------------------------------------------------
+    return Rv, deltaVz
 
+#------------------------------------------------------------------------------
@@ -1,7 +1,12 @@
 #!/usr/bin/env python
 """ Unit test for astCalc.py """
 
+import os
+import shutil
+import tempfile
 import unittest
+import numpy
+from scipy import integrate
 try:
     from astLib import astCalc
 except ImportError:
@@ -227,7 +232,7 @@ class KnownValues(unittest.TestCase):
         """ astlib.dVcdz should give known result with known input """
         for z, result in self.dVcdz:
             answer = astCalc.dVcdz(z)
-            self.assertAlmostEqual(result, answer)
+            self.assertAlmostEqual(result, answer, delta=1e-12 * result)
 
     def testdl2z(self):
         """ astCalc.dl2z should give known result with known input """
@@ -356,5 +361,198 @@ class sanity(unittest.TestCase):
         z = astCalc.tz2z(tz)
         self.assertAlmostEqual(1, z, places=5)
 
+class tables(unittest.TestCase):
+    def setUp(self):
+        astCalc.USE_TABLES = True
+
+    def tearDown(self):
+        astCalc.USE_TABLES = False
+        astCalc.OMEGA_M0 = 0.3
+        astCalc.OMEGA_L0 = 0.7
+        astCalc.H0 = 70.0
+
+    def testdl(self):
+        """ Tabulated dl should match the integrated values to 1E-9 """
+        for z, result in KnownValues.dl[1:]:
+            answer = astCalc.dl(z)
+            self.assertAlmostEqual(1.0, answer / result, places=9)
+
+    def testArray(self):
+        """ Tabulated functions should accept arrays """
+        z = numpy.array([z for z, result in KnownValues.da])
+        answer = astCalc.da(z)
+        for i, (z, result) in enumerate(KnownValues.da):
+            self.assertAlmostEqual(1.0, answer[i] / result, places=9)
+
+    def testRebuild(self):
+        """ Tables should follow changes to the cosmological parameters """
+        astCalc.dc(1.0)
+        astCalc.OMEGA_M0 = 0.25
+        astCalc.OMEGA_L0 = 0.6
+        astCalc.H0 = 100.0
+        answer = astCalc.dm(2.0)
+        astCalc.USE_TABLES = False
+        result = astCalc.dm(2.0)
+        self.assertAlmostEqual(1.0, answer / result, places=9)
+
+    def testLookback(self):
+        """ Tabulated tl should match the integrated values to 1E-9 """
+        astCalc.OMEGA_L0 = 0.6
+        z = numpy.array([0.1, 1.0, 5.0])
+        answer = astCalc.tl(z)
+        astCalc.USE_TABLES = False
+        for i in range(len(z)):
+            result = astCalc.tl(z[i])
+            self.assertAlmostEqual(1.0, answer[i] / result, places=9)
+
+    def testCache(self):
+        """ Tables should be saved to, and loaded from, the cache directory """
+        cacheDir = tempfile.mkdtemp()
+        try:
+            first = astCalc.Cosmology(OMEGA_L0=0.6, USE_TABLES=True,
+                TABLE_CACHE_DIR=cacheDir)
+            result = first.dc(2.0)
+            self.assertEqual(len(os.listdir(cacheDir)), 1)
+            second = astCalc.Cosmology(OMEGA_L0=0.6, USE_TABLES=True,
+                TABLE_CACHE_DIR=cacheDir)
+            self.assertEqual(second.dc(2.0), result)
+            self.assertTrue(isinstance(second._distanceTable.data,
+                numpy.memmap))
+            second.OMEGA_M0 = 0.25
+            second.dc(2.0)
+            self.assertEqual(len(os.listdir(cacheDir)), 2)
+            # Extended tables are rounded up, so that few are made
+            for z in numpy.linspace(21.0, 80.0, 20):
+                second.dc(z)
+            self.assertEqual(len(os.listdir(cacheDir)), 4)
+        finally:
+            shutil.rmtree(cacheDir)
+
+class cosmology(unittest.TestCase):
+    def testDefault(self):
+        """ Cosmology methods should match the module-level functions """
+        c = astCalc.Cosmology()
+        self.assertAlmostEqual(astCalc.dl(1), c.dl(1))
+        self.assertAlmostEqual(astCalc.tz(1), c.tz(1))
+        self.assertAlmostEqual(astCalc.DeltaVz(1), c.DeltaVz(1))
+
+    def testIndependent(self):
+        """ Cosmology objects should not share parameters or caches """
+        c1 = astCalc.Cosmology()
+        c2 = astCalc.Cosmology(OMEGA_M0=1.0, OMEGA_L0=0.0)
+        t1 = c1.t0()
+        self.assertNotAlmostEqual(t1, c2.t0())
+        self.assertAlmostEqual(t1, c1.t0())
+        self.assertAlmostEqual(astCalc.t0(), t1)
+
+    def testCache(self):
+        """ Cached values should follow changes to the parameters """
+        c = astCalc.Cosmology()
+        t1 = c.t0()
+        c.H0 = 2 * c.H0
+        self.assertAlmostEqual(t1 / 2.0, c.t0())
+
+    def testCurvedArray(self):
+        """ Curved cosmologies should accept arrays without USE_TABLES """
+        c = astCalc.Cosmology(OMEGA_M0=0.3, OMEGA_L0=0.6)
+        z = numpy.array([[0.1, 1.0], [2.0, 0.0]])
+        for name in ['dl', 'dm', 'dVcdz', 'tz']:
+            answer = getattr(c, name)(z)
+            self.assertEqual(answer.shape, (2, 2))
+            for i in range(2):
+                for j in range(2):
+                    self.assertAlmostEqual(answer[i, j],
+                        getattr(c, name)(z[i, j]))
+
+    def testDefaultNotModified(self):
+        """ Changing the module parameters should not alter instances """
+        c = astCalc._defaultCosmology()
+        self.assertTrue(astCalc._defaultCosmology() is c)
+        astCalc.H0 = 100.0
+        try:
+            self.assertEqual(c.H0, 70.0)
+            self.assertEqual(astCalc._defaultCosmology().H0, 100.0)
+        finally:
+            astCalc.H0 = 70.0
+
+class flat(unittest.TestCase):
+    def testClosedForm(self):
+        """ Closed-form expressions should match numerical integration """
+        flat = astCalc.Cosmology(OMEGA_M0=0.25, OMEGA_L0=0.75)
+        curved = astCalc.Cosmology(OMEGA_M0=0.25, OMEGA_L0=0.75 + 1e-9)
+        self.assertTrue(flat.isFlat())
+        self.assertFalse(curved.isFlat())
+        for z in [0.01, 0.5, 2.0, 10.0]:
+            self.assertAlmostEqual(1.0, flat.dc(z) / curved.dc(z), places=7)
+            self.assertAlmostEqual(1.0, flat.tl(z) / curved.tl(z), places=7)
+        self.assertAlmostEqual(1.0, flat.t0() / curved.t0(), places=7)
+
+    def testNearlyFlat(self):
+        """ All methods should agree on whether a cosmology is flat """
+        c = astCalc.Cosmology(OMEGA_M0=0.3, OMEGA_L0=0.7 + 1e-12)
+        self.assertTrue(c.isFlat())
+        self.assertEqual(c.dm(1.0), c.dc(1.0))
+        self.assertAlmostEqual(c.DeltaVz(1.0), astCalc.DeltaVz(1.0))
+
+    def testLowRedshift(self):
+        """ Closed-form expressions should stay accurate as z -> 0 """
+        for omegaM0, omegaL0 in [(0.3, 0.7), (1.0, 0.0)]:
+            flat = astCalc.Cosmology(OMEGA_M0=omegaM0, OMEGA_L0=omegaL0)
+            invEz = lambda z: 1.0 / numpy.sqrt(omegaM0*(1+z)**3 + omegaL0)
+            for z in [1e-8, 1e-5, 0.05]:
+                result = integrate.quad(invEz, 0.0, z)[0]
+                self.assertAlmostEqual(1.0, flat.dc(z) /
+                    (astCalc.C_LIGHT / flat.H0 * result), places=12)
+                result = integrate.quad(lambda z: invEz(z) / (1 + z), 0.0,
+                    z)[0]
+                self.assertAlmostEqual(1.0, flat._lookbackIntegral(z) /
+                    result, places=12)
+
+    def testArray(self):
+        """ Closed-form expressions should accept arrays """
+        z = numpy.array([z for z, result in KnownValues.tl])
+        answer = astCalc.tl(z)
+        for i, (z, result) in enumerate(KnownValues.tl):
+            self.assertAlmostEqual(result, answer[i])
+
+class clusters(unittest.TestCase):
+    def testArray(self):
+        """ Cluster scaling relations should accept arrays """
+        z = numpy.array([z for z, result in KnownValues.DeltaVz])
+        answer = astCalc.DeltaVz(z)
+        for i, (z, result) in enumerate(KnownValues.DeltaVz):
+            self.assertAlmostEqual(result, answer[i])
+
+    def testBroadcast(self):
+        """ virialXRayClusters should broadcast over samples """
+        kT = numpy.array([[2.0, 5.0, 8.0], [3.0, 6.0, 9.0]])
+        z = numpy.array([0.1, 0.5, 1.0])
+        Rv, deltaVz = astCalc.virialXRayClusters(kT, z, 1.05)
+        self.assertEqual(Rv.shape, (2, 3))
+        self.assertEqual(deltaVz.shape, (3,))
+        for i in range(2):
+            for j in range(3):
+                answer = astCalc.RVirialXRayCluster(kT[i, j], z[j], 1.05)
+                self.assertAlmostEqual(Rv[i, j], answer)
+                self.assertAlmostEqual(deltaVz[j], astCalc.DeltaVz(z[j]))
+
+class jit(unittest.TestCase):
+    def setUp(self):
+        self.useJIT = astCalc.USE_JIT
+
+    def tearDown(self):
+        astCalc.USE_JIT = self.useJIT
+
+    def testIntegrands(self):
+        """ Compiled and pure-Python integrands should agree """
+        cosmology = astCalc.Cosmology(OMEGA_M0=0.3, OMEGA_L0=0.6)
+        results = []
+        for useJIT in [False, True]:
+            astCalc.USE_JIT = useJIT
+            results.append([cosmology.dc(1.5), cosmology.tl(1.5),
+                cosmology.t0()])
+        for a, b in zip(results[0], results[1]):
+            self.assertAlmostEqual(a, b, places=10)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 """ Unit test for astCoords.py """
 
+import os
+import tempfile
 import unittest
+import numpy
 try:
     from astLib import astCoords
 except ImportError:
@@ -77,3 +80,426 @@ class Sanity(unittest.TestCase):
         decimal = astCoords.dms2decimal(dms_orig, ':')
         dms_new = astCoords.decimal2dms(decimal, ':')
         self.assertEqual(dms_new, dms_orig)
+
+class Vectorised(unittest.TestCase):
+    hms = ['00:00:00', '12:34:56.78', '23:59:59.999', '05:06', '187.5']
+    dms = ['-00:30:00', '+00:30:00', '-12:34:56.7', '12:34:56.7', '-0:30',
+        '1e1:30:00', '-45.25']
+
+    def testhms2decimal(self):
+        """ Array hms2decimal should match the scalar version """
+        answer = astCoords.hms2decimal(numpy.array(self.hms), ':')
+        for i in range(len(self.hms)):
+            self.assertEqual(answer[i], astCoords.hms2decimal(self.hms[i],
+                ':'))
+
+    def testdms2decimal(self):
+        """ Array dms2decimal should match the scalar version, for bytes too """
+        for strings in [self.dms, numpy.array(self.dms).astype('S')]:
+            answer = astCoords.dms2decimal(strings, ':')
+            for i in range(len(self.dms)):
+                self.assertEqual(answer[i],
+                    astCoords.dms2decimal(self.dms[i], ':'))
+        self.assertEqual(answer[0], -0.5)
+
+    def testLongFields(self):
+        """ Fields with more than 15 digits should match the scalar version """
+        strings = ['10:20:30.1234567890123456', '0.1234567890123456789:52',
+            '-01:02:03.45678901234567890123', '01:02:03']
+        for parser in [astCoords.hms2decimal, astCoords.dms2decimal]:
+            answer = parser(strings, ':')
+            for i in range(len(strings)):
+                self.assertEqual(answer[i], parser(strings[i], ':'))
+
+    def testShape(self):
+        """ Array parsers should keep the input shape """
+        answer = astCoords.hms2decimal([['12 00 00', '6 00'],
+            ['0 0 0', '1']], '')
+        self.assertEqual(answer.tolist(), [[180.0, 90.0], [0.0, 1.0]])
+
+    def testBadString(self):
+        """ Array parsers should raise ValueError for bad strings """
+        self.assertRaises(ValueError, astCoords.hms2decimal,
+            ['12:00:00', '12:x0:00'], ':')
+        self.assertRaises(ValueError, astCoords.dms2decimal,
+            ['12:00:00', ''], ':')
+        # Strings that the scalar parsers also reject
+        self.assertRaises(ValueError, astCoords.hms2decimal,
+            ['12:00:00', '10 30 00'], ':')
+        self.assertRaises(ValueError, astCoords.dms2decimal,
+            ['12:00:00', '10::30'], ':')
+        self.assertRaises(ValueError, astCoords.hms2decimal,
+            ['12:00:00', '10:3 0:00'], ':')
+        self.assertRaises(ValueError, astCoords.dms2decimal,
+            ['12 00 00', '10  30 00'], ' ')
+        self.assertRaises(ValueError, astCoords.hms2decimal,
+            ['12:00:00', u'\uff11\uff10:30:00'], ':')
+        # ... and strings that they accept
+        self.assertEqual(list(astCoords.dms2decimal([' 10 : 30 : 00 ',
+            '10:30:00:x'], ':')), [10.5, 10.5])
+
+    def testdecimal2hms(self):
+        """ Array decimal2hms should match the scalar version """
+        RADeg = numpy.concatenate([numpy.random.uniform(0, 360, 2000),
+            numpy.round(numpy.random.uniform(0, 360, 2000) * 240) / 240,
+            [0.0, 187.5, 359.9999999, 1e-9, 0.0015, -3.0, 1500.0]])
+        answer = astCoords.decimal2hms(RADeg, ':')
+        for i in range(len(RADeg)):
+            self.assertEqual(answer[i], astCoords.decimal2hms(RADeg[i], ':'))
+
+    def testdecimal2dms(self):
+        """ Array decimal2dms should match the scalar version """
+        decDeg = numpy.concatenate([numpy.random.uniform(-90, 90, 2000),
+            numpy.round(numpy.random.uniform(-90, 90, 2000) * 60) / 60,
+            [0.0, -0.5, 0.5, 1e-9, -1e-9, 89.99999999, -9.999999999, -150.0]])
+        answer = astCoords.decimal2dms(decDeg, ':')
+        for i in range(len(decDeg)):
+            self.assertEqual(answer[i], astCoords.decimal2dms(decDeg[i], ':'))
+
+    def testPrecision(self):
+        """ Rounded strings should carry into minutes and degrees """
+        self.assertEqual(astCoords.decimal2hms(187.5, ':', precision=2),
+            '12:30:00.00')
+        self.assertEqual(astCoords.decimal2hms([359.99999999, 0.1], ' ',
+            precision=1).tolist(), ['00 00 00.0', '00 00 24.0'])
+        self.assertEqual(astCoords.decimal2dms([-0.5, 89.9999999], ':',
+            precision=0).tolist(), ['-00:30:00', '+90:00:00'])
+        self.assertRaises(ValueError, astCoords.decimal2dms,
+            [0.0, numpy.nan], ':')
+
+    def testConvertCoords(self):
+        """ Array convertCoords should match the wcscon version """
+        RADeg = numpy.append(numpy.random.uniform(0, 360, 200), [0.0, 0.0])
+        decDeg = numpy.append(numpy.random.uniform(-90, 90, 200), [90.0, 0.0])
+        systems = ['J2000', 'B1950', 'GALACTIC']
+        for inputSystem in systems:
+            for outputSystem in systems:
+                for epoch in [0.0, 1980.0]:
+                    x, y = astCoords.convertCoords(inputSystem, outputSystem,
+                        RADeg, decDeg, epoch)
+                    for i in range(len(RADeg)):
+                        answer = astCoords.convertCoords(inputSystem,
+                            outputSystem, RADeg[i], decDeg[i], epoch)
+                        dx = (x[i] - answer[0] + 180.0) % 360.0 - 180.0
+                        self.assertAlmostEqual(dx, 0.0, places=12)
+                        self.assertAlmostEqual(y[i], answer[1], places=12)
+
+class CrossMatch(unittest.TestCase):
+    # Pairs across RA = 0/360 and around the north pole
+    RADeg1 = numpy.array([359.9999, 10.0, 45.0, 180.0, 300.0])
+    decDeg1 = numpy.array([0.0, 89.9999, -30.0, 10.0, 60.0])
+    RADeg2 = numpy.array([0.0001, 190.0, 45.0, 45.0, 180.0002, 200.0])
+    decDeg2 = numpy.array([0.0, 89.9999, -30.0002, -30.0004, 10.0, -60.0])
+
+    def testNearest(self):
+        """ crossMatch should find the nearest match within the radius """
+        index1, index2, sepDeg = astCoords.crossMatch(self.RADeg1,
+            self.decDeg1, self.RADeg2, self.decDeg2, 0.001)
+        self.assertEqual(index1.tolist(), [0, 1, 2, 3])
+        self.assertEqual(index2.tolist(), [0, 1, 2, 4])
+        for i, j, sep in zip(index1, index2, sepDeg):
+            self.assertAlmostEqual(sep, astCoords.calcAngSepDeg(
+                self.RADeg1[i], self.decDeg1[i], self.RADeg2[j],
+                self.decDeg2[j]), 10)
+
+    def testAll(self):
+        """ crossMatch should find every pair within the radius """
+        index1, index2, sepDeg = astCoords.crossMatch(self.RADeg1,
+            self.decDeg1, self.RADeg2, self.decDeg2, 0.001, nearest=False)
+        self.assertEqual(list(zip(index1, index2)),
+            [(0, 0), (1, 1), (2, 2), (2, 3), (3, 4)])
+        self.assertTrue(sepDeg[3] > sepDeg[2])
+
+class SkyIndexSearch(unittest.TestCase):
+
+    def setUp(self):
+        self.RADeg = numpy.random.uniform(0, 360, 20000)
+        self.decDeg = numpy.degrees(numpy.arcsin(numpy.random.uniform(-1, 1,
+            20000)))
+        self.skyIndex = astCoords.SkyIndex(self.RADeg, self.decDeg, 1.0)
+
+    def testCone(self):
+        """ Cone searches should match a full scan, at the poles and RA=0 """
+        for RADeg, decDeg in [(0.1, 0.0), (359.9, -30.0), (20.0, 89.5),
+                (200.0, -90.0)]:
+            found = self.skyIndex.coneSearch(RADeg, decDeg, 3.0)
+            x, y, z = astCoords.eq2cart(self.RADeg, self.decDeg, 1.0)
+            x0, y0, z0 = astCoords.eq2cart(RADeg, decDeg, 1.0)
+            sepDeg = numpy.degrees(numpy.arccos(x * x0 + y * y0 + z * z0))
+            answer = numpy.where(sepDeg <= 3.0)[0]
+            self.assertEqual(found.tolist(), answer.tolist())
+
+    def testBox(self):
+        """ Box searches should handle boxes crossing RA=0 """
+        found = self.skyIndex.boxSearch(355.0, 5.0, -5.0, 5.0)
+        answer = numpy.where(((self.RADeg >= 355) | (self.RADeg <= 5)) &
+            (abs(self.decDeg) <= 5))[0]
+        self.assertEqual(found.tolist(), answer.tolist())
+
+    def testPolygon(self):
+        """ A square polygon should contain the same objects as its box """
+        found = self.skyIndex.polygonSearch([350.0, 10.0, 10.0, 350.0],
+            [-10.0, -10.0, 10.0, 10.0])
+        box = self.skyIndex.boxSearch(350.0, 10.0, -10.0, 10.0)
+        # Edges are great circles, which bulge away from the equator
+        self.assertTrue(set(box).issubset(set(found)))
+        self.assertTrue(len(found) - len(box) < 0.05 * len(box))
+
+    def testSave(self):
+        """ A saved index should give the same results when reloaded """
+        fileName = os.path.join(tempfile.mkdtemp(), 'index.npz')
+        self.skyIndex.save(fileName)
+        skyIndex = astCoords.loadSkyIndex(fileName)
+        os.remove(fileName)
+        self.assertEqual(skyIndex.coneSearch(45.0, 45.0, 5.0).tolist(),
+            self.skyIndex.coneSearch(45.0, 45.0, 5.0).tolist())
+
+class AngularSeparation(unittest.TestCase):
+
+    def testLarge(self):
+        """ calcAngSepDeg should be exact beyond 90 degrees """
+        self.assertAlmostEqual(astCoords.calcAngSepDeg(0.0, 0.0, 180.0, 0.0),
+            180.0, 12)
+        self.assertAlmostEqual(astCoords.calcAngSepDeg(10.0, 60.0, 190.0,
+            0.0), 120.0, 12)
+
+    def testBroadcast(self):
+        """ calcAngSepDeg should broadcast, and accept float32 and strings """
+        answer = astCoords.calcAngSepDeg(numpy.float32(10.0),
+            numpy.array([[0.0], [1.0]]), [10.0, 10.0, 10.0], [0.0, 1.0, 2.0])
+        self.assertEqual(answer.shape, (2, 3))
+        self.assertAlmostEqual(answer[1, 2], 1.0, 10)
+        self.assertAlmostEqual(astCoords.calcAngSepDeg('12:00:00',
+            '+00:30:00', 180.0, 0.0), 0.5, 12)
+
+    def testBlocks(self):
+        """ Blocks of the separation matrix should match calcAngSepDeg """
+        RADeg1, decDeg1 = numpy.random.uniform(0, 90, (2, 500))
+        RADeg2, decDeg2 = numpy.random.uniform(0, 90, (2, 300))
+        answer = astCoords.calcAngSepDeg(RADeg1[:, numpy.newaxis],
+            decDeg1[:, numpy.newaxis], RADeg2, decDeg2)
+        stops = []
+        for start, stop, sepDeg in astCoords.calcAngSepDegBlocks(RADeg1,
+                decDeg1, RADeg2, decDeg2, maxBytes=500000):
+            self.assertTrue(numpy.array_equal(sepDeg, answer[start:stop]))
+            stops.append(stop)
+        self.assertTrue(len(stops) > 1)
+        self.assertEqual(stops[-1], 500)
+
+class SearchBox(unittest.TestCase):
+
+    def testEdges(self):
+        """ Box edges should be at the given radius from the centre """
+        RAMin, RAMax, decMin, decMax = astCoords.calcRADecSearchBox(30.0,
+            60.0, 5.0)
+        self.assertAlmostEqual(decMax - decMin, 10.0, 12)
+        # The circle touches the RA edges at dec. = arcsin(sin(dec)/cos(r))
+        decTouch = numpy.degrees(numpy.arcsin(numpy.sin(numpy.radians(60.0)) /
+            numpy.cos(numpy.radians(5.0))))
+        self.assertAlmostEqual(astCoords.calcAngSepDeg(30.0, 60.0, RAMax,
+            decTouch), 5.0, 10)
+        self.assertAlmostEqual(30.0 - RAMin, RAMax - 30.0, 10)
+
+    def testWrap(self):
+        """ Boxes should wrap at RA = 0 and span all RAs at the poles """
+        RAMin, RAMax, decMin, decMax = astCoords.calcRADecSearchBox(0.1, 0.0,
+            0.5)
+        self.assertTrue(RAMin > RAMax)
+        self.assertAlmostEqual(RAMin, 359.6, 10)
+        self.assertEqual(astCoords.calcRADecSearchBox(10.0, -89.8, 0.5),
+            [0.0, 360.0, -90.0, -89.3])
+
+    def testArray(self):
+        """ Array input should match calculating each box in turn """
+        RADeg = numpy.random.uniform(0, 360, 100)
+        decDeg = numpy.random.uniform(-90, 90, 100)
+        boxes = astCoords.calcRADecSearchBox(RADeg, decDeg, 2.0)
+        for i in range(100):
+            box = astCoords.calcRADecSearchBox(RADeg[i], decDeg[i], 2.0)
+            self.assertEqual(box, [b[i] for b in boxes])
+
+class Projections(unittest.TestCase):
+
+    def setUp(self):
+        self.lon = numpy.random.uniform(-numpy.pi, numpy.pi, 1000)
+        self.lat = numpy.arcsin(numpy.random.uniform(-1, 1, 1000))
+
+    def testAitoff(self):
+        """ Array aitoff should match the scalar version """
+        x, y = astCoords.aitoff(self.lon, self.lat)
+        for i in range(0, 1000, 50):
+            answer = astCoords.aitoff(self.lon[i], self.lat[i])
+            self.assertAlmostEqual(x[i], answer[0], 12)
+            self.assertAlmostEqual(y[i], answer[1], 12)
+        self.assertEqual(astCoords.aitoff(0.0, 0.0), (0.0, 0.0))
+
+    def testShiftRADec(self):
+        """ Array shiftRADec should wrap RA like the scalar version """
+        RADeg, decDeg = astCoords.shiftRADec(numpy.array([359.9, 0.1]), 0.0,
+            [720.0, -720.0], 36.0)
+        self.assertAlmostEqual(RADeg[0], 0.1, 10)
+        self.assertAlmostEqual(RADeg[1], 359.9, 10)
+        self.assertAlmostEqual(decDeg, 0.01, 12)
+
+    def testInverses(self):
+        """ Hammer and Mollweide projections should invert exactly """
+        for project, invert in [(astCoords.hammer, astCoords.hammerInverse),
+                (astCoords.mollweide, astCoords.mollweideInverse)]:
+            x, y = project(self.lon, self.lat)
+            self.assertTrue(numpy.all((x / 2.0) ** 2 + y ** 2 <= 2.0 + 1e-12))
+            lon, lat = invert(x, y)
+            self.assertTrue(numpy.allclose(lon, self.lon, rtol=0, atol=1e-9))
+            self.assertTrue(numpy.allclose(lat, self.lat, rtol=0, atol=1e-9))
+            self.assertTrue(numpy.all(numpy.isnan(invert(2.9, 0.0))))
+
+    def testMollweide(self):
+        """ Mollweide edges and poles should be at known positions """
+        x, y = astCoords.mollweide([numpy.pi, 0.0], [0.0, numpy.pi / 2])
+        self.assertAlmostEqual(x[0], 2.0 * numpy.sqrt(2.0), 12)
+        self.assertAlmostEqual(y[1], numpy.sqrt(2.0), 12)
+
+class Precession(unittest.TestCase):
+
+    def testWCSTools(self):
+        """ precessCoords should match WCSTools for mixed epochs """
+        from PyWCSTools import wcscon
+        RADeg = numpy.random.uniform(0, 360, 200)
+        decDeg = numpy.random.uniform(-89, 89, 200)
+        epoch = numpy.random.choice([1975.0, 2000.0, 2015.5], 200)
+        for system in ['J2000', 'B1950']:
+            RAOut, decOut = astCoords.precessCoords(RADeg, decDeg, epoch,
+                2010.0, system=system)
+            code = wcscon.wcscsys(system)
+            for i in range(200):
+                answer = wcscon.wcscon(code, code, epoch[i], 2010.0,
+                    RADeg[i], decDeg[i], 0)
+                self.assertAlmostEqual(astCoords.calcAngSepDeg(RAOut[i],
+                    decOut[i], answer[0], answer[1]), 0.0, 10)
+
+    def testProperMotion(self):
+        """ Proper motion should move positions by pm * time """
+        still = astCoords.precessCoords([10.0], [60.0], 2000.0, 2010.0)
+        moved = astCoords.precessCoords([10.0], [60.0], 2000.0, 2010.0,
+            pmRA=[300.0], pmDec=[-400.0])
+        self.assertAlmostEqual(3600.0 * astCoords.calcAngSepDeg(still[0][0],
+            still[1][0], moved[0][0], moved[1][0]), 5.0, 8)
+
+    def testScalar(self):
+        """ Scalar input should give floats """
+        RAOut, decOut = astCoords.precessCoords(10.0, 60.0, 1990.0, 2010.0)
+        self.assertTrue(isinstance(RAOut, float))
+        self.assertTrue(isinstance(decOut, float))
+        answer = astCoords.precessCoords([10.0], [60.0], 1990.0, 2010.0)
+        self.assertEqual((RAOut, decOut), (answer[0][0], answer[1][0]))
+
+class PairCounts(unittest.TestCase):
+
+    def setUp(self):
+        self.RADeg1, self.decDeg1 = numpy.random.uniform(0, 10, (2, 300))
+        self.RADeg2, self.decDeg2 = numpy.random.uniform(0, 10, (2, 200))
+        self.weights1 = numpy.random.uniform(0.5, 2, 300)
+        self.regions1 = (self.RADeg1 // 2.5).astype(int)
+        self.edges = numpy.logspace(-1, 0.5, 6)
+        self.sepDeg = astCoords.calcAngSepDeg(
+            self.RADeg1[:, numpy.newaxis], self.decDeg1[:, numpy.newaxis],
+            self.RADeg1, self.decDeg1)
+
+    def testAuto(self):
+        """ Weighted pair counts within a catalogue should match a full scan """
+        counts = astCoords.angularPairCounts(self.RADeg1, self.decDeg1,
+            self.edges, weights1=self.weights1, chunkSize=70)
+        pairs = numpy.triu_indices(300, 1)
+        weights = self.weights1[:, numpy.newaxis] * self.weights1
+        answer = numpy.histogram(self.sepDeg[pairs], self.edges,
+            weights=weights[pairs])[0]
+        self.assertTrue(numpy.allclose(counts, answer))
+
+    def testCross(self):
+        """ Threaded counts between catalogues should match a full scan """
+        counts = astCoords.angularPairCounts(self.RADeg1, self.decDeg1,
+            self.edges, self.RADeg2, self.decDeg2, nThreads=3, chunkSize=70)
+        sepDeg = astCoords.calcAngSepDeg(self.RADeg1[:, numpy.newaxis],
+            self.decDeg1[:, numpy.newaxis], self.RADeg2, self.decDeg2)
+        answer = numpy.histogram(sepDeg, self.edges)[0]
+        self.assertEqual(counts.tolist(), answer.tolist())
+
+    def testJackknife(self):
+        """ Jackknife counts should leave out each region in turn """
+        counts, jackknifeCounts, regions = astCoords.angularPairCounts(
+            self.RADeg1, self.decDeg1, self.edges, regions1=self.regions1)
+        self.assertEqual(regions.tolist(), [0, 1, 2, 3])
+        for i in range(4):
+            keep = numpy.where(self.regions1 != regions[i])[0]
+            sepDeg = self.sepDeg[keep][:, keep]
+            answer = numpy.histogram(sepDeg[numpy.triu_indices(len(keep),
+                1)], self.edges)[0]
+            self.assertEqual(jackknifeCounts[i].tolist(), answer.tolist())
+
+class FriendsOfFriends(unittest.TestCase):
+    # A chain of three objects 0.8 arcmin apart across RA = 0, an object
+    # 2 arcmin further on, and a pair near the pole
+    RADeg = numpy.array([359.99, 0.00333333, 0.01666667, 0.05, 0.0, 180.0])
+    decDeg = numpy.array([0.0, 0.0, 0.0, 0.0, 89.99, 89.995])
+    redshifts = numpy.array([0.1, 0.11, 0.12, 0.1, 0.3, 0.5])
+
+    def testAngular(self):
+        """ Chains of friends should form one group """
+        labels = astCoords.friendsOfFriends(self.RADeg, self.decDeg,
+            1.0 / 60.0)
+        self.assertEqual(labels.tolist(), [0, 0, 0, 1, 2, 2])
+
+    def testRedshift(self):
+        """ Objects outside the redshift window should not be linked """
+        labels = astCoords.friendsOfFriends(self.RADeg, self.decDeg,
+            1.0 / 60.0, redshifts=self.redshifts, deltaZ=0.015)
+        self.assertEqual(labels.tolist(), [0, 0, 0, 1, 2, 3])
+
+    def test3D(self):
+        """ With distances, objects should be linked in 3D """
+        distances = 1000.0 * numpy.array([1.0, 1.0, 1.1, 1.0, 1.0, 1.0])
+        labels = astCoords.friendsOfFriends(self.RADeg, self.decDeg, 0.5,
+            distances=distances)
+        self.assertEqual(labels.tolist(), [0, 0, 1, 2, 3, 3])
+
+class NearestNeighbours(unittest.TestCase):
+
+    def setUp(self):
+        self.RADeg, self.decDeg = numpy.random.uniform(0, 5, (2, 400))
+        self.sepDeg = astCoords.calcAngSepDeg(self.RADeg[:, numpy.newaxis],
+            self.decDeg[:, numpy.newaxis], self.RADeg, self.decDeg)
+        numpy.fill_diagonal(self.sepDeg, numpy.inf)
+
+    def testNeighbours(self):
+        """ Neighbours should be the nearest objects, other than itself """
+        sepDeg, indices = astCoords.nearestNeighbours(self.RADeg,
+            self.decDeg, 4)
+        self.assertTrue(numpy.allclose(sepDeg,
+            numpy.sort(self.sepDeg, axis=1)[:, :4], rtol=0, atol=1e-12))
+        self.assertTrue(numpy.all(indices[:, 0] ==
+            numpy.argmin(self.sepDeg, axis=1)))
+
+    def testPhysical(self):
+        """ Densities with redshifts should use the angular diameter
+        distance """
+        from astLib import astCalc
+        redshifts = numpy.random.uniform(0.1, 1.0, 400)
+        density = astCoords.nearestNeighbourDensity(self.RADeg,
+            self.decDeg, 5, redshifts=redshifts)
+        radius = (numpy.radians(numpy.sort(self.sepDeg, axis=1)[:, 4]) *
+            astCalc.da(redshifts))
+        self.assertTrue(numpy.allclose(density, 5 / (numpy.pi * radius ** 2)))
+
+    def testPhysicalCurved(self):
+        """ Densities with redshifts should work for curved cosmologies """
+        from astLib import astCalc
+        redshifts = numpy.linspace(0.1, 1.0, 400)
+        astCalc.OMEGA_L0 = 0.6
+        try:
+            density = astCoords.nearestNeighbourDensity(self.RADeg,
+                self.decDeg, 5, redshifts=redshifts)
+            radius = (numpy.radians(numpy.sort(self.sepDeg, axis=1)[:, 4]) *
+                numpy.array([astCalc.da(z) for z in redshifts]))
+        finally:
+            astCalc.OMEGA_L0 = 0.7
+        self.assertTrue(numpy.allclose(density, 5 / (numpy.pi * radius ** 2),
+            rtol=1e-8, atol=0))
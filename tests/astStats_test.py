@@ -104,6 +104,35 @@ class KnownValues(unittest.TestCase):
                             result['biweightScale'])
             self.assertListEqual(answer['dataList'],
                             result['dataList'])
+
+class jit(unittest.TestCase):
+    datalist = [(i * 37) % 101 + 0.5 * (i % 3) for i in range(500)]
+    weights = [0.1 * (i % 7) for i in range(500)]
+
+    def setUp(self):
+        self.useJIT = astStats.USE_JIT
+
+    def tearDown(self):
+        astStats.USE_JIT = self.useJIT
+
+    def testKernels(self):
+        """ Compiled and pure-Python kernels should give the same results """
+        results = []
+        for useJIT in [False, True]:
+            astStats.USE_JIT = useJIT
+            results.append([astStats.biweightLocation(self.datalist),
+                astStats.biweightScale(self.datalist),
+                astStats.binner(self.datalist, 0, 100, 12),
+                astStats.weightedBinner(self.datalist, self.weights, 0, 100,
+                    12),
+                astStats.cumulativeBinner(self.datalist, 0, 100, 12)])
+        self.assertEqual(results[0][2], results[1][2])
+        self.assertEqual(results[0][4], results[1][4])
+        self.assertAlmostEqual(results[0][0], results[1][0], places=10)
+        self.assertAlmostEqual(results[0][1], results[1][1], places=10)
+        for a, b in zip(results[0][3], results[1][3]):
+            self.assertAlmostEqual(a[1], b[1], places=10)
+
 if __name__ == "__main__":
     unittest.main()
 
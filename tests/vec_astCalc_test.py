@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+""" Unit test for vec_astCalc.py """
+
+import unittest
+import numpy
+try:
+    from astLib import vec_astCalc
+except ImportError:
+    print('Failed to import vec_astCalc. Properly installed?')
+
+class KnownValues(unittest.TestCase):
+    z = numpy.array([0., 1., 2., 3., 4., 5., 6., 7., 8., 9.])
+
+    dl = numpy.array([0.0, 6612.2319979526665, 15550.344054914269,
+        25440.341543071634, 35876.65177919497, 46684.519634690674,
+        57768.4047652542, 69068.60070419929, 80544.56794980433,
+        92167.18110251875])
+
+    dc = numpy.array([0.0, 3306.1159989763332, 5183.448018304756,
+        6360.0853857679085, 7175.3303558389935, 7780.753272448446,
+        8252.629252179171, 8633.57508802491, 8949.396438867148,
+        9216.718110251875])
+
+    tl = numpy.array([0.0, 7.690807770237435, 10.20779990292559,
+        11.318357734246861, 11.912986798684514, 12.273081995586207,
+        12.510106985762318, 12.675741669812332, 12.79680613047769,
+        12.888439847755699])
+
+    def testdl(self):
+        """ vec_astCalc.dl should give known result with known input """
+        answer = vec_astCalc.dl(self.z)
+        for result, value in zip(self.dl, answer):
+            self.assertAlmostEqual(result, value, places=6)
+
+    def testdc(self):
+        """ vec_astCalc.dc should give known result with known input """
+        answer = vec_astCalc.dc(self.z)
+        for result, value in zip(self.dc, answer):
+            self.assertAlmostEqual(result, value, places=6)
+
+    def testtl(self):
+        """ vec_astCalc.tl should give known result with known input """
+        answer = vec_astCalc.tl(self.z)
+        for result, value in zip(self.tl, answer):
+            self.assertAlmostEqual(result, value, places=6)
+
+class sanity(unittest.TestCase):
+    def testOrder(self):
+        """ Results should not depend on the order of the input redshifts """
+        z = numpy.random.RandomState(1).uniform(0, 5, 1000)
+        order = numpy.argsort(z)
+        forward = vec_astCalc.dm(z[order])
+        self.assertTrue(numpy.all(numpy.diff(forward) >= 0))
+        self.assertTrue(numpy.allclose(forward, vec_astCalc.dm(z)[order],
+            rtol=0, atol=1e-8))
+
+    def testShape(self):
+        """ Output should have the same shape as the input """
+        z = numpy.ones((3, 4))
+        self.assertEqual(vec_astCalc.dc(z).shape, (3, 4))
+        self.assertTrue(isinstance(vec_astCalc.dc(1.0), float))
+
+    def testInverse(self):
+        """ Inverse functions should recover the input redshifts """
+        z = numpy.random.RandomState(2).uniform(0, 8, 1000)
+        self.assertTrue(numpy.allclose(vec_astCalc.dl2z(vec_astCalc.dl(z)),
+            z, rtol=0, atol=1e-8))
+        self.assertTrue(numpy.allclose(vec_astCalc.dc2z(vec_astCalc.dc(z)),
+            z, rtol=0, atol=1e-8))
+        self.assertTrue(numpy.allclose(vec_astCalc.tl2z(vec_astCalc.tl(z)),
+            z, rtol=0, atol=1e-8))
+        self.assertTrue(numpy.allclose(vec_astCalc.tz2z(vec_astCalc.tz(z)),
+            z, rtol=0, atol=1e-8))
+        self.assertTrue(numpy.allclose(vec_astCalc.tz2z([5.0, 10.0]),
+            [vec_astCalc.tz2z(5.0), vec_astCalc.tz2z(10.0)]))
+
+    def testSweep(self):
+        """ sweep should match the module functions for each cosmology """
+        z = numpy.linspace(0.1, 3, 20)
+        omegaM0 = numpy.array([0.3, 0.25, 0.3])
+        omegaL0 = numpy.array([0.7, 0.6, 0.7])
+        hubble0 = numpy.array([70.0, 72.0, 100.0])
+        answer = vec_astCalc.sweep(z, omegaM0, omegaL0, hubble0, 'da')
+        self.assertEqual(answer.shape, (3, 20))
+        self.assertTrue(numpy.array_equal(answer, vec_astCalc.sweep(z,
+            omegaM0, omegaL0, hubble0, 'da', processes=2)))
+        try:
+            for i in range(3):
+                vec_astCalc.OMEGA_M0 = omegaM0[i]
+                vec_astCalc.OMEGA_L0 = omegaL0[i]
+                vec_astCalc.H0 = hubble0[i]
+                self.assertTrue(numpy.allclose(answer[i], vec_astCalc.da(z),
+                    rtol=1e-12, atol=0))
+        finally:
+            vec_astCalc.OMEGA_M0 = 0.3
+            vec_astCalc.OMEGA_L0 = 0.7
+            vec_astCalc.H0 = 70.0
+
+    def testVcBins(self):
+        """ Bin volumes should match the integral of dVcdz """
+        edges = numpy.array([0.1, 0.5, 1.0, 3.0])
+        answer = vec_astCalc.VcBins(edges, areaDeg2=100.0)
+        z = numpy.linspace(0.1, 3.0, 29001)
+        dVdz = 4*numpy.pi*vec_astCalc.dm(z)**2/vec_astCalc._Ez(z)
+        dVdz = dVdz*vec_astCalc.C_LIGHT/vec_astCalc.H0
+        volume = numpy.concatenate([[0],
+            numpy.cumsum(0.5*(dVdz[1:] + dVdz[:-1])*numpy.diff(z))])
+        result = numpy.diff(numpy.interp(edges, z, volume))
+        result = result*100.0/(4*numpy.pi*numpy.degrees(1.0)**2)
+        self.assertTrue(numpy.allclose(answer, result, rtol=1e-6, atol=0))
+
+    def testGauss(self):
+        """ Gauss-Legendre engine should agree with the cumulative one """
+        z = numpy.array([1e-6, 1e-3, 0.1, 1.0, 5.0, 20.0])
+        cumulative = [vec_astCalc.dc(z), vec_astCalc.tl(z), vec_astCalc.t0()]
+        try:
+            vec_astCalc.INTEGRATION_METHOD = 'gauss'
+            gauss = [vec_astCalc.dc(z), vec_astCalc.tl(z), vec_astCalc.t0()]
+            self.assertTrue(numpy.array_equal(gauss[0], vec_astCalc.dc(z,
+                tolerance=vec_astCalc.GAUSS_TOLERANCE)))
+            self.assertTrue(numpy.allclose(gauss[0], vec_astCalc.dc(z,
+                tolerance=1e-4), rtol=1e-4, atol=0))
+        finally:
+            vec_astCalc.INTEGRATION_METHOD = 'cumulative'
+        for a, b in zip(cumulative, gauss):
+            self.assertTrue(numpy.allclose(a, b, rtol=1e-10, atol=0))
+
+    def testStream(self):
+        """ Streamed chunks should match the whole-array functions """
+        z = numpy.linspace(0.01, 3.0, 1000)[::-1]
+        out = numpy.empty(z.shape)
+        chunks = list(vec_astCalc.stream(z, ['da', 'mu'], out=[None, out],
+            chunkSize=300))
+        self.assertEqual(len(chunks), 4)
+        da = numpy.concatenate([chunk[0] for chunk in chunks])
+        self.assertTrue(numpy.allclose(da, vec_astCalc.da(z), rtol=1e-12))
+        self.assertTrue(numpy.allclose(out, vec_astCalc.distanceModulus(z),
+            rtol=1e-12))
+        dl = numpy.concatenate(list(vec_astCalc.stream(iter([z[:10],
+            z[10:]]))))
+        self.assertTrue(numpy.allclose(dl, vec_astCalc.dl(z), rtol=1e-12))
+
+    def testCatalogue(self):
+        """ Catalogue columns should match the individual functions """
+        catalogue = numpy.zeros(3, dtype=[('z', float), ('appMag', float)])
+        catalogue['z'] = [0.1, 0.5, 1.0]
+        catalogue['appMag'] = [18.0, 20.0, 22.0]
+        columns = vec_astCalc.catalogueQuantities(catalogue,
+            angSizeArcsec=[3600.0, 1.0, 1.0], flux=[1.0, 1.0, 1.0])
+        da = vec_astCalc.da(catalogue['z'])
+        dl = vec_astCalc.dl(catalogue['z'])
+        self.assertTrue(numpy.allclose(columns['da'], da, rtol=1e-12))
+        self.assertTrue(numpy.allclose(columns['absMag'],
+            vec_astCalc.absMag(catalogue['appMag'], dl), rtol=1e-12))
+        self.assertAlmostEqual(columns['sizeKpc'][0],
+            numpy.radians(1.0)*da[0]*1000.0, places=6)
+        self.assertTrue(numpy.allclose(columns['luminosity'],
+            4*numpy.pi*(dl*3.0857e24)**2, rtol=1e-12))
+
+class badinput(unittest.TestCase):
+    def testNegative(self):
+        """ Inverse functions should fail with negative input """
+        self.assertRaises(ValueError, vec_astCalc.dl2z, -1)
+        self.assertRaises(ValueError, vec_astCalc.dc2z, -1)
+        self.assertRaises(ValueError, vec_astCalc.tl2z, -1)
+        self.assertRaises(ValueError, vec_astCalc.tz2z, -1)
+
+    def testTooOld(self):
+        """ tl2z should fail when time is older than Universe """
+        self.assertRaises(ValueError, vec_astCalc.tl2z, 14)
+
+if __name__ == '__main__':
+    unittest.main()